@@ -0,0 +1,144 @@
+"""
+Admin broadcasts to every user.
+
+Recipients are read from the database in id order and sent through the
+shared bulk limiter (bot.delivery), which keeps interactive traffic ahead of
+the broadcast. After every CHECKPOINT_EVERY recipients the progress (last
+handled user id, counters, failures) is written to the database, so a
+restart resumes after the last checkpoint; at most one chunk may be
+delivered twice.
+
+With several replicas, each broadcast is claimed by one process at a time:
+a replica resumes only broadcasts nobody holds, or whose holder stopped
+checkpointing CLAIM_TIMEOUT_SECONDS ago, and a clean shutdown releases its
+claims.
+"""
+import os
+import uuid
+import asyncio
+from telegram import Update
+from telegram.ext import ContextTypes
+from telegram.error import TelegramError
+from bot.utils import logger
+from bot.delivery import deliver_many
+from bot.database import (
+    create_broadcast, claim_broadcasts, release_broadcasts, get_broadcasts,
+    iter_broadcast_recipients, checkpoint_broadcast,
+)
+
+# Telegram IDs allowed to use /broadcast, comma-separated.
+ADMIN_IDS = {int(part) for part in os.getenv("ADMIN_IDS", "").replace(" ", "").split(",") if part}
+CHECKPOINT_EVERY = 50
+# A claim not refreshed by a checkpoint for this long belongs to a process that died.
+CLAIM_TIMEOUT_SECONDS = 600
+
+# Identifies this process's claims in the broadcasts table.
+_OWNER = uuid.uuid4().hex[:12]
+
+# broadcast id -> task delivering it
+_running = {}
+
+def is_admin(telegram_id) -> bool:
+    return telegram_id in ADMIN_IDS
+
+async def _send_chunk(bot, text, chunk):
+    """Deliver one chunk; returns (sent, failures)."""
+    return await deliver_many(bot, [(recipient["id"], recipient["telegram_id"], text) for recipient in chunk])
+
+async def _checkpoint(broadcast_id, last_user_id, sent, failures, finished=False):
+    """Checkpoint progress under this process's claim; False once another instance holds the broadcast."""
+    if await checkpoint_broadcast(broadcast_id, _OWNER, last_user_id, sent, failures, finished):
+        return True
+    logger.warning(f"Broadcast {broadcast_id} was taken over by another instance; stopping here.")
+    return False
+
+async def run_broadcast(bot, broadcast):
+    """Deliver a broadcast from its last checkpoint to the end of the users table."""
+    broadcast_id = broadcast["id"]
+    sent_total = failed_total = 0
+    chunk = []
+    try:
+        async for recipient in iter_broadcast_recipients(broadcast["last_user_id"]):
+            chunk.append(recipient)
+            if len(chunk) >= CHECKPOINT_EVERY:
+                sent, failures = await _send_chunk(bot, broadcast["text"], chunk)
+                if not await _checkpoint(broadcast_id, chunk[-1]["id"], sent, failures):
+                    return
+                sent_total, failed_total = sent_total + sent, failed_total + len(failures)
+                chunk = []
+        sent, failures = await _send_chunk(bot, broadcast["text"], chunk)
+        last_user_id = chunk[-1]["id"] if chunk else broadcast["last_user_id"]
+        if not await _checkpoint(broadcast_id, last_user_id, sent, failures, finished=True):
+            return
+        sent_total, failed_total = sent_total + sent, failed_total + len(failures)
+    except asyncio.CancelledError:
+        logger.info(f"Broadcast {broadcast_id} interrupted; it resumes from its last checkpoint.")
+        raise
+    except Exception as e:
+        logger.error(f"Error in broadcast {broadcast_id}: {e}")
+        return
+    logger.info(f"Broadcast {broadcast_id} finished: {sent_total} sent, {failed_total} failed in this run.")
+    try:
+        await bot.send_message(chat_id=broadcast["created_by"],
+                               text=f"📣 Broadcast #{broadcast_id} finished. Use /broadcast_status for totals.")
+    except TelegramError as e:
+        logger.error(f"Could not report broadcast {broadcast_id} to its sender: {e}")
+
+def _start(bot, broadcast):
+    task = asyncio.create_task(run_broadcast(bot, broadcast))
+    _running[broadcast["id"]] = task
+    task.add_done_callback(lambda _: _running.pop(broadcast["id"], None))
+
+async def resume_broadcasts(application):
+    """Startup hook: claim and continue broadcasts interrupted by a shutdown."""
+    for broadcast in await claim_broadcasts(_OWNER, CLAIM_TIMEOUT_SECONDS):
+        if broadcast["id"] not in _running:
+            logger.info(f"Resuming broadcast {broadcast['id']} after user {broadcast['last_user_id']}.")
+            _start(application.bot, broadcast)
+
+async def stop_broadcasts():
+    """
+    Stop hook: cancel running broadcasts while the bot still works and release
+    them; their checkpoints let the next instance to start resume them.
+    """
+    tasks = list(_running.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if tasks:
+        await release_broadcasts(_OWNER)
+
+# ---------- TELEGRAM HANDLERS ----------
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /broadcast <message> (admins only)."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Only bot admins can broadcast.")
+        return
+    text = update.message.text.partition(" ")[2].strip()
+    if not text:
+        await update.message.reply_text("Usage: /broadcast [message]")
+        return
+    broadcast_id = await create_broadcast(text, update.effective_user.id, _OWNER)
+    _start(context.bot, {"id": broadcast_id, "text": text, "created_by": update.effective_user.id, "last_user_id": 0})
+    await update.message.reply_text(f"📣 Broadcast #{broadcast_id} started.")
+
+async def broadcast_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /broadcast_status (admins only): progress of the latest broadcasts."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Only bot admins can see broadcasts.")
+        return
+    broadcasts = await get_broadcasts()
+    if not broadcasts:
+        await update.message.reply_text("No broadcasts yet.")
+        return
+    lines = [f"#{b['id']} {b['status']}: {b['sent']} sent, {b['failed']} failed" for b in broadcasts]
+    await update.message.reply_text("📣 Recent broadcasts:\n" + "\n".join(lines))
+
+def setup_broadcast_handlers(application):
+    """Add /broadcast and /broadcast_status and resume interrupted broadcasts at startup."""
+    from telegram.ext import CommandHandler
+    from bot.lifecycle import register_startup_hook, register_stop_hook
+    register_startup_hook(resume_broadcasts)
+    register_stop_hook(stop_broadcasts)
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("broadcast_status", broadcast_status_command))
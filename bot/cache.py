@@ -0,0 +1,151 @@
+import time
+from collections import OrderedDict
+from bot.utils import logger
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_USERS = 5000
+
+class ListCache:
+    """
+    Per-user cache of row lists (tasks, projects).
+    Entries expire after `ttl` seconds and the least recently used users are
+    evicted once `max_users` is reached. Writers either patch the cached list
+    in place or invalidate it.
+
+    Every change to a user's entry bumps that user's generation. A caller
+    filling the cache reads `generation()` before querying and hands it to
+    `put()`, which drops the rows if a write happened in between.
+    """
+
+    def __init__(self, name: str, ttl: float = DEFAULT_TTL_SECONDS, max_users: int = DEFAULT_MAX_USERS):
+        self.name = name
+        self.ttl = ttl
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Generation of each recently written user; evicted users fall back to the floor.
+        self._counter = 0
+        self._written = OrderedDict()
+        self._written_floor = 0
+
+    def get(self, user_id):
+        """Return the cached list for a user, or None on a miss."""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def generation(self, user_id):
+        """Current generation of a user's entry; read it before querying the rows to put()."""
+        return self._written.get(user_id, self._written_floor)
+
+    def _bump(self, user_id):
+        self._counter += 1
+        self._written[user_id] = self._counter
+        self._written.move_to_end(user_id)
+        while len(self._written) > self.max_users:
+            _, evicted = self._written.popitem(last=False)
+            self._written_floor = max(self._written_floor, evicted)
+
+    def put(self, user_id, rows, generation=None):
+        """
+        Store a freshly read list for a user. If `generation` no longer matches,
+        another write landed while the rows were read: the entry is dropped instead.
+        """
+        if generation is not None and generation != self.generation(user_id):
+            self.invalidate(user_id)
+            return
+        self._bump(user_id)
+        self._entries[user_id] = (time.monotonic() + self.ttl, list(rows))
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def patch(self, user_id, fn):
+        """Apply `fn(rows) -> rows` to a cached list; only bumps the generation if nothing is cached."""
+        self._bump(user_id)
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries[user_id] = (entry[0], list(fn(entry[1])))
+
+    def invalidate(self, user_id=None):
+        """Drop one user's list, or everything when `user_id` is None."""
+        if user_id is None:
+            self._entries.clear()
+            self._written.clear()
+            self._counter += 1
+            self._written_floor = self._counter
+        else:
+            self._bump(user_id)
+            self._entries.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+class IdCache:
+    """
+    Least recently used map for values that never change once known, such
+    as telegram id -> user id. Holds at most `max_size` keys.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_MAX_USERS):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached value, or None on a miss."""
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+tasks_cache = ListCache("tasks")
+projects_cache = ListCache("projects")
+
+_caches = {cache.name: cache for cache in (tasks_cache, projects_cache)}
+
+# Name under which preference changes are announced; bot.preferences keeps that cache.
+PREFERENCES_CACHE = "preferences"
+# Caches kept by other modules, by name: invalidate(key) callables, key None meaning everyone.
+_invalidators = {}
+
+def register_invalidator(name: str, invalidate):
+    """Route invalidation messages for `name` to `invalidate(key)`."""
+    _invalidators[name] = invalidate
+
+def invalidate_all():
+    """Drop every cached entry, e.g. after invalidation messages may have been missed."""
+    for cache in _caches.values():
+        cache.invalidate()
+    for invalidate in _invalidators.values():
+        invalidate(None)
+
+def invalidate_from_payload(payload: str):
+    """Apply an invalidation message of the form '<cache name>:<user id>' ('*' for all users)."""
+    try:
+        name, user_id = payload.split(":", 1)
+        key = None if user_id == "*" else int(user_id)
+        if name in _invalidators:
+            _invalidators[name](key)
+        else:
+            _caches[name].invalidate(key)
+    except (KeyError, ValueError):
+        logger.warning(f"Ignoring malformed cache invalidation payload: {payload!r}")
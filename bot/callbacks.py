@@ -0,0 +1,107 @@
+import os
+import time
+import base64
+from bot.utils import logger
+
+# Every compact callback starts with this marker; plain menu callbacks never do.
+MARKER = "#"
+
+# Action ids are part of the wire format of buttons already sent to users:
+# append new actions, never reorder or reuse ids.
+ACTIONS = (
+    "update_task",
+    "set_status",
+    "delete_task",
+    "set_pref",
+    "edit_pref",
+    "stop_reminder",
+)
+_ACTION_IDS = {name: i for i, name in enumerate(ACTIONS)}
+
+TASK_STATUSES = ("Pending", "In Progress", "Completed")
+
+# Payloads too large for Telegram's 64-byte callback_data live server-side.
+STASH_FLAG = 0x80
+STASH_TTL_SECONDS = 15 * 60
+STASH_KEY_BYTES = 6
+_stash = {}
+
+# Task buttons sent before the compact format carried their arguments in plain text.
+LEGACY_PREFIXES = ("update_task_", "set_status_", "delete_task_")
+
+def _varint(n: int) -> bytes:
+    if n < 0:
+        raise ValueError("callback arguments must be non-negative")
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def _read_varints(raw: bytes):
+    values, n, shift = [], 0, 0
+    for byte in raw:
+        n |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(n)
+            n, shift = 0, 0
+    return tuple(values)
+
+def _b64(raw: bytes) -> str:
+    return MARKER + base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def encode(action: str, *args: int) -> str:
+    """
+    Pack an action and non-negative integer arguments into short callback_data,
+    falling back to stash() when they do not fit in Telegram's 64 bytes.
+    """
+    data = _b64(bytes([_ACTION_IDS[action]]) + b"".join(_varint(a) for a in args))
+    if len(data.encode("utf-8")) > 64:
+        return stash(action, *args)
+    return data
+
+def stash(action: str, *args) -> str:
+    """
+    Keep arbitrary arguments (lists, strings, large ints) server-side for
+    STASH_TTL_SECONDS and return callback_data referencing them.
+    """
+    now = time.monotonic()
+    if len(_stash) > 1000:
+        for key in [k for k, (expires, _) in _stash.items() if expires < now]:
+            del _stash[key]
+    key = os.urandom(STASH_KEY_BYTES)
+    _stash[key] = (now + STASH_TTL_SECONDS, args)
+    return _b64(bytes([_ACTION_IDS[action] | STASH_FLAG]) + key)
+
+def is_legacy(data: str) -> bool:
+    """True for task button data from before the compact format, which is no longer handled."""
+    return bool(data) and data.startswith(LEGACY_PREFIXES)
+
+def decode(data: str):
+    """
+    Return (action, args) for compact callback_data, where args is the tuple
+    passed to encode() or stash(). Returns None for data not produced by this
+    module, and (action, None) for a stash entry that has expired.
+    """
+    if not data or not data.startswith(MARKER):
+        return None
+    body = data[1:]
+    try:
+        raw = base64.urlsafe_b64decode(body + "=" * (-len(body) % 4))
+        head = raw[0]
+        action = ACTIONS[head & ~STASH_FLAG]
+    except (ValueError, IndexError):
+        logger.warning(f"Malformed callback data: {data!r}")
+        return None
+    if head & STASH_FLAG:
+        entry = _stash.get(raw[1:])
+        if entry is None or entry[0] < time.monotonic():
+            return action, None
+        return action, entry[1]
+    return action, _read_varints(raw[1:])
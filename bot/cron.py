@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+# Recurrence rules are stored as 5-field cron expressions (minute hour day-of-month
+# month day-of-week, UTC); the friendlier forms below are normalized to them.
+WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_BOUNDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+# Give up when a rule (e.g. "0 0 31 2 *") has no occurrence in this many days.
+_MAX_DAYS_AHEAD = 366 * 5
+
+def _parse_time(text):
+    parsed = datetime.strptime(text, "%H:%M")
+    return parsed.hour, parsed.minute
+
+def parse_rule(words):
+    """
+    Parse the leading words of a recurrence rule and return (cron expression, words left).
+    Accepted forms:
+        daily HH:MM | weekdays HH:MM | weekly <mon..sun> HH:MM | cron M H DOM MON DOW
+    Raises ValueError for anything else.
+    """
+    if not words:
+        raise ValueError("missing recurrence rule")
+    kind = words[0].lower()
+    if kind == "daily":
+        hour, minute = _parse_time(words[1])
+        expr, rest = f"{minute} {hour} * * *", words[2:]
+    elif kind == "weekdays":
+        hour, minute = _parse_time(words[1])
+        expr, rest = f"{minute} {hour} * * 1-5", words[2:]
+    elif kind == "weekly":
+        day = words[1].lower()[:3]
+        if day not in WEEKDAYS:
+            raise ValueError(f"unknown weekday {words[1]!r}")
+        hour, minute = _parse_time(words[2])
+        # cron counts days of the week from Sunday = 0
+        expr, rest = f"{minute} {hour} * * {(WEEKDAYS.index(day) + 1) % 7}", words[3:]
+    elif kind == "cron":
+        expr, rest = " ".join(words[1:6]), words[6:]
+    else:
+        raise ValueError(f"unknown recurrence {words[0]!r}")
+    _fields(expr)  # validate
+    return expr, rest
+
+def _expand(spec, lo, hi):
+    values = set()
+    for part in spec.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+        if part == "*":
+            start, end = lo, hi
+        elif "-" in part:
+            start, end = (int(p) for p in part.split("-", 1))
+        else:
+            start = int(part)
+            end = hi if step > 1 else start
+        if start < lo or end > hi or start > end or step < 1:
+            raise ValueError(f"invalid cron field {spec!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+@lru_cache(maxsize=1024)
+def _fields(expr):
+    parts = expr.split()
+    if len(parts) != 5:
+        raise ValueError("cron expressions need 5 fields")
+    minutes, hours, doms, months, dows = (
+        _expand(spec, lo, hi) for spec, (lo, hi) in zip(parts, _BOUNDS)
+    )
+    dows = {d % 7 for d in dows}
+    return (sorted(minutes), sorted(hours), doms, months, dows,
+            parts[2] != "*", parts[4] != "*")
+
+def next_occurrence(expr: str, after: datetime) -> datetime:
+    """Return the first time strictly after `after` (UTC) matching the cron expression."""
+    minutes, hours, doms, months, dows, dom_restricted, dow_restricted = _fields(expr)
+    start = (after.astimezone(timezone.utc) + timedelta(minutes=1)).replace(second=0, microsecond=0)
+    day = start.date()
+    for _ in range(_MAX_DAYS_AHEAD):
+        if day.month in months:
+            dom_ok = day.day in doms
+            dow_ok = (day.weekday() + 1) % 7 in dows
+            # Standard cron: when both day fields are restricted, either may match.
+            if dom_restricted and dow_restricted:
+                matches = dom_ok or dow_ok
+            else:
+                matches = dom_ok and dow_ok
+            if matches:
+                for hour in hours:
+                    for minute in minutes:
+                        candidate = datetime(day.year, day.month, day.day, hour, minute, tzinfo=timezone.utc)
+                        if candidate >= start:
+                            return candidate
+        day += timedelta(days=1)
+    raise ValueError(f"cron expression {expr!r} never fires")
+
+def describe(expr: str) -> str:
+    """Short human-readable form of a stored rule."""
+    minute, hour, dom, month, dow = expr.split()
+    if dom == "*" and month == "*" and minute.isdigit() and hour.isdigit():
+        at = f"{int(hour):02d}:{int(minute):02d} UTC"
+        if dow == "*":
+            return f"daily at {at}"
+        if dow == "1-5":
+            return f"weekdays at {at}"
+        if dow.isdigit():
+            return f"every {WEEKDAYS[(int(dow) - 1) % 7].capitalize()} at {at}"
+    return f"cron '{expr}' (UTC)"
+
+def format_due(moment: datetime) -> str:
+    """How occurrence due dates are written to tasks.due_date."""
+    return moment.astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M")
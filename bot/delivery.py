@@ -0,0 +1,100 @@
+"""
+Paced delivery of bulk messages (broadcasts, digests, reminders).
+
+Every bulk sender shares one limiter, since Telegram's flood limit applies to
+the bot as a whole. The limiter gives up one send slot for every update the
+bot is handling, so interactive traffic keeps priority, and a RetryAfter
+pauses all bulk sending for the time Telegram asks before the message is
+retried.
+"""
+import os
+import time
+import asyncio
+from collections import deque
+from telegram import Update
+from telegram.ext import ContextTypes
+from telegram.error import RetryAfter, Forbidden, BadRequest, TelegramError
+from bot.utils import logger
+
+# Bulk messages per second across all senders; Telegram allows about 30 per second in total.
+BULK_RATE = float(os.getenv("BULK_SEND_RATE", os.getenv("BROADCAST_RATE", "20")))
+# Bulk sending never slows down below this rate, however busy the bot is.
+MIN_BULK_RATE = 1.0
+DELIVERY_WORKERS = 4
+MAX_ATTEMPTS = 3
+
+# Window over which the rate of interactive updates is measured.
+INTERACTIVE_WINDOW = 2.0
+_interactive = deque(maxlen=1000)
+
+async def record_interactive(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """TypeHandler callback noting every incoming update."""
+    _interactive.append(time.monotonic())
+
+def _interactive_rate(now):
+    while _interactive and now - _interactive[0] > INTERACTIVE_WINDOW:
+        _interactive.popleft()
+    return len(_interactive) / INTERACTIVE_WINDOW
+
+class Limiter:
+    """Spaces sends 1/rate apart, minus the rate of interactive updates, and honours flood waits."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.next_at = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            wait = max(self.next_at, self.paused_until) - now
+            if wait <= 0:
+                rate = max(MIN_BULK_RATE, self.rate - _interactive_rate(now))
+                self.next_at = max(self.next_at, now) + 1 / rate
+                return
+            await asyncio.sleep(wait)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+bulk_limiter = Limiter(BULK_RATE)
+
+async def deliver(bot, chat_id, text, limiter: Limiter = bulk_limiter):
+    """Send one message; returns None on success or a short error description."""
+    error = None
+    for _ in range(MAX_ATTEMPTS):
+        await limiter.acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            return None
+        except RetryAfter as e:
+            logger.warning(f"Bulk sending hit the flood limit; pausing for {e.retry_after}s.")
+            limiter.pause(e.retry_after)
+            error = "flood limit"
+        except Forbidden as e:
+            return f"forbidden: {e.message}"
+        except BadRequest as e:
+            return f"bad request: {e.message}"
+        except TelegramError as e:
+            error = str(e)
+    return error
+
+async def deliver_many(bot, messages, limiter: Limiter = bulk_limiter):
+    """
+    Send (key, chat_id, text) messages with DELIVERY_WORKERS concurrent senders.
+    Returns (sent count, [(key, error)] for the messages that failed).
+    """
+    semaphore = asyncio.Semaphore(DELIVERY_WORKERS)
+
+    async def send(key, chat_id, text):
+        async with semaphore:
+            return key, await deliver(bot, chat_id, text, limiter)
+
+    results = await asyncio.gather(*(send(*message) for message in messages))
+    failures = [(key, error) for key, error in results if error is not None]
+    return len(results) - len(failures), failures
+
+def setup_delivery(application):
+    """Feed interactive updates into the bulk limiter ahead of every handler."""
+    from telegram.ext import TypeHandler
+    application.add_handler(TypeHandler(Update, record_interactive), group=-2)
@@ -0,0 +1,134 @@
+import json
+import asyncio
+from datetime import datetime, timezone
+from telegram import Update
+from telegram.ext import ContextTypes
+from bot.utils import logger
+from bot.delivery import deliver_many
+from bot.database import (
+    get_user_id,
+    save_digest_subscription,
+    delete_digest_subscription,
+    get_digest_slots,
+    get_digest_batch,
+)
+from bot.weather import get_weather, schedule_prewarm, release_prewarm
+from bot.geocoding import location_from_id
+from bot.quotes import get_random_quote
+from bot.preferences import flush_preferences
+
+MAX_TASKS_IN_DIGEST = 10
+# Concurrent weather lookups while building one slot
+WEATHER_CONCURRENCY = 5
+
+def _slot_job_name(slot: str) -> str:
+    return f"digest_{slot}"
+
+def schedule_digest_slot(job_queue, slot: str):
+    """Make sure exactly one job delivers the digests of `slot` (HH:MM UTC)."""
+    if job_queue.get_jobs_by_name(_slot_job_name(slot)):
+        return
+    slot_time = datetime.strptime(slot, "%H:%M").time().replace(tzinfo=timezone.utc)
+    job_queue.run_daily(send_digests, time=slot_time, name=_slot_job_name(slot), data={"slot": slot})
+
+async def schedule_all_digest_slots(application):
+    """Startup hook: one job per distinct subscribed time slot."""
+    slots = await get_digest_slots()
+    for slot in slots:
+        schedule_digest_slot(application.job_queue, slot)
+    logger.info(f"Scheduled {len(slots)} digest slots.")
+
+def _format_digest(tasks, weather, quote):
+    lines = ["☀️ Your daily digest", ""]
+    if tasks:
+        lines.append(f"📝 Open tasks ({len(tasks)}):")
+        for task in tasks[:MAX_TASKS_IN_DIGEST]:
+            due = f", due {task['due_date']}" if task["due_date"] else ""
+            lines.append(f"{task['id']}. {task['description']} ({task['status']}{due})")
+        if len(tasks) > MAX_TASKS_IN_DIGEST:
+            lines.append(f"…and {len(tasks) - MAX_TASKS_IN_DIGEST} more.")
+    else:
+        lines.append("📝 No open tasks. 🎉")
+    if weather:
+        lines += ["", weather]
+    lines += ["", f"💡 {quote}"]
+    return "\n".join(lines)
+
+def _weather_key(row):
+    return row["location_id"], row["location"], row["units"] or "metric"
+
+async def send_digests(context: ContextTypes.DEFAULT_TYPE):
+    """Build and send every digest of one time slot."""
+    slot = context.job.data["slot"]
+    # The batch reads units in SQL, so pending changes must be written first.
+    await flush_preferences()
+    try:
+        rows = await get_digest_batch(slot)
+        if not rows:
+            return
+
+        # Each distinct location is fetched once, and one quote is shared by the whole slot.
+        semaphore = asyncio.Semaphore(WEATHER_CONCURRENCY)
+
+        async def fetch(key):
+            location_id, name, units = key
+            async with semaphore:
+                return key, await get_weather(location_from_id(location_id, name) if location_id else name, units)
+
+        # Units only change the rendering; the weather module still fetches each location once.
+        locations = {_weather_key(row) for row in rows if row["location"]}
+        weather_results, quote = await asyncio.gather(
+            asyncio.gather(*(fetch(location) for location in locations)),
+            get_random_quote(context),
+        )
+        weather_by_location = dict(weather_results)
+
+        # Paced with broadcasts and reminders; flood waits pause the slot and retry.
+        sent, failures = await deliver_many(context.bot, [
+            (row["chat_id"], row["chat_id"], _format_digest(json.loads(row["tasks"]), weather_by_location.get(_weather_key(row)), quote))
+            for row in rows
+        ])
+        for chat_id, error in failures:
+            logger.error(f"Error sending digest to chat {chat_id}: {error}")
+        logger.info(f"Sent {sent} of {len(rows)} digests for slot {slot}.")
+    except Exception as e:
+        logger.error(f"Error in send_digests for slot {slot}: {e}")
+
+async def digest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /digest HH:MM (opt in) and /digest off (opt out)."""
+    user_id = await get_user_id(update.effective_user.id)
+    if not user_id:
+        await update.message.reply_text("Please use /start first.")
+        return
+    if len(context.args) != 1:
+        await update.message.reply_text("Usage: /digest HH:MM (UTC) or /digest off")
+        return
+    if context.args[0].lower() == "off":
+        previous_slot = await delete_digest_subscription(user_id)
+        if previous_slot:
+            await release_prewarm(context.job_queue, previous_slot)
+            await update.message.reply_text("Daily digest turned off.")
+        else:
+            await update.message.reply_text("You are not subscribed to the daily digest.")
+        return
+    try:
+        slot = datetime.strptime(context.args[0], "%H:%M").strftime("%H:%M")
+    except ValueError:
+        await update.message.reply_text("Invalid time format! Use HH:MM (24-hour format).")
+        return
+    previous_slot = await save_digest_subscription(user_id, update.effective_chat.id, slot)
+    schedule_digest_slot(context.job_queue, slot)
+    schedule_prewarm(context.job_queue, slot)
+    if previous_slot not in (None, slot):
+        await release_prewarm(context.job_queue, previous_slot)
+    await update.message.reply_text(
+        f"Daily digest set for {slot} UTC: your open tasks, the weather for your "
+        "saved location and a motivational quote in one message."
+    )
+
+def setup_digest_handlers(application):
+    """Add the /digest command and schedule existing digest slots at startup."""
+    from telegram.ext import CommandHandler
+    from bot.lifecycle import register_startup_hook
+    register_startup_hook(schedule_all_digest_slots)
+    application.add_handler(CommandHandler("digest", digest_command))
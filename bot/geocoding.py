@@ -0,0 +1,100 @@
+import os
+import asyncio
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+from bot.utils import logger
+from bot.database import get_location, save_location
+from bot.resilience import get_breaker, get_http_session, retry_with_jitter, CircuitOpenError, UpstreamError
+
+# bot.main loads the .env file before this module is imported.
+API_KEY = os.getenv('WEATHER_API_KEY')
+GEOCODING_URL = os.getenv('GEOCODING_URL', "https://api.openweathermap.org/geo/1.0/direct")
+
+# Resolved queries kept in memory; the geocoded_locations table holds all of them.
+MAX_CACHED_QUERIES = 5000
+
+_geocoding_breaker = get_breaker("geocoding_api")
+# normalized query -> Location, or None for places the geocoder does not know
+_resolved = OrderedDict()
+
+class Location(NamedTuple):
+    """A canonical place. `id` is derived from the coordinates, so it is stable across spellings."""
+    id: str
+    name: str
+    lat: Optional[float]
+    lon: Optional[float]
+
+class GeocodingServiceError(UpstreamError):
+    """The geocoding API failed in a way worth retrying (5xx)."""
+
+def normalize_query(text: str) -> str:
+    """'  London ,  GB ' -> 'london,gb'."""
+    parts = (" ".join(part.split()) for part in text.lower().split(","))
+    return ",".join(part for part in parts if part)
+
+def location_id(lat: float, lon: float) -> str:
+    return f"{lat:.4f},{lon:.4f}"
+
+def location_from_id(loc_id: str, name: str) -> Location:
+    """Rebuild a Location from a stored id and display name without any lookup."""
+    lat, lon = (float(part) for part in loc_id.split(","))
+    return Location(loc_id, name, lat, lon)
+
+def _remember(query, location):
+    _resolved[query] = location
+    _resolved.move_to_end(query)
+    while len(_resolved) > MAX_CACHED_QUERIES:
+        _resolved.popitem(last=False)
+
+async def _geocode(query):
+    session = await get_http_session()
+    params = {"q": query, "limit": 1, "appid": API_KEY}
+    async with session.get(GEOCODING_URL, params=params) as response:
+        if response.status >= 500:
+            raise GeocodingServiceError(response.status)
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+async def _lookup(query):
+    """Ask the geocoding API behind its circuit breaker; returns the first match or None."""
+    if not _geocoding_breaker.allow():
+        raise CircuitOpenError(_geocoding_breaker.name)
+    try:
+        results = await retry_with_jitter(lambda: _geocode(query))
+    except asyncio.CancelledError:
+        _geocoding_breaker.release_probe()
+        raise
+    except Exception:
+        _geocoding_breaker.record_failure()
+        raise
+    _geocoding_breaker.record_success()
+    return results[0] if results else None
+
+async def resolve_location(text: str) -> Optional[Location]:
+    """
+    Canonicalize user input to a Location: memory, then the geocoded_locations
+    table, then the geocoding API. Returns None for unknown places and raises
+    when the geocoder is unavailable.
+    """
+    query = normalize_query(text)
+    if not query:
+        return None
+    if query in _resolved:
+        _resolved.move_to_end(query)
+        return _resolved[query]
+    row = await get_location(query)
+    if row is not None:
+        location = Location(row["location_id"], row["name"], row["lat"], row["lon"])
+    else:
+        match = await _lookup(query)
+        if match is None:
+            _remember(query, None)
+            return None
+        name = ", ".join(part for part in (match.get("name"), match.get("state"), match.get("country")) if part)
+        location = Location(location_id(match["lat"], match["lon"]), name, match["lat"], match["lon"])
+        try:
+            await save_location(query, location.id, location.name, location.lat, location.lon)
+        except Exception as e:
+            logger.error(f"Error saving geocoded location {query!r}: {e}")
+    _remember(query, location)
+    return location
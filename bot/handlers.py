@@ -1,6 +1,3 @@
-import datetime
-import pytz
-from datetime import datetime, time
 from telegram.error import Conflict
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackContext
@@ -14,12 +11,28 @@ from bot.database import (
     get_projects_from_db,
     get_tasks_from_db,
     update_task as db_update_task,
-    delete_task  # async version
+    get_project_status_counts,
+    get_projects_progress,
+    get_project_tasks,
+    assign_task_to_project,
+)
+from bot.reminders import (
+    create_reminder,
+    stop_reminder,
+    reminders_command,
+    send_stop_reminder_menu,
+    cancel_reminder,
 )
-from bot.reminders import daily_reminder, set_reminder, stop_reminder
 from bot.utils import logger
-from bot.quotes import get_random_quote
-from bot.weather import get_weather, send_daily_weather
+from bot.rendering import edit_message
+from bot.callbacks import encode as encode_callback, decode as decode_callback, is_legacy as is_legacy_callback, TASK_STATUSES
+from bot.preferences import (
+    get_preferences,
+    send_settings_menu,
+    choose_preference,
+    edit_preference,
+    apply_text_preference,
+)
 
 async def error_handler(update: object, context: CallbackContext) -> None:
     # Check if the error is a Conflict error
@@ -73,7 +86,7 @@ async def send_menu_inline(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("✨ *Extras*", callback_data="menu_extras")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.edit_message_text("*Main Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
+    await edit_message(update.callback_query, "*Main Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
 
 async def send_projects_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display the Projects submenu."""
@@ -85,7 +98,7 @@ async def send_projects_menu(update: Update, context: ContextTypes.DEFAULT_TYPE)
          InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.edit_message_text("*Projects Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
+    await edit_message(update.callback_query, "*Projects Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
 
 async def send_tasks_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display the Tasks submenu."""
@@ -98,18 +111,19 @@ async def send_tasks_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
          InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.edit_message_text("*Tasks Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
+    await edit_message(update.callback_query, "*Tasks Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
 
 async def send_reminders_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display the Reminders submenu."""
     keyboard = [
         [InlineKeyboardButton("⏰ *Set Reminder*", callback_data="set_reminder"),
          InlineKeyboardButton("⏹ *Stop Reminder*", callback_data="stop_reminder")],
+        [InlineKeyboardButton("📋 *My Reminders*", callback_data="list_reminders")],
         [InlineKeyboardButton("⬅ Back", callback_data="back_inline_main"),
          InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.edit_message_text("*Reminders Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
+    await edit_message(update.callback_query, "*Reminders Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
 
 async def send_weather_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display the Weather submenu."""
@@ -120,19 +134,20 @@ async def send_weather_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
          InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.edit_message_text("*Weather Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
+    await edit_message(update.callback_query, "*Weather Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
 
 async def send_extras_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display the Extras submenu."""
     keyboard = [
         [InlineKeyboardButton("💡 *Motivational Quotes*", callback_data="motivation"),
          InlineKeyboardButton("🍅 *Pomodoro Timer*", callback_data="pomodoro_timer")],
-        [InlineKeyboardButton("❓ *Help*", callback_data="help")],
+        [InlineKeyboardButton("⚙️ *Settings*", callback_data="menu_settings"),
+         InlineKeyboardButton("❓ *Help*", callback_data="help")],
         [InlineKeyboardButton("⬅ Back", callback_data="back_inline_main"),
          InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.callback_query.edit_message_text("*Extras Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
+    await edit_message(update.callback_query, "*Extras Menu:*", parse_mode="Markdown", reply_markup=reply_markup)
 
 async def send_return_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str):
     """
@@ -141,10 +156,68 @@ async def send_return_to_main_menu(update: Update, context: ContextTypes.DEFAULT
     """
     keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")]])
     if update.callback_query:
-        await update.callback_query.edit_message_text(text, parse_mode="Markdown", reply_markup=keyboard)
+        await edit_message(update.callback_query, text, parse_mode="Markdown", reply_markup=keyboard)
     else:
         await update.message.reply_text(text, parse_mode="Markdown", reply_markup=keyboard)
 
+# ---------- TASK ACTION CALLBACKS ----------
+async def choose_task_status(update: Update, context: ContextTypes.DEFAULT_TYPE, task_id: int):
+    """Show the status choices for a task."""
+    keyboard = [
+        [InlineKeyboardButton(status, callback_data=encode_callback("set_status", task_id, i))]
+        for i, status in enumerate(TASK_STATUSES)
+    ]
+    keyboard.append([InlineKeyboardButton("⬅ Back", callback_data="menu_tasks"),
+                     InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")])
+    reply_markup = InlineKeyboardMarkup(keyboard)
+    await edit_message(update.callback_query, "Choose a new status:", reply_markup=reply_markup)
+
+async def set_task_status(update: Update, context: ContextTypes.DEFAULT_TYPE, task_id: int, status_index: int):
+    """Apply the chosen status and show the refreshed task list."""
+    new_status = TASK_STATUSES[status_index]
+    logger.info(f"Updating task {task_id} to status '{new_status}'")
+    user_id = await get_user_id(update.effective_user.id)
+    task, tasks = await db_update_task(user_id, task_id, new_status)
+    if task and task["status"] != new_status:
+        # Recurring tasks move straight on to their next occurrence when completed.
+        text = f"🔁 Task {task_id} completed; next due {task['due_date']} UTC."
+    elif task:
+        text = f"✅ Task {task_id} updated to *{new_status}*."
+    elif tasks is None:
+        text = "⚠️ Failed to update task. Please try again."
+    else:
+        text = f"⚠️ Task {task_id} was not found."
+    if tasks:
+        task_list = "\n".join([f"{task[0]}. {task[1]} (Status: {task[2]})" for task in tasks])
+        text += f"\n\n📌 *Updated Tasks:*\n{task_list}"
+    await send_return_to_main_menu(update, context, text)
+
+async def delete_selected_task(update: Update, context: ContextTypes.DEFAULT_TYPE, task_id: int):
+    """Delete the chosen task and show the remaining ones."""
+    logger.info(f"Deleting task with ID: {task_id}")
+    user_id = await get_user_id(update.effective_user.id)
+    task, tasks = await db_delete_task(user_id, task_id)
+    if task:
+        text = f"🗑 Task {task_id} deleted successfully."
+    elif tasks is None:
+        text = "⚠️ Failed to delete task. Please try again."
+    else:
+        text = f"⚠️ Task {task_id} was not found."
+    if tasks:
+        task_list = "\n".join([f"{task[0]}. {task[1]} (Status: {task[2]})" for task in tasks])
+        text += f"\n\n📌 *Updated Tasks:*\n{task_list}"
+    await send_return_to_main_menu(update, context, text)
+
+# Handlers for compact callbacks, keyed by the action name from bot.callbacks.
+CALLBACK_ACTIONS = {
+    "update_task": choose_task_status,
+    "set_status": set_task_status,
+    "delete_task": delete_selected_task,
+    "set_pref": choose_preference,
+    "edit_pref": edit_preference,
+    "stop_reminder": cancel_reminder,
+}
+
 # ---------- BUTTON CALLBACK HANDLER ----------
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle all button clicks from all menus."""
@@ -153,6 +226,21 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = query.data
 
     try:
+        decoded = decode_callback(data)
+        if decoded is not None:
+            action, args = decoded
+            if args is None:
+                await edit_message(query, "This button has expired. Please open the menu again.")
+            else:
+                await CALLBACK_ACTIONS[action](update, context, *args)
+            return
+        if is_legacy_callback(data):
+            keyboard = [[InlineKeyboardButton("📝 Tasks", callback_data="menu_tasks"),
+                         InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")]]
+            await edit_message(query, "This button has expired. Please reopen the task list.",
+                               reply_markup=InlineKeyboardMarkup(keyboard))
+            return
+
         if data == "back_inline_main":
             await send_menu_inline(update, context)
             return
@@ -174,29 +262,32 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif data == "menu_extras":
             await send_extras_menu(update, context)
             return
+        elif data == "menu_settings":
+            await send_settings_menu(update, context)
+            return
 
         # ---------- PROJECTS COMMANDS ----------
         if data == "add_project":
-            await query.edit_message_text("Send the project name to add it:")
+            await edit_message(query, "Send the project name to add it:")
             context.user_data['next_action'] = 'add_project'
             return
         elif data == "delete_project":
-            await query.edit_message_text("Send the project name to delete it:")
+            await edit_message(query, "Send the project name to delete it:")
             context.user_data['next_action'] = 'delete_project'
             return
         elif data == "show_projects":
             user_id = await get_user_id(update.effective_user.id)
             projects = await get_projects_from_db(user_id)
             if projects:
-                project_list = "\n".join([f"- {proj}" for proj in projects])
-                await query.edit_message_text(f"Your Projects:\n{project_list}")
+                project_list = "\n".join([f"- {proj[0]}: {proj[1] if proj[1] else 'No description'}" for proj in projects])
+                await edit_message(query, f"Your Projects:\n{project_list}")
             else:
-                await query.edit_message_text("You have no projects yet.")
+                await edit_message(query, "You have no projects yet.")
             return
 
         # ---------- TASKS COMMANDS ----------
         elif data == "add_task":
-            await query.edit_message_text("Send the task description:")
+            await edit_message(query, "Send the task description:")
             context.user_data['next_action'] = 'add_task'
             return
         elif data == "view_tasks":
@@ -204,111 +295,69 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             tasks = await get_tasks_from_db(user_id)
             if tasks:
                 task_list = "\n".join([f"{task[0]}. {task[1]} (Status: {task[2]})" for task in tasks])
-                await query.edit_message_text(f"📌 Your Tasks:\n{task_list}")
+                await edit_message(query, f"📌 Your Tasks:\n{task_list}")
             else:
-                await query.edit_message_text("You have no tasks yet.")
+                await edit_message(query, "You have no tasks yet.")
             return
         elif data == "update_task":
             user_id = await get_user_id(update.effective_user.id)
             tasks = await get_tasks_from_db(user_id)
             if not tasks:
-                await query.edit_message_text("You have no tasks to update.")
+                await edit_message(query, "You have no tasks to update.")
                 return
             keyboard = [
-                [InlineKeyboardButton(f"{task[0]}: {task[1]}", callback_data=f"update_task_{task[0]}")]
+                [InlineKeyboardButton(f"{task[0]}: {task[1]}", callback_data=encode_callback("update_task", task[0]))]
                 for task in tasks
             ]
             keyboard.append([InlineKeyboardButton("⬅ Back", callback_data="menu_tasks"),
                              InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")])
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text("Select a task to update:", reply_markup=reply_markup)
-            return
-        elif data.startswith("update_task_"):
-            task_id = data.split("_")[-1]
-            keyboard = [
-                [InlineKeyboardButton("Pending", callback_data=f"set_status_{task_id}_Pending")],
-                [InlineKeyboardButton("In Progress", callback_data=f"set_status_{task_id}_In Progress")],
-                [InlineKeyboardButton("Completed", callback_data=f"set_status_{task_id}_Completed")],
-                [InlineKeyboardButton("⬅ Back", callback_data="menu_tasks"),
-                 InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")]
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text("Choose a new status:", reply_markup=reply_markup)
-            return
-        elif data.startswith("set_status_"):
-            parts = data.split("_")
-            task_id = int(parts[2])
-            new_status = parts[3].replace("_", " ")
-            logger.info(f"Updating task {task_id} to status '{new_status}'")
-            success = await db_update_task(task_id, new_status)
-            if success:
-                text = f"✅ Task {task_id} updated to *{new_status}*."
-            else:
-                text = "⚠️ Failed to update task. Please try again."
-            user_id = await get_user_id(update.effective_user.id)
-            tasks = await get_tasks_from_db(user_id)
-            if tasks:
-                task_list = "\n".join([f"{task[0]}. {task[1]} (Status: {task[2]})" for task in tasks])
-                text += f"\n\n📌 *Updated Tasks:*\n{task_list}"
-            await send_return_to_main_menu(update, context, text)
+            await edit_message(query, "Select a task to update:", reply_markup=reply_markup)
             return
         elif data == "delete_task":
             user_id = await get_user_id(update.effective_user.id)
             tasks = await get_tasks_from_db(user_id)
             if not tasks:
-                await query.edit_message_text("You have no tasks to delete.")
+                await edit_message(query, "You have no tasks to delete.")
                 return
             keyboard = [
-                [InlineKeyboardButton(f"{task[0]}: {task[1]}", callback_data=f"delete_task_{task[0]}")]
+                [InlineKeyboardButton(f"{task[0]}: {task[1]}", callback_data=encode_callback("delete_task", task[0]))]
                 for task in tasks
             ]
             keyboard.append([InlineKeyboardButton("⬅ Back", callback_data="menu_tasks"),
                               InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")])
             reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text("Select a task to delete:", reply_markup=reply_markup)
+            await edit_message(query, "Select a task to delete:", reply_markup=reply_markup)
             return
-        elif data.startswith("delete_task_"):
-            task_id = int(data.split("_")[-1])
-            logger.info(f"Deleting task with ID: {task_id}")
-            success = await db_delete_task(task_id)
-            if success:
-                text = f"🗑 Task {task_id} deleted successfully."
-            else:
-                text = "⚠️ Failed to delete task. Please try again."
-            user_id = await get_user_id(update.effective_user.id)
-            tasks = await get_tasks_from_db(user_id)
-            if tasks:
-                task_list = "\n".join([f"{task[0]}. {task[1]} (Status: {task[2]})" for task in tasks])
-                text += f"\n\n📌 *Updated Tasks:*\n{task_list}"
-            await send_return_to_main_menu(update, context, text)
-            return
-
         # ---------- REMINDERS, WEATHER, EXTRAS ----------
         elif data == "set_reminder":
-            await query.edit_message_text("Send the time in HH:MM format to set a daily reminder:")
+            await edit_message(query, "Send the time (HH:MM UTC), optionally followed by a name and the reminder text:")
             context.user_data['next_action'] = 'set_reminder'
             return
         elif data == "stop_reminder":
-            reminder_stopped = await stop_reminder(update, context)
-            if reminder_stopped:
-                await send_return_to_main_menu(update, context, "⏹ Reminder stopped.")
-            else:
-                await send_return_to_main_menu(update, context, "No active reminders to stop.")
+            await send_stop_reminder_menu(update, context)
+            return
+        elif data == "stop_all_reminders":
+            await stop_reminder(update, context)
+            return
+        elif data == "list_reminders":
+            await reminders_command(update, context)
             return
         elif data == "motivation":
+            from bot.quotes import get_random_quote
             quote = await get_random_quote(context)
             await send_return_to_main_menu(update, context, f"💡 Motivation:\n_{quote}_")
             return
         elif data == "weather_one_time":
-            await query.edit_message_text("Send the location to get the current weather:")
+            await edit_message(query, "Send the location to get the current weather:")
             context.user_data['next_action'] = 'weather_one_time'
             return
         elif data == "weather_updates":
-            await query.edit_message_text("Send the location and time (HH:MM) to set daily weather updates:")
+            await edit_message(query, "Send the location and time (HH:MM) to set daily weather updates:")
             context.user_data['next_action'] = 'set_weather_updates'
             return
         elif data == "pomodoro_timer":
-            await query.edit_message_text("🍅 Pomodoro Timer: Use /start_pomodoro to begin or /stop_pomodoro to stop.")
+            await edit_message(query, "🍅 Pomodoro Timer: Use /start_pomodoro to begin or /stop_pomodoro to stop.")
             return
         elif data == "help":
             keyboard = [
@@ -332,10 +381,14 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             help_text = ("🔹 *Here are the available commands:*\n\n"
                          "📌 Use `/add_project [name]` to add a project\n"
                          "📌 Use `/delete_project [name]` to delete a project\n"
-                         "📌 Use `/set_reminder HH:MM` to schedule a reminder\n"
-                         "📌 Use `/weather [location]` to check the weather\n\n"
+                         "📌 Use `/project [name]` to see a project's progress\n"
+                         "📌 Use `/set_reminder HH:MM [name] [text]` to schedule a reminder, `/reminders` to list them\n"
+                         "📌 Use `/weather [location]` to check the weather\n"
+                         "📌 Use `/digest HH:MM` to get one daily digest message\n"
+                         "📌 Use `/recurring daily HH:MM [task]` to add a repeating task\n"
+                         "📌 Use `/settings` to change pomodoro lengths, units and reminder text\n\n"
                          "_Click a button below for quick actions:_")
-            await query.edit_message_text(help_text, parse_mode="Markdown", reply_markup=reply_markup)
+            await edit_message(query, help_text, parse_mode="Markdown", reply_markup=reply_markup)
             return
 
         # Fallback: if no branch is matched, return to the main menu.
@@ -343,7 +396,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     except Exception as e:
         logger.error(f"Error in button_callback: {e}")
-        await query.edit_message_text("An error occurred. Please try again later.")
+        await edit_message(query, "An error occurred. Please try again later.")
 
 # ---------- TEXT HANDLER ----------
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -370,43 +423,28 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data['next_action'] = None
 
         elif next_action == 'set_reminder':
-            try:
-                reminder_time = datetime.strptime(update.message.text, "%H:%M").time()
-                utc_time = datetime.combine(datetime.today(), reminder_time).astimezone(pytz.UTC).time()
-                context.job_queue.run_daily(
-                    callback=daily_reminder,
-                    time=utc_time,
-                    chat_id=update.effective_chat.id,
-                    name=str(update.effective_chat.id),
-                )
-                await update.message.reply_text(f"Daily reminder set for {reminder_time.strftime('%H:%M')} UTC.")
-            except ValueError:
-                await update.message.reply_text("Invalid time format! Use HH:MM (24-hour format).")
+            await update.message.reply_text(await create_reminder(update, context, update.message.text.split()))
             context.user_data['next_action'] = None
 
         elif next_action == 'weather_one_time':
             location = update.message.text.strip()
-            weather_info = await get_weather(location)
+            from bot.weather import get_weather
+            preferences = await get_preferences(update.effective_user.id)
+            weather_info = await get_weather(location, preferences["units"])
             await update.message.reply_text(weather_info)
             context.user_data['next_action'] = None
 
         elif next_action == 'set_weather_updates':
+            from bot.weather import subscribe_weather_updates
             try:
-                user_input = update.message.text.split()
-                location = user_input[0]
-                time_str = user_input[1]
-                user_time = datetime.strptime(time_str, "%H:%M").time()
-                utc_time = datetime.combine(datetime.today(), user_time).astimezone(pytz.UTC).time()
-                context.job_queue.run_daily(
-                    callback=send_daily_weather,
-                    time=utc_time,
-                    chat_id=update.effective_chat.id,
-                    name=f"weather_update_{update.effective_user.id}",
-                    data={"location": location, "chat_id": update.effective_chat.id},
-                )
-                await update.message.reply_text(f"Daily weather updates set for {location} at {time_str} UTC.")
-            except (IndexError, ValueError):
-                await update.message.reply_text("Invalid input! Use the format: [location] [HH:MM].")
+                reply = await subscribe_weather_updates(update, context, update.message.text.split())
+            except ValueError:
+                reply = "Invalid input! Use the format: [location] [HH:MM]."
+            await update.message.reply_text(reply)
+            context.user_data['next_action'] = None
+
+        elif next_action == 'set_preference':
+            await update.message.reply_text(await apply_text_preference(update, context))
             context.user_data['next_action'] = None
 
         elif next_action == 'add_task':
@@ -449,8 +487,12 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     help_text = ("🔹 *Here are the available commands:*\n\n"
                  "📌 Use `/add_project [name]` to add a project\n"
                  "📌 Use `/delete_project [name]` to delete a project\n"
-                 "📌 Use `/set_reminder HH:MM` to schedule a reminder\n"
-                 "📌 Use `/weather [location]` to check the weather\n\n"
+                 "📌 Use `/project [name]` to see a project's progress\n"
+                 "📌 Use `/set_reminder HH:MM [name] [text]` to schedule a reminder, `/reminders` to list them\n"
+                 "📌 Use `/weather [location]` to check the weather\n"
+                 "📌 Use `/digest HH:MM` to get one daily digest message\n"
+                 "📌 Use `/recurring daily HH:MM [task]` to add a repeating task\n"
+                 "📌 Use `/settings` to change pomodoro lengths, units and reminder text\n\n"
                  "_Click a button below for quick actions:_")
     await update.message.reply_text(help_text, parse_mode="Markdown", reply_markup=reply_markup)
 
@@ -490,6 +532,58 @@ async def show_projects_command(update: Update, context: ContextTypes.DEFAULT_TY
     else:
         await update.message.reply_text("You have no projects yet.")
 
+def _progress_bar(done: int, total: int, width: int = 10) -> str:
+    filled = round(width * done / total) if total else 0
+    return "█" * filled + "░" * (width - filled)
+
+async def project_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /project [name]: progress of one project, or of all of them."""
+    user_id = await get_user_id(update.effective_user.id)
+    if not user_id:
+        await update.message.reply_text("Please use /start first.")
+        return
+    if not context.args:
+        projects = await get_projects_progress(user_id)
+        if not projects:
+            await update.message.reply_text("You have no projects yet.")
+            return
+        lines = [f"- {p['name']}: {p['completed']}/{p['total']} tasks done" for p in projects]
+        await update.message.reply_text("Your Projects:\n" + "\n".join(lines) + "\n\nUse /project [name] for details.")
+        return
+    project_name = " ".join(context.args)
+    rows = await get_project_status_counts(user_id, project_name)
+    if not rows:
+        await update.message.reply_text(f"Project '{project_name}' does not exist.")
+        return
+    counts = {row["status"]: row["count"] for row in rows if row["status"] is not None}
+    total = sum(counts.values())
+    done = counts.get("Completed", 0)
+    percent = round(100 * done / total) if total else 0
+    lines = [f"📁 {rows[0]['name']}: {rows[0]['description'] or 'No description'}",
+             f"{_progress_bar(done, total)} {percent}% complete ({done}/{total} tasks)"]
+    lines += [f"- {status}: {count}" for status, count in counts.items()]
+    if not total:
+        lines.append(f"No tasks yet. Use /assign_task [task_id] {project_name} to add one.")
+    await update.message.reply_text("\n".join(lines))
+
+async def assign_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /assign_task [task_id] [project name]; without a project name the task is detached."""
+    if not context.args or not context.args[0].isdigit():
+        await update.message.reply_text("Usage: /assign_task [task_id] [project_name]")
+        return
+    task_id = int(context.args[0])
+    project_name = " ".join(context.args[1:]) or None
+    user_id = await get_user_id(update.effective_user.id)
+    assigned = await assign_task_to_project(user_id, task_id, project_name)
+    if assigned is None:
+        await update.message.reply_text(f"Project '{project_name}' does not exist.")
+    elif not assigned:
+        await update.message.reply_text("Failed to update task. Check task ID.")
+    elif project_name:
+        await update.message.reply_text(f"Task {task_id} added to project '{project_name}'.")
+    else:
+        await update.message.reply_text(f"Task {task_id} removed from its project.")
+
 async def add_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /add_task command."""
     try:
@@ -508,10 +602,13 @@ async def add_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("An error occurred while adding the task.")
 
 async def view_tasks_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle the /view_tasks command."""
+    """Handle the /view_tasks [project name] command."""
     try:
         user_id = await get_user_id(update.effective_user.id)
-        tasks = await get_tasks_from_db(user_id)
+        if context.args:
+            tasks = await get_project_tasks(user_id, " ".join(context.args))
+        else:
+            tasks = await get_tasks_from_db(user_id)
         if not tasks:
             await update.message.reply_text("You have no tasks!")
         else:
@@ -528,9 +625,12 @@ async def update_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             await update.message.reply_text("Usage: /update_task [task_id] [new_status]")
             return
         task_id = int(context.args[0])
-        new_status = context.args[1]
-        success = await db_update_task(task_id, new_status)
-        if success:
+        new_status = " ".join(context.args[1:])
+        user_id = await get_user_id(update.effective_user.id)
+        task, _ = await db_update_task(user_id, task_id, new_status, refresh=False)
+        if task and task["status"] != new_status:
+            await update.message.reply_text(f"🔁 Task {task_id} completed; next due {task['due_date']} UTC.")
+        elif task:
             await update.message.reply_text(f"Task {task_id} updated to status: {new_status}.")
         else:
             await update.message.reply_text("Failed to update task. Check task ID.")
@@ -545,8 +645,9 @@ async def delete_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE
             await update.message.reply_text("Usage: /delete_task [task_id]")
             return
         task_id = int(context.args[0])
-        success = await delete_task(task_id)
-        if success:
+        user_id = await get_user_id(update.effective_user.id)
+        task, _ = await db_delete_task(user_id, task_id, refresh=False)
+        if task:
             await update.message.reply_text(f"Task {task_id} deleted successfully.")
         else:
             await update.message.reply_text("Failed to delete task. Check task ID.")
@@ -554,11 +655,14 @@ async def delete_task_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         logger.error(f"Error in delete_task_command: {e}")
         await update.message.reply_text("An error occurred while deleting the task.")
 
+async def motivation_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reply with a motivational quote; the quote client is loaded on first use."""
+    from bot.quotes import get_random_quote
+    await update.message.reply_text(f"💡 Motivation:\n{await get_random_quote(context)}")
+
 def setup_handlers(application):
     """Register all handlers."""
     from telegram.ext import CommandHandler, CallbackQueryHandler, MessageHandler, filters
-    from bot.reminders import set_reminder, stop_reminder
-    from bot.quotes import get_random_quote
 
     # Command Handlers
     application.add_handler(CommandHandler("start", start))
@@ -566,9 +670,9 @@ def setup_handlers(application):
     application.add_handler(CommandHandler("add_project", add_project_command))
     application.add_handler(CommandHandler("delete_project", delete_project_command))
     application.add_handler(CommandHandler("show_projects", show_projects_command))
-    application.add_handler(CommandHandler("set_reminder", set_reminder))
-    application.add_handler(CommandHandler("stop_reminder", stop_reminder))
-    application.add_handler(CommandHandler("motivation", get_random_quote))
+    application.add_handler(CommandHandler("project", project_command))
+    application.add_handler(CommandHandler("assign_task", assign_task_command))
+    application.add_handler(CommandHandler("motivation", motivation_command))
     application.add_handler(CommandHandler("add_task", add_task_command))
     application.add_handler(CommandHandler("view_tasks", view_tasks_command))
     application.add_handler(CommandHandler("update_task", update_task_command))
@@ -0,0 +1,176 @@
+import os
+import json
+import asyncio
+from datetime import datetime, timezone
+from telegram.ext import Application, JobQueue
+from bot.utils import logger
+from bot.database import init_db, close_db, save_job_snapshot, load_job_snapshot
+
+# Names this process in tables shared by several instances (job snapshots, broadcasts).
+# Replicas of one bot need distinct values; the default is the bot's id.
+INSTANCE_NAME = os.getenv("INSTANCE_NAME")
+# Seconds allowed for in-flight updates, running jobs and background tasks to finish on shutdown.
+DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "20"))
+
+# callback name -> (callback, on_restore hook or None)
+_job_callbacks = {}
+# Coroutine functions awaited once the database is ready, with the application as argument.
+_startup_hooks = []
+# Coroutine functions awaited once in-flight updates have drained, while the bot still works.
+_stop_hooks = []
+# Coroutine functions awaited during shutdown, before the database pool closes.
+_shutdown_hooks = []
+
+def register_job_callback(callback, on_restore=None):
+    """
+    Allow jobs running `callback` to survive a restart.
+    `on_restore(job)` is called for every job re-created from the snapshot.
+    """
+    _job_callbacks[callback.__name__] = (callback, on_restore)
+
+def register_startup_hook(hook):
+    """Run `await hook(application)` at startup, after the database and jobs are restored."""
+    _startup_hooks.append(hook)
+
+def register_stop_hook(hook):
+    """Run `await hook()` when stopping, after in-flight updates drain and before the job queue stops."""
+    _stop_hooks.append(hook)
+
+def register_shutdown_hook(hook):
+    """Run `await hook()` on shutdown, e.g. to close an HTTP session."""
+    _shutdown_hooks.append(hook)
+
+def instance_name(bot) -> str:
+    """This process's name in shared tables; stable across restarts."""
+    return INSTANCE_NAME or f"bot{bot.id}"
+
+# ---------- JOB SNAPSHOTS ----------
+def _serialize_job(job):
+    """Describe a scheduled job as a row for the snapshot table, or None if it can't be persisted."""
+    name = job.callback.__name__
+    if name not in _job_callbacks or job.removed:
+        return None
+    trigger = job.job.trigger
+    next_run = job.next_t
+    if next_run is None:
+        return None
+    try:
+        data = json.dumps(job.data)
+    except (TypeError, ValueError):
+        logger.warning(f"Job {job.name} has non-JSON data and will not be persisted.")
+        return None
+    days = None
+    if hasattr(trigger, "fields"):
+        day_field = next(f for f in trigger.fields if f.name == "day_of_week")
+        days = [JobQueue._CRON_MAPPING.index(d) for d in str(day_field).split(",")]
+        kind = "daily"
+    else:
+        kind = "once"
+    return (job.name, name, kind, next_run, days, job.chat_id, job.user_id, data)
+
+def _restore_job(job_queue, row):
+    callback, on_restore = _job_callbacks[row["callback"]]
+    data = json.loads(row["data"])
+    run_at = row["run_at"]
+    if row["kind"] == "daily":
+        days = tuple(row["days"]) if row["days"] else tuple(range(7))
+        job = job_queue.run_daily(
+            callback,
+            time=run_at.astimezone(timezone.utc).timetz(),
+            days=days,
+            data=data,
+            name=row["name"],
+            chat_id=row["chat_id"],
+            user_id=row["user_id"],
+        )
+    else:
+        # One-shot jobs that were due while the bot was down run immediately.
+        job = job_queue.run_once(
+            callback,
+            when=max(run_at, datetime.now(timezone.utc)),
+            data=data,
+            name=row["name"],
+            chat_id=row["chat_id"],
+            user_id=row["user_id"],
+        )
+    if on_restore:
+        on_restore(job)
+
+async def persist_jobs(application: Application):
+    """Write every persistable scheduled job to the database."""
+    rows = [row for row in map(_serialize_job, application.job_queue.jobs()) if row]
+    await save_job_snapshot(instance_name(application.bot), rows)
+    logger.info(f"Persisted {len(rows)} scheduled jobs.")
+
+async def restore_jobs(application: Application):
+    """Re-create the jobs persisted by the previous process; the snapshot is consumed."""
+    rows = await load_job_snapshot(instance_name(application.bot))
+    restored = 0
+    for row in rows:
+        if row["callback"] not in _job_callbacks:
+            logger.warning(f"No callback registered for persisted job {row['name']} ({row['callback']}).")
+            continue
+        _restore_job(application.job_queue, row)
+        restored += 1
+    logger.info(f"Restored {restored} scheduled jobs.")
+
+# ---------- APPLICATION HOOKS ----------
+class BotApplication(Application):
+    """
+    Application whose stop() first lets in-flight updates finish, for at most
+    DRAIN_TIMEOUT, then snapshots jobs and runs the stop hooks while the job
+    queue still lists its jobs. The job queue is stopped either way.
+    """
+
+    async def _before_job_queue_stops(self):
+        # Jobs scheduled by the drained updates are part of the snapshot.
+        try:
+            await persist_jobs(self)
+        except Exception as e:
+            logger.error(f"Error persisting scheduled jobs: {e}")
+        for hook in _stop_hooks:
+            try:
+                await hook()
+            except Exception as e:
+                logger.error(f"Error in stop hook {hook.__name__}: {e}")
+
+    async def stop(self) -> None:
+        logger.info(f"Draining in-flight updates (up to {DRAIN_TIMEOUT:.0f}s)...")
+        try:
+            # The updater has already stopped fetching, so this waits for queued and running updates only.
+            await asyncio.wait_for(asyncio.shield(self.update_queue.join()), timeout=DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Drain deadline exceeded; abandoning in-flight updates.")
+            await self._before_job_queue_stops()
+            if self.job_queue:
+                await self.job_queue.stop(wait=False)
+            # Application.stop() would wait for the stuck updates: let it mark the
+            # application as stopped, then abandon it.
+            stopping = asyncio.ensure_future(super().stop())
+            await asyncio.sleep(0)
+            stopping.cancel()
+            await asyncio.gather(stopping, return_exceptions=True)
+            return
+        await self._before_job_queue_stops()
+        await super().stop()
+        logger.info("Drained all in-flight work.")
+
+async def post_init(application: Application):
+    """Runs on the polling loop before updates are fetched."""
+    await asyncio.gather(init_db(), application.bot.delete_webhook())
+    logger.info("Database initialized and existing webhook deleted.")
+    await restore_jobs(application)
+    for hook in _startup_hooks:
+        try:
+            await hook(application)
+        except Exception as e:
+            logger.error(f"Error in startup hook {hook.__name__}: {e}")
+
+async def post_shutdown(application: Application):
+    """Runs on the polling loop after the application has stopped and shut down."""
+    for hook in _shutdown_hooks:
+        try:
+            await hook()
+        except Exception as e:
+            logger.error(f"Error in shutdown hook {hook.__name__}: {e}")
+    await close_db()
@@ -1,19 +1,21 @@
 import os
-import asyncio
-from telegram.ext import ApplicationBuilder
-from bot.utils import logger
-from bot.handlers import error_handler, setup_handlers
-from bot.database import init_db, get_db_pool
-from bot.pomodoro import setup_pomodoro_handlers
-from bot.weather import setup_weather_handlers
-from dotenv import load_dotenv
-
-def close_db_pool():
-    async def _close():
-        pool = await get_db_pool()
-        await pool.close()
-        logger.info("Database connection pool closed.")
-    return _close()
+# Imported ahead of everything else from the bot so its process-start timestamp precedes the heavy imports.
+from bot.profiling import startup_stage, log_startup_profile, log_first_update, STARTUP_PROFILE
+
+with startup_stage("import telegram"):
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder, TypeHandler
+    from bot.utils import logger
+with startup_stage("import database"):
+    from dotenv import load_dotenv
+    import bot.database  # noqa: F401  (selects and loads the storage backend)
+with startup_stage("import lifecycle"):
+    from bot.lifecycle import BotApplication, post_init, post_shutdown
+
+async def _post_init(application):
+    with startup_stage("init database + delete webhook + restore jobs"):
+        await post_init(application)
+    log_startup_profile("polling")
 
 def main():
     # Load environment variables
@@ -21,37 +23,59 @@ def main():
     BOT_TOKEN = os.getenv("BOT_TOKEN")
     if not BOT_TOKEN:
         raise ValueError("No BOT_TOKEN found in .env file")
-    
-    # Create and set a new event loop in the main thread
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    # Initialize the database (create tables and set up connection pool)
-    loop.run_until_complete(init_db())
-    logger.info("Database initialized successfully.")
-    
-    # Build the Telegram bot application
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
-    
-    # Delete any existing webhook (to avoid conflicts with polling)
-    loop.run_until_complete(application.bot.delete_webhook())
-    logger.info("Existing webhook deleted.")
-    
+
+    # Handler modules read configuration at import, so they are loaded after the .env file.
+    # The HTTP clients they use (aiohttp, and pyinstrument when profiling) load on first use.
+    with startup_stage("import handlers"):
+        from bot.handlers import error_handler, setup_handlers
+        from bot.pomodoro import setup_pomodoro_handlers
+        from bot.weather import setup_weather_handlers
+        from bot.digest import setup_digest_handlers
+        from bot.recurring import setup_recurring_handlers
+        from bot.transfer import setup_transfer_handlers
+        from bot.broadcast import setup_broadcast_handlers
+        from bot.preferences import setup_preferences_handlers
+        from bot.reminders import setup_reminder_handlers
+        from bot.throttle import setup_throttling
+        from bot.delivery import setup_delivery
+        from bot.metrics import setup_metrics
+
+    # Build the Telegram bot application. Database setup and teardown run in the
+    # post_init/post_shutdown hooks so they share the event loop used for polling.
+    with startup_stage("build application"):
+        application = (
+            ApplicationBuilder()
+            .token(BOT_TOKEN)
+            .application_class(BotApplication)
+            .post_init(_post_init)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
+
     # Register your handlers and error handler
-    setup_handlers(application)
-    setup_pomodoro_handlers(application)
-    setup_weather_handlers(application)
-    application.add_error_handler(error_handler)
-    
+    with startup_stage("register handlers"):
+        if STARTUP_PROFILE:
+            application.add_handler(TypeHandler(Update, log_first_update), group=-100)
+        setup_throttling(application)
+        setup_delivery(application)
+        setup_handlers(application)
+        setup_pomodoro_handlers(application)
+        setup_weather_handlers(application)
+        setup_digest_handlers(application)
+        setup_recurring_handlers(application)
+        setup_transfer_handlers(application)
+        setup_broadcast_handlers(application)
+        setup_preferences_handlers(application)
+        setup_reminder_handlers(application)
+        application.add_error_handler(error_handler)
+        setup_metrics(application)
+
     logger.info("Bot is running...")
-    
-    try:
-        # Run polling; run_polling() will manage its own event loop internally.
-        application.run_polling()
-    finally:
-        # When polling stops, gracefully close the DB pool
-        loop.run_until_complete(close_db_pool())
-        logger.info("Database connection pool closed.")
+
+    # run_polling() stops fetching updates on SIGINT/SIGTERM, drains in-flight work
+    # (BotApplication.stop) and then calls post_shutdown before closing its loop.
+    application.run_polling()
+    logger.info("Bot stopped.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,29 @@
+import os
+from bot.utils import logger
+from bot.cache import tasks_cache, projects_cache
+from bot.rendering import rendering_stats
+from bot.resilience import breaker_stats
+from bot.throttle import throttle_stats
+
+METRICS_INTERVAL = int(os.getenv("METRICS_INTERVAL", "300"))
+
+def collect_metrics():
+    """Snapshot of the in-process counters kept by the bot's subsystems."""
+    return {
+        "breakers": breaker_stats(),
+        "throttle": throttle_stats(),
+        "rendering": rendering_stats(),
+        "cache": {
+            cache.name: {"users": len(cache), "hits": cache.hits, "misses": cache.misses}
+            for cache in (tasks_cache, projects_cache)
+        },
+    }
+
+async def log_metrics(context):
+    """Job callback that writes the current metrics to the log."""
+    logger.info(f"Metrics: {collect_metrics()}")
+
+def setup_metrics(application):
+    """Log metrics every METRICS_INTERVAL seconds (0 disables it)."""
+    if METRICS_INTERVAL > 0:
+        application.job_queue.run_repeating(log_metrics, interval=METRICS_INTERVAL, first=METRICS_INTERVAL)
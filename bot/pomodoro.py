@@ -1,10 +1,9 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from bot.utils import logger
+from bot.preferences import get_preferences
 import datetime
 
-DEFAULT_WORK_MINUTES = 25
-DEFAULT_BREAK_MINUTES = 5
 active_pomodoros = {}
 
 async def start_pomodoro(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -15,8 +14,10 @@ async def start_pomodoro(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"User {user_id} attempted to start a new Pomodoro while one was already active.")
         return
     
-    work_duration = DEFAULT_WORK_MINUTES * 60 
-    break_duration = DEFAULT_BREAK_MINUTES * 60
+    preferences = await get_preferences(user_id)
+    work_minutes = preferences["pomodoro_work"]
+    work_duration = work_minutes * 60
+    break_duration = preferences["pomodoro_break"] * 60
     
     # Schedule work session
     utc_time = datetime.datetime.utcnow() + datetime.timedelta(seconds=work_duration)
@@ -28,8 +29,8 @@ async def start_pomodoro(update: Update, context: ContextTypes.DEFAULT_TYPE):
         data={"user_id": user_id, "break_duration": break_duration}, 
     )
     active_pomodoros[user_id] = [work_job]
-    logger.info(f"Pomodoro started for user {user_id}: Work duration {DEFAULT_WORK_MINUTES} minutes.")
-    await update.message.reply_text(f"Pomodoro started! Focus for {DEFAULT_WORK_MINUTES} minutes.")
+    logger.info(f"Pomodoro started for user {user_id}: Work duration {work_minutes} minutes.")
+    await update.message.reply_text(f"Pomodoro started! Focus for {work_minutes} minutes.")
     
 async def stop_pomodoro(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Stop the current Pomodoro session."""
@@ -53,7 +54,7 @@ async def pomodoro_work_end(context: ContextTypes.DEFAULT_TYPE):
     chat_id = context.job.chat_id
 
     logger.info(f"Work session ended for user {user_id}. Scheduling break.")
-    await context.bot.send_message(chat_id=chat_id, text=f"Work session complete! Time for a {DEFAULT_BREAK_MINUTES}-minute break.")
+    await context.bot.send_message(chat_id=chat_id, text=f"Work session complete! Time for a {break_duration // 60}-minute break.")
     
     # Schedule break session
     utc_time = datetime.datetime.utcnow() + datetime.timedelta(seconds=break_duration)
@@ -64,7 +65,7 @@ async def pomodoro_work_end(context: ContextTypes.DEFAULT_TYPE):
         name=f"Pomodoro break_{user_id}",
         data={"user_id": user_id},
     )
-    active_pomodoros[user_id].append(break_job)
+    active_pomodoros.setdefault(user_id, []).append(break_job)
 
 async def pomodoro_break_end(context: ContextTypes.DEFAULT_TYPE):
     """Handle end of break session."""
@@ -77,8 +78,15 @@ async def pomodoro_break_end(context: ContextTypes.DEFAULT_TYPE):
     if user_id in active_pomodoros:
         del active_pomodoros[user_id]
 
+def _track_restored_job(job):
+    """Re-attach a pomodoro job restored after a restart to its user's session."""
+    active_pomodoros.setdefault(job.data["user_id"], []).append(job)
+
 def setup_pomodoro_handlers(application):
     """Add pomodoro handlres to the application."""
     from telegram.ext import CommandHandler
+    from bot.lifecycle import register_job_callback
+    register_job_callback(pomodoro_work_end, on_restore=_track_restored_job)
+    register_job_callback(pomodoro_break_end, on_restore=_track_restored_job)
     application.add_handler(CommandHandler("start_pomodoro", start_pomodoro))
     application.add_handler(CommandHandler("stop_pomodoro", stop_pomodoro))
@@ -0,0 +1,246 @@
+"""
+Per-user settings kept as a JSON object in users.preferences.
+
+A user's preferences are read from the database once and then served from
+memory, so handlers look them up on every update without a query. Changes
+update the cached copy immediately and are written back by a periodic job:
+everything a user changed during one interval is merged into a single patch,
+and the patches of all users go out in one statement. Pending changes are
+also written at shutdown and before jobs that read preferences in SQL, and
+other instances drop their cached copies when a change is written.
+"""
+import os
+import asyncio
+from collections import OrderedDict
+from typing import NamedTuple
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+from bot.utils import logger
+from bot.cache import register_invalidator, PREFERENCES_CACHE
+from bot.database import load_preferences, save_preferences
+from bot.rendering import edit_message
+from bot.callbacks import encode as encode_callback
+
+# Seconds between write-backs of changed preferences.
+FLUSH_INTERVAL = int(os.getenv("PREFERENCES_FLUSH_INTERVAL", "10"))
+MAX_CACHED_USERS = 10000
+MAX_TEXT_LENGTH = 300
+
+class Preference(NamedTuple):
+    key: str
+    label: str
+    default: object
+    # Values offered as buttons in /settings; empty for free text.
+    choices: tuple = ()
+    # Inclusive bounds for integer values typed with /settings.
+    bounds: tuple = None
+
+# Positions are part of the callback data of /settings buttons: append, never reorder.
+PREFERENCES = (
+    Preference("pomodoro_work", "🍅 Focus minutes", 25, (15, 25, 45, 50), (1, 180)),
+    Preference("pomodoro_break", "☕ Break minutes", 5, (5, 10, 15), (1, 60)),
+    Preference("units", "🌡 Weather units", "metric", ("metric", "imperial")),
+    Preference("reminder_text", "⏰ Reminder text", "Don't forget to code today! What project are you working on?"),
+)
+_BY_KEY = {pref.key: pref for pref in PREFERENCES}
+DEFAULTS = {pref.key: pref.default for pref in PREFERENCES}
+
+# telegram id -> stored (non-default) preferences, least recently used first
+_cache = OrderedDict()
+# telegram id -> task loading them, so concurrent first reads share one query
+_loading = {}
+# telegram id -> changes not yet written; None marks a key reset to its default
+_dirty = {}
+
+def parse_value(key: str, raw):
+    """Convert `raw` to the type of preference `key`; raises ValueError when it is not allowed."""
+    pref = _BY_KEY.get(key)
+    if pref is None:
+        raise ValueError(f"unknown setting '{key}'")
+    if isinstance(pref.default, int):
+        try:
+            value = int(raw) if not isinstance(raw, (bool, float)) else None
+        except ValueError:
+            value = None
+        if value is None:
+            raise ValueError(f"{key} must be a whole number")
+        low, high = pref.bounds
+        if not low <= value <= high:
+            raise ValueError(f"{key} must be between {low} and {high}")
+        return value
+    value = " ".join(str(raw).split())
+    if pref.choices and value.lower() not in pref.choices:
+        raise ValueError(f"{key} must be one of: {', '.join(pref.choices)}")
+    if not value or len(value) > MAX_TEXT_LENGTH:
+        raise ValueError(f"{key} must be 1 to {MAX_TEXT_LENGTH} characters")
+    return value.lower() if pref.choices else value
+
+def _valid(stored):
+    """Drop unknown keys and values that no longer pass validation."""
+    clean = {}
+    for key, value in stored.items():
+        try:
+            clean[key] = parse_value(key, value)
+        except (ValueError, TypeError):
+            logger.warning(f"Ignoring stored preference {key}={value!r}")
+    return clean
+
+def invalidate_preferences(telegram_id=None):
+    """Forget cached preferences (everyone's for None), e.g. after another instance changed them."""
+    if telegram_id is None:
+        _cache.clear()
+    else:
+        _cache.pop(telegram_id, None)
+
+register_invalidator(PREFERENCES_CACHE, invalidate_preferences)
+
+def _remember(telegram_id, stored):
+    _cache[telegram_id] = stored
+    _cache.move_to_end(telegram_id)
+    while len(_cache) > MAX_CACHED_USERS:
+        _cache.popitem(last=False)
+
+async def _fetch(telegram_id):
+    try:
+        stored = _valid(await load_preferences(telegram_id))
+    except Exception as e:
+        logger.error(f"Error loading preferences of {telegram_id}: {e}")
+        stored = {}
+    else:
+        _remember(telegram_id, stored)
+    # Changes not written back yet win over the database copy.
+    for key, value in _dirty.get(telegram_id, {}).items():
+        if value is None:
+            stored.pop(key, None)
+        else:
+            stored[key] = value
+    return stored
+
+async def _stored(telegram_id):
+    stored = _cache.get(telegram_id)
+    if stored is not None:
+        _cache.move_to_end(telegram_id)
+        return stored
+    task = _loading.get(telegram_id)
+    if task is None:
+        task = asyncio.ensure_future(_fetch(telegram_id))
+        _loading[telegram_id] = task
+        task.add_done_callback(lambda _: _loading.pop(telegram_id, None))
+    return await asyncio.shield(task)
+
+async def get_preferences(telegram_id) -> dict:
+    """Every preference of a user, defaults filled in; queries the database only on the first call."""
+    return {**DEFAULTS, **await _stored(telegram_id)}
+
+async def set_preference(telegram_id, key: str, raw):
+    """Validate and apply a change now; it reaches the database with the next write-back."""
+    value = parse_value(key, raw)
+    stored = await _stored(telegram_id)
+    patch = _dirty.setdefault(telegram_id, {})
+    if value == DEFAULTS[key]:
+        stored.pop(key, None)
+        patch[key] = None
+    else:
+        stored[key] = value
+        patch[key] = value
+    return value
+
+async def flush_preferences():
+    """Write every pending change in one statement; also the shutdown hook."""
+    if not _dirty:
+        return
+    changes = dict(_dirty)
+    _dirty.clear()
+    try:
+        await save_preferences(changes)
+    except Exception as e:
+        logger.error(f"Error saving preferences of {len(changes)} users: {e}")
+        # Keep them for the next run, under any change made in the meantime.
+        for telegram_id, patch in changes.items():
+            _dirty[telegram_id] = {**patch, **_dirty.get(telegram_id, {})}
+        return
+    logger.info(f"Saved preferences of {len(changes)} users.")
+
+async def write_back_preferences(context: ContextTypes.DEFAULT_TYPE):
+    """Job callback for flush_preferences."""
+    await flush_preferences()
+
+# ---------- TELEGRAM HANDLERS ----------
+def _display(value) -> str:
+    text = str(value)
+    return text if len(text) <= 40 else text[:39] + "…"
+
+async def _settings_markup(telegram_id):
+    preferences = await get_preferences(telegram_id)
+    lines = ["⚙️ Settings (tap a value to change it, or use /settings [name] [value]):"]
+    keyboard = []
+    for index, pref in enumerate(PREFERENCES):
+        lines.append(f"{pref.label}: {_display(preferences[pref.key])}")
+        if pref.choices:
+            keyboard.append([
+                InlineKeyboardButton(("✅ " if preferences[pref.key] == choice else "") + str(choice),
+                                     callback_data=encode_callback("set_pref", index, choice_index))
+                for choice_index, choice in enumerate(pref.choices)
+            ])
+        else:
+            keyboard.append([InlineKeyboardButton(f"✏️ {pref.label}", callback_data=encode_callback("edit_pref", index))])
+    keyboard.append([InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")])
+    return "\n".join(lines), InlineKeyboardMarkup(keyboard)
+
+async def send_settings_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the settings menu, editing the message when opened from a button."""
+    text, reply_markup = await _settings_markup(update.effective_user.id)
+    if update.callback_query:
+        await edit_message(update.callback_query, text, reply_markup=reply_markup)
+    else:
+        await update.message.reply_text(text, reply_markup=reply_markup)
+
+async def choose_preference(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int, choice_index: int):
+    """Button callback: set a preference to one of its offered values."""
+    pref = PREFERENCES[index]
+    await set_preference(update.effective_user.id, pref.key, pref.choices[choice_index])
+    await send_settings_menu(update, context)
+
+async def edit_preference(update: Update, context: ContextTypes.DEFAULT_TYPE, index: int):
+    """Button callback: ask for a free-text preference, read by handle_text."""
+    pref = PREFERENCES[index]
+    context.user_data['next_action'] = 'set_preference'
+    context.user_data['preference'] = pref.key
+    await edit_message(update.callback_query, f"Send the new value for {pref.label}, or 'default' to reset it:")
+
+async def apply_text_preference(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Store the value typed after edit_preference and return the reply text."""
+    key = context.user_data.pop('preference', None)
+    if key is None:
+        return "Please choose a setting from /settings first."
+    text = update.message.text.strip()
+    try:
+        value = await set_preference(update.effective_user.id, key, DEFAULTS[key] if text.lower() == "default" else text)
+    except ValueError as e:
+        return f"⚠️ {e}"
+    return f"✅ {_BY_KEY[key].label} set to: {value}"
+
+async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /settings (menu) and /settings <name> <value>."""
+    if not context.args:
+        await send_settings_menu(update, context)
+        return
+    if len(context.args) < 2:
+        names = ", ".join(pref.key for pref in PREFERENCES)
+        await update.message.reply_text(f"Usage: /settings [name] [value]\nNames: {names}")
+        return
+    key = context.args[0].lower()
+    try:
+        value = await set_preference(update.effective_user.id, key, " ".join(context.args[1:]))
+    except ValueError as e:
+        await update.message.reply_text(f"⚠️ {e}")
+        return
+    await update.message.reply_text(f"✅ {key} set to: {value}")
+
+def setup_preferences_handlers(application):
+    """Add /settings and start the write-back job."""
+    from telegram.ext import CommandHandler
+    from bot.lifecycle import register_shutdown_hook
+    register_shutdown_hook(flush_preferences)
+    application.add_handler(CommandHandler("settings", settings_command))
+    application.job_queue.run_repeating(write_back_preferences, interval=FLUSH_INTERVAL, first=FLUSH_INTERVAL)
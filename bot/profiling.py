@@ -0,0 +1,79 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+# Imported first by bot.main so the process-start timestamp precedes the heavy imports.
+logger = logging.getLogger("CodeAssistantBot")
+
+# Set STARTUP_PROFILE=1 to log how long each startup stage takes.
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE") == "1"
+
+_process_start = time.perf_counter()
+_stages = []
+_first_update_seen = False
+
+@contextmanager
+def startup_stage(name: str):
+    """Time one stage of startup; the result is reported by log_startup_profile()."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _stages.append((name, elapsed))
+        if STARTUP_PROFILE:
+            logger.info(f"[startup] {name}: {elapsed * 1000:.1f} ms")
+
+def log_startup_profile(label: str = "ready"):
+    """Log every recorded stage and the time elapsed since the process started."""
+    if not STARTUP_PROFILE:
+        return
+    total = time.perf_counter() - _process_start
+    breakdown = ", ".join(f"{name}={elapsed * 1000:.1f}ms" for name, elapsed in _stages)
+    logger.info(f"[startup] {label} after {total * 1000:.1f} ms ({breakdown})")
+
+async def log_first_update(update, context):
+    """One-shot handler reporting the time from process start to the first update."""
+    global _first_update_seen
+    if not _first_update_seen:
+        _first_update_seen = True
+        log_startup_profile("first update")
+
+# ---------- HANDLER PROFILES ----------
+# Set HANDLER_PROFILE=<directory> to dump one profile per profiled handler call:
+# cProfile .prof files (read with pstats/snakeviz), or pyinstrument HTML reports
+# when HANDLER_PROFILER=pyinstrument and pyinstrument is installed.
+HANDLER_PROFILE_DIR = os.getenv("HANDLER_PROFILE")
+HANDLER_PROFILER = os.getenv("HANDLER_PROFILER", "cprofile")
+
+_profile_counts = {}
+
+@contextmanager
+def handler_profile(name: str):
+    """Profile the enclosed block and write it to HANDLER_PROFILE_DIR; a no-op when unset."""
+    if not HANDLER_PROFILE_DIR:
+        yield
+        return
+    os.makedirs(HANDLER_PROFILE_DIR, exist_ok=True)
+    _profile_counts[name] = _profile_counts.get(name, 0) + 1
+    path = os.path.join(HANDLER_PROFILE_DIR, f"{name}-{_profile_counts[name]}")
+    if HANDLER_PROFILER == "pyinstrument":
+        from pyinstrument import Profiler
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            with open(path + ".html", "w") as output:
+                output.write(profiler.output_html())
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path + ".prof")
@@ -1,21 +1,35 @@
-import aiohttp
 import logging
+from datetime import datetime, timezone
+from bot.resilience import get_breaker, get_http_session, resilient_call, StaleCache, UpstreamError
 
 logger = logging.getLogger("bot.quotes")
 
+QUOTE_URL = "https://favqs.com/api/qotd"
+
+_quote_breaker = get_breaker("favqs_api")
+# Any recent quote is as good as another, so a single slot is kept.
+_last_good_quote = StaleCache(max_entries=1)
+
+class QuoteServiceError(UpstreamError):
+    """favqs.com returned a non-200 response."""
+
+async def _fetch_quote():
+    session = await get_http_session()
+    async with session.get(QUOTE_URL) as response:
+        if response.status != 200:
+            raise QuoteServiceError(response.status)
+        data = await response.json()
+        quote = data.get("quote", {}).get("body", "No quote found.")
+        author = data.get("quote", {}).get("author", "Unknown")
+        return f"\"{quote}\" - {author}"
+
 async def get_random_quote(context):
-    url = "https://favqs.com/api/qotd"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    quote = data.get("quote", {}).get("body", "No quote found.")
-                    author = data.get("quote", {}).get("author", "Unknown")
-                    return f"\"{quote}\" - {author}"
-                else:
-                    logger.error(f"API returned an error: {response.status}")
-                    return "Sorry, I couldn't fetch a quote right now."
+        quote, stored_at = await resilient_call(_quote_breaker, _last_good_quote, "qotd", _fetch_quote)
     except Exception as e:
         logger.error(f"Error fetching the quote: {e}")
-        return "Sorry, an error occurred while fetching a quote."
+        return "Sorry, I couldn't fetch a quote right now."
+    if stored_at is not None:
+        as_of = datetime.fromtimestamp(stored_at, timezone.utc).strftime("%H:%M")
+        quote += f"\n⚠️ Quote service unavailable; showing a quote saved at {as_of} UTC."
+    return quote
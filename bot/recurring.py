@@ -0,0 +1,113 @@
+"""
+Recurring tasks.
+
+A recurring task is a single row in `tasks` carrying its rule (a cron
+expression, see bot.cron) and the start of its next occurrence. Completing
+it records the occurrence in task_history and moves the same row on to the
+next one, so the task list never grows. Occurrences left open are rolled
+forward by a periodic materializer that reads only the tasks whose next
+occurrence has started, through the partial index on tasks.next_due.
+"""
+import os
+from datetime import datetime, timezone
+from telegram import Update
+from telegram.ext import ContextTypes
+from bot.utils import logger
+from bot.cron import parse_rule, next_occurrence, describe
+from bot.database import (
+    get_user_id,
+    add_recurring_task,
+    get_due_recurring_tasks,
+    roll_recurring_tasks,
+    get_task_history,
+)
+
+# Seconds between materializer runs, and tasks rolled per database round-trip.
+MATERIALIZE_INTERVAL = int(os.getenv("RECURRING_INTERVAL", "60"))
+MATERIALIZE_BATCH = 500
+
+USAGE = ("Usage: /recurring <rule> <description>\n"
+         "Rules (UTC): daily HH:MM | weekdays HH:MM | weekly <mon..sun> HH:MM | cron M H DOM MON DOW\n"
+         "Example: /recurring weekdays 09:00 Stand-up notes")
+
+def _latest_occurrence(rule, started, now):
+    """Return (latest occurrence started by `now`, the one after it), beginning from `started`."""
+    following = next_occurrence(rule, started)
+    while following <= now:
+        started, following = following, next_occurrence(rule, following)
+    return started, following
+
+async def materialize_recurring_tasks(context: ContextTypes.DEFAULT_TYPE):
+    """Job callback: move recurring tasks whose next occurrence has started on to it."""
+    now = datetime.now(timezone.utc)
+    rolled = 0
+    try:
+        while True:
+            rows = await get_due_recurring_tasks(now, MATERIALIZE_BATCH)
+            rolls = []
+            for row in rows:
+                # A task with a rule or date that no longer parses must not hold up the others.
+                try:
+                    due, next_due = _latest_occurrence(row["recurrence"], row["next_due"], now)
+                except Exception as e:
+                    logger.error(f"Error computing the next occurrence of recurring task {row['id']}: {e}")
+                    continue
+                rolls.append((row["id"], row["user_id"], row["due_date"], row["next_due"], due, next_due))
+            # Tasks completed since the scan are skipped by the roll.
+            rolled += await roll_recurring_tasks(rolls)
+            # Failing tasks stay due, so a batch with nothing rolled would come back unchanged.
+            if len(rows) < MATERIALIZE_BATCH or not rolls:
+                break
+    except Exception as e:
+        logger.error(f"Error materializing recurring tasks: {e}")
+    if rolled:
+        logger.info(f"Rolled {rolled} recurring tasks to their next occurrence.")
+
+# ---------- TELEGRAM HANDLERS ----------
+async def recurring_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /recurring <rule> <description>."""
+    user_id = await get_user_id(update.effective_user.id)
+    if not user_id:
+        await update.message.reply_text("Please use /start first.")
+        return
+    try:
+        rule, rest = parse_rule(context.args)
+        # Rules that parse but never match (e.g. cron 0 0 31 2 *) fail here.
+        first_due = next_occurrence(rule, datetime.now(timezone.utc))
+    except (ValueError, IndexError):
+        await update.message.reply_text(USAGE)
+        return
+    if not rest:
+        await update.message.reply_text(USAGE)
+        return
+    description = " ".join(rest)
+    task = await add_recurring_task(user_id, description, rule, first_due)
+    if task:
+        await update.message.reply_text(
+            f"🔁 Recurring task {task['id']} added: {description}\n"
+            f"Repeats {describe(rule)}; first due {task['due_date']} UTC."
+        )
+    else:
+        await update.message.reply_text(f"❌ Failed to add recurring task: {description}")
+
+async def task_history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /task_history <task_id>: recent occurrences of a recurring task."""
+    if len(context.args) != 1 or not context.args[0].isdigit():
+        await update.message.reply_text("Usage: /task_history [task_id]")
+        return
+    user_id = await get_user_id(update.effective_user.id)
+    task_id = int(context.args[0])
+    rows = await get_task_history(user_id, task_id)
+    if not rows:
+        await update.message.reply_text(f"No recorded occurrences for task {task_id}.")
+        return
+    icons = {"Completed": "✅", "Missed": "⏭"}
+    lines = [f"{icons.get(row['outcome'], '•')} {row['due_date']} — {row['outcome']}" for row in rows]
+    await update.message.reply_text(f"Recent occurrences of task {task_id}:\n" + "\n".join(lines))
+
+def setup_recurring_handlers(application):
+    """Add /recurring and /task_history and start the materializer job."""
+    from telegram.ext import CommandHandler
+    application.add_handler(CommandHandler("recurring", recurring_command))
+    application.add_handler(CommandHandler("task_history", task_history_command))
+    application.job_queue.run_repeating(materialize_recurring_tasks, interval=MATERIALIZE_INTERVAL, first=5)
@@ -1,58 +1,235 @@
+"""
+Daily reminders.
+
+A chat can have several reminders, each with a unique name, a time (HH:MM
+UTC) and an optional text; without one, the user's reminder_text preference
+is sent. Reminders live in the reminders table, indexed by time, and are
+delivered by one job per distinct time slot, as digests are. Setting a
+reminder again under the same name replaces it instead of adding a job.
+"""
+import re
 import logging
-from datetime import datetime, time
-import pytz
+from datetime import datetime, timezone
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from bot.rendering import edit_message
+from bot.delivery import deliver_many
+from bot.preferences import get_preferences, flush_preferences, DEFAULTS, MAX_TEXT_LENGTH
+from bot.callbacks import encode as encode_callback
+from bot.database import (
+    get_user_id,
+    save_reminder,
+    get_reminders,
+    delete_reminders,
+    get_reminder_slots,
+    get_reminder_batch,
+)
 
 logger = logging.getLogger("CodeAssistantBot")
 
+DEFAULT_NAME = "daily"
+MAX_REMINDERS_PER_CHAT = 20
+_NAME = re.compile(r"[a-z0-9_-]{1,32}")
 
-async def set_reminder(update, context):
+USAGE = ("Usage: /set_reminder HH:MM [name] [text] (UTC)\n"
+         "Setting a name again replaces that reminder. Without text, your /settings reminder text is sent.\n"
+         "Example: /set_reminder 09:30 standup Stand-up starts soon!")
+
+# Daily jobs from before reminders were stored, restored from the job snapshot;
+# the startup hook moves them into the reminders table.
+_legacy_jobs = []
+
+def parse_reminder(words):
+    """Split "HH:MM [name] [text]" into (slot, name, text or None); raises ValueError."""
+    if not words:
+        raise ValueError("expected a time")
+    slot = datetime.strptime(words[0], "%H:%M").strftime("%H:%M")
+    name, text = DEFAULT_NAME, None
+    if len(words) > 1:
+        name = words[1].lower()
+        if not _NAME.fullmatch(name):
+            raise ValueError("names are up to 32 letters, digits, '-' or '_'")
+        text = " ".join(words[2:])[:MAX_TEXT_LENGTH] or None
+    return slot, name, text
+
+def _format_reminders(rows):
+    lines = ["⏰ Your reminders (UTC):"]
+    for row in rows:
+        lines.append(f"{row['time']} {row['name']} — {row['text'] or 'your /settings reminder text'}")
+    return "\n".join(lines)
+
+def _main_menu_markup():
+    return InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")]])
+
+# ---------- DELIVERY ----------
+def _slot_job_name(slot: str) -> str:
+    return f"reminders_{slot}"
+
+def schedule_reminder_slot(job_queue, slot: str):
+    """Make sure exactly one job delivers the reminders of `slot` (HH:MM UTC)."""
+    if job_queue.get_jobs_by_name(_slot_job_name(slot)):
+        return
+    slot_time = datetime.strptime(slot, "%H:%M").time().replace(tzinfo=timezone.utc)
+    job_queue.run_daily(send_reminders, time=slot_time, name=_slot_job_name(slot), data={"slot": slot})
+
+async def send_reminders(context):
+    """Send every reminder of one time slot; a slot left without reminders drops its job."""
+    slot = context.job.data["slot"]
+    # The batch reads reminder_text in SQL, so pending changes must be written first.
+    await flush_preferences()
     try:
-        # Parse the time input by the user in HH:MM format.
-        # Assume the user enters time in UTC.
-        user_time = datetime.strptime(update.message.text.strip(), "%H:%M").time()
-
-        # Schedule the reminder at the exact time provided (in UTC)
-        context.job_queue.run_daily(
-            daily_reminder,
-            time=user_time,
-            chat_id=update.effective_chat.id,
-            name=str(update.effective_chat.id),
-        )
-        await update.message.reply_text(f"Reminder set for {user_time.strftime('%H:%M')} UTC.")
-    except ValueError:
-        await update.message.reply_text("Invalid time format! Use HH:MM (24-hour format).")
+        rows = await get_reminder_batch(slot)
     except Exception as e:
-        logger.error(f"Error in set_reminder: {e}")
-        await update.message.reply_text("An error occurred while setting the reminder.")
+        logger.error(f"Error loading reminders for slot {slot}: {e}")
+        return
+    if not rows:
+        context.job.schedule_removal()
+        return
+    # Paced with broadcasts and digests; flood waits pause the slot and retry.
+    sent, failures = await deliver_many(context.bot, [
+        ((row["chat_id"], row["name"]), row["chat_id"], row["text"] or DEFAULTS["reminder_text"]) for row in rows
+    ])
+    for (chat_id, name), error in failures:
+        logger.error(f"Error sending reminder {name!r} to chat {chat_id}: {error}")
+    logger.info(f"Sent {sent} of {len(rows)} reminders for slot {slot}.")
 
 async def daily_reminder(context):
-    """Send a daily reminder message."""
+    """Send a reminder scheduled as its own job before reminders were stored."""
     try:
-        await context.bot.send_message(
-            chat_id=context.job.chat_id,
-            text="Don't forget to code today! What project are you working on?",
-        )
+        # Reminders set before preferences existed carry no user id; their chats are private.
+        preferences = await get_preferences(context.job.user_id or context.job.chat_id)
+        await context.bot.send_message(chat_id=context.job.chat_id, text=preferences["reminder_text"])
     except Exception as e:
         logger.error(f"Error in daily_reminder: {e}")
 
-async def stop_reminder(update, context):
-    """Stop a daily reminder."""
+def _track_legacy_job(job):
+    _legacy_jobs.append(job)
+
+def _job_slot(job):
+    fields = {field.name: str(field) for field in job.job.trigger.fields}
+    return f"{int(fields['hour']):02d}:{int(fields['minute']):02d}"
+
+async def _adopt_legacy_jobs():
+    """
+    Store restored daily_reminder jobs as reminders and drop the jobs. Copies
+    piled up by setting a reminder repeatedly collapse into one per time.
+    """
+    by_chat = {}
+    while _legacy_jobs:
+        job = _legacy_jobs.pop()
+        by_chat.setdefault(job.chat_id, []).append(job)
+    for chat_id, jobs in by_chat.items():
+        user_id = await get_user_id(jobs[0].user_id or chat_id)
+        if not user_id:
+            # Not a registered user: the jobs keep running as before.
+            continue
+        slots = sorted({_job_slot(job) for job in jobs})
+        for slot in slots:
+            name = DEFAULT_NAME if len(slots) == 1 else f"{DEFAULT_NAME}-{slot.replace(':', '')}"
+            await save_reminder(chat_id, user_id, name, slot)
+        for job in jobs:
+            job.schedule_removal()
+        logger.info(f"Moved {len(jobs)} reminder jobs of chat {chat_id} into {len(slots)} reminders.")
+
+async def schedule_all_reminder_slots(application):
+    """Startup hook: adopt restored legacy jobs, then one job per distinct reminder time."""
+    await _adopt_legacy_jobs()
+    slots = await get_reminder_slots()
+    for slot in slots:
+        schedule_reminder_slot(application.job_queue, slot)
+    logger.info(f"Scheduled {len(slots)} reminder slots.")
+
+# ---------- TELEGRAM HANDLERS ----------
+async def create_reminder(update, context, words):
+    """
+    Create or replace a reminder from "HH:MM [name] [text]" and return the
+    reply text. Used by the command and the menu flow.
+    """
+    try:
+        slot, name, text = parse_reminder(words)
+    except ValueError:
+        return USAGE
+    user_id = await get_user_id(update.effective_user.id)
+    if not user_id:
+        return "Please use /start first."
     chat_id = update.effective_chat.id
-    jobs = context.job_queue.get_jobs_by_name(str(chat_id))
-
-    if not jobs:
-        # Check if triggered by a callback query
-        if update.callback_query:
-            await update.callback_query.edit_message_text("No active reminders to stop.")
-        else:
-            await update.message.reply_text("No active reminders to stop.")
-        return
+    existing = await get_reminders(chat_id)
+    replaced = any(row["name"] == name for row in existing)
+    if not replaced and len(existing) >= MAX_REMINDERS_PER_CHAT:
+        return f"⚠️ This chat already has {MAX_REMINDERS_PER_CHAT} reminders. Remove one with /stop_reminder [name]."
+    await save_reminder(chat_id, user_id, name, slot, text)
+    schedule_reminder_slot(context.job_queue, slot)
+    logger.info(f"Reminder {name!r} {'updated' if replaced else 'set'} for chat {chat_id} at {slot} UTC.")
+    return f"⏰ Reminder '{name}' {'updated' if replaced else 'set'} for {slot} UTC daily."
 
-    for job in jobs:
-        job.schedule_removal()
+async def set_reminder(update, context):
+    """Handle /set_reminder HH:MM [name] [text]."""
+    try:
+        reply = await create_reminder(update, context, context.args)
+    except Exception as e:
+        logger.error(f"Error in set_reminder: {e}")
+        reply = "An error occurred while setting the reminder."
+    await update.message.reply_text(reply)
 
-    # Send feedback based on trigger type
+async def reminders_command(update, context):
+    """Handle /reminders: list the reminders of this chat."""
+    rows = await get_reminders(update.effective_chat.id)
+    if not rows:
+        reply = "No active reminders. " + USAGE
+    else:
+        reply = _format_reminders(rows)
     if update.callback_query:
-        await update.callback_query.edit_message_text("Reminder stopped.")
+        await edit_message(update.callback_query, reply, reply_markup=_main_menu_markup())
     else:
-        await update.message.reply_text("Reminder stopped.")
+        await update.message.reply_text(reply)
+
+async def stop_reminder(update, context):
+    """Handle /stop_reminder [name]: stop one reminder, or every reminder of the chat."""
+    chat_id = update.effective_chat.id
+    name = context.args[0].lower() if context.args else None
+    deleted = await delete_reminders(chat_id, name=name)
+    if name is None:
+        # Reminder jobs of unregistered users still run under the chat id.
+        for job in context.job_queue.get_jobs_by_name(str(chat_id)):
+            job.schedule_removal()
+            deleted += 1
+    if deleted:
+        reply = f"⏹ Reminder '{name}' stopped." if name else f"⏹ Stopped {deleted} reminder(s)."
+    else:
+        reply = f"No reminder called '{name}'." if name else "No active reminders to stop."
+    if update.callback_query:
+        await edit_message(update.callback_query, reply, reply_markup=_main_menu_markup())
+    else:
+        await update.message.reply_text(reply)
+
+async def send_stop_reminder_menu(update, context):
+    """Offer one button per reminder of the chat, plus one stopping them all."""
+    rows = await get_reminders(update.effective_chat.id)
+    if not rows:
+        await edit_message(update.callback_query, "No active reminders to stop.", reply_markup=_main_menu_markup())
+        return
+    keyboard = [
+        [InlineKeyboardButton(f"⏹ {row['time']} {row['name']}", callback_data=encode_callback("stop_reminder", row["id"]))]
+        for row in rows
+    ]
+    keyboard.append([InlineKeyboardButton("⏹ Stop all", callback_data="stop_all_reminders")])
+    keyboard.append([InlineKeyboardButton("⬅ Back", callback_data="menu_reminders"),
+                     InlineKeyboardButton("🏠 Main Menu", callback_data="back_to_main")])
+    await edit_message(update.callback_query, "Choose a reminder to stop:", reply_markup=InlineKeyboardMarkup(keyboard))
+
+async def cancel_reminder(update, context, reminder_id: int):
+    """Button callback: stop one reminder by id."""
+    if await delete_reminders(update.effective_chat.id, reminder_id=reminder_id):
+        reply = "⏹ Reminder stopped."
+    else:
+        reply = "That reminder was already stopped."
+    await edit_message(update.callback_query, reply, reply_markup=_main_menu_markup())
+
+def setup_reminder_handlers(application):
+    """Add the reminder commands and schedule existing reminder slots at startup."""
+    from telegram.ext import CommandHandler
+    from bot.lifecycle import register_job_callback, register_startup_hook
+    register_job_callback(daily_reminder, on_restore=_track_legacy_job)
+    register_startup_hook(schedule_all_reminder_slots)
+    application.add_handler(CommandHandler("set_reminder", set_reminder))
+    application.add_handler(CommandHandler("stop_reminder", stop_reminder))
+    application.add_handler(CommandHandler("reminders", reminders_command))
@@ -0,0 +1,72 @@
+import hashlib
+from collections import OrderedDict
+from telegram.error import BadRequest
+
+MAX_TRACKED_MESSAGES = 10000
+
+# (chat_id, message_id) -> digest of the content last shown in that message
+_last_rendered = OrderedDict()
+# Messages with an edit currently in flight, and the newest content queued behind it
+_in_flight = set()
+_pending = {}
+
+skipped_edits = 0
+
+def _digest(text, kwargs):
+    markup = kwargs.get("reply_markup")
+    payload = "\x00".join([
+        text,
+        str(kwargs.get("parse_mode")),
+        markup.to_json() if markup is not None else "",
+    ])
+    return hashlib.sha1(payload.encode("utf-8")).digest()
+
+def _remember(key, digest):
+    _last_rendered[key] = digest
+    _last_rendered.move_to_end(key)
+    while len(_last_rendered) > MAX_TRACKED_MESSAGES:
+        _last_rendered.popitem(last=False)
+
+async def _apply(query, key, digest, text, kwargs):
+    global skipped_edits
+    if _last_rendered.get(key) == digest:
+        skipped_edits += 1
+        return
+    try:
+        await query.edit_message_text(text, **kwargs)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+        skipped_edits += 1
+    _remember(key, digest)
+
+async def edit_message(query, text, **kwargs):
+    """
+    Edit the message behind a callback query, skipping the Bot API call when
+    the text and markup are unchanged. Edits for a message that arrive while
+    another edit to it is in flight are coalesced so only the newest is sent.
+    """
+    if query.message is None:
+        # Inline-mode messages have no (chat, message) key to track.
+        await query.edit_message_text(text, **kwargs)
+        return
+
+    key = (query.message.chat_id, query.message.message_id)
+    digest = _digest(text, kwargs)
+    if key in _in_flight:
+        _pending[key] = (query, digest, text, kwargs)
+        return
+
+    _in_flight.add(key)
+    try:
+        await _apply(query, key, digest, text, kwargs)
+        while key in _pending:
+            query, digest, text, kwargs = _pending.pop(key)
+            await _apply(query, key, digest, text, kwargs)
+    finally:
+        _in_flight.discard(key)
+        _pending.pop(key, None)
+
+def rendering_stats():
+    """Counters for monitoring how many edits were avoided."""
+    return {"tracked_messages": len(_last_rendered), "skipped_edits": skipped_edits}
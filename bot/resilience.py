@@ -0,0 +1,176 @@
+import time
+import random
+import asyncio
+from bot.utils import logger
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because its circuit breaker is open."""
+
+class UpstreamError(Exception):
+    """An external API answered with an error status."""
+
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker. After `failure_threshold` consecutive failures
+    the circuit opens for `reset_timeout` seconds; then a single probe call is
+    let through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected_calls = 0
+        self.stale_responses = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected_calls += 1
+        return False
+
+    def release_probe(self):
+        """Give up a half-open probe without recording an outcome."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+                logger.warning(f"Circuit '{self.name}' opened after {self.failures} failures.")
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected_calls": self.rejected_calls,
+            "stale_responses": self.stale_responses,
+        }
+
+_breakers = {}
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """Return the process-wide breaker called `name`, creating it on first use."""
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name, **kwargs)
+    return _breakers[name]
+
+def breaker_stats():
+    """State and counters of every breaker, for logging or a metrics endpoint."""
+    return {name: breaker.stats() for name, breaker in _breakers.items()}
+
+def is_retryable(error: Exception) -> bool:
+    """Timeouts, 5xx answers and rate limits may succeed on another try; other 4xx answers will not."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    # UpstreamError and aiohttp's ClientResponseError both carry the HTTP status.
+    status = getattr(error, "status", None)
+    return isinstance(status, int) and (status >= 500 or status == 429)
+
+async def retry_with_jitter(fetch, attempts: int = 2, base_delay: float = 0.5, max_delay: float = 4.0):
+    """
+    Await `fetch()` up to `attempts` times, sleeping with full jitter between
+    tries. Errors that is_retryable() rejects are raised straight away.
+    """
+    for attempt in range(attempts):
+        try:
+            return await fetch()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            await asyncio.sleep(random.uniform(0, min(max_delay, base_delay * 2 ** attempt)))
+
+class StaleCache:
+    """Last good response per key, served when the upstream is unavailable."""
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries = {}
+
+    def put(self, key, value):
+        if key not in self._entries and len(self._entries) >= self.max_entries:
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (value, time.time())
+
+    def get(self, key):
+        """Return (value, stored_at epoch seconds) or None."""
+        return self._entries.get(key)
+
+async def resilient_call(breaker: CircuitBreaker, cache: StaleCache, key, fetch, attempts: int = 2, cacheable=None):
+    """
+    Call `fetch()` behind `breaker`, with bounded jittered retries.
+    Only values accepted by `cacheable(value)` (all, if not given) are kept for stale serving.
+    Returns (value, stored_at): stored_at is None for a fresh value, or the
+    time the cached value was stored when serving stale data. Raises
+    CircuitOpenError or the last fetch error when there is nothing to serve.
+    """
+    if breaker.allow():
+        try:
+            value = await retry_with_jitter(fetch, attempts=attempts)
+        except asyncio.CancelledError:
+            breaker.release_probe()
+            raise
+        except Exception as e:
+            breaker.record_failure()
+            logger.error(f"Call through circuit '{breaker.name}' failed: {e}")
+            error = e
+        else:
+            breaker.record_success()
+            if cacheable is None or cacheable(value):
+                cache.put(key, value)
+            return value, None
+    else:
+        error = CircuitOpenError(breaker.name)
+
+    cached = cache.get(key)
+    if cached is None:
+        raise error
+    breaker.stale_responses += 1
+    return cached
+
+_http_session = None
+_close_hook_registered = False
+
+async def get_http_session():
+    """Shared aiohttp session for outbound API calls, closed on shutdown."""
+    global _http_session, _close_hook_registered
+    if _http_session is None or _http_session.closed:
+        import aiohttp
+        _http_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=8))
+        if not _close_hook_registered:
+            from bot.lifecycle import register_shutdown_hook
+            register_shutdown_hook(close_http_session)
+            _close_hook_registered = True
+    return _http_session
+
+async def close_http_session():
+    global _http_session
+    if _http_session is not None:
+        await _http_session.close()
+        _http_session = None
@@ -0,0 +1,56 @@
+# Functions every storage backend provides; bot.database re-exports the chosen backend's.
+API = (
+    "init_db",
+    "close_db",
+    "get_or_create_user",
+    "get_user_id",
+    "load_preferences",
+    "save_preferences",
+    "add_project_to_db",
+    "get_projects_from_db",
+    "delete_project_from_db",
+    "get_tasks_from_db",
+    "add_task_to_db",
+    "update_task",
+    "delete_task",
+    "get_project_status_counts",
+    "get_projects_progress",
+    "get_project_tasks",
+    "assign_task_to_project",
+    "add_recurring_task",
+    "get_due_recurring_tasks",
+    "roll_recurring_tasks",
+    "get_task_history",
+    "save_weather_preference",
+    "get_weather_preference",
+    "get_weather_slots",
+    "get_weather_locations",
+    "get_location",
+    "save_location",
+    "save_job_snapshot",
+    "load_job_snapshot",
+    "save_digest_subscription",
+    "delete_digest_subscription",
+    "get_digest_slots",
+    "get_digest_batch",
+    "save_reminder",
+    "get_reminders",
+    "delete_reminders",
+    "get_reminder_slots",
+    "get_reminder_batch",
+    "create_broadcast",
+    "claim_broadcasts",
+    "release_broadcasts",
+    "get_broadcasts",
+    "iter_broadcast_recipients",
+    "checkpoint_broadcast",
+    "copy_export_csv",
+    "iter_export_rows",
+    "import_rows",
+    "EXPORT_COLUMNS",
+)
+
+# Columns are only ever appended, so older export files still import.
+# "project" is the name of a task's project; next_due is ISO-8601 UTC.
+EXPORT_COLUMNS = ("kind", "telegram_id", "name", "description", "status", "due_date",
+                  "project", "recurrence", "next_due")
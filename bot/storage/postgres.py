@@ -0,0 +1,1014 @@
+import os
+import json
+import uuid
+import asyncio
+import asyncpg
+import logging
+from datetime import datetime, timezone
+from bot.utils import logger
+from bot.cache import tasks_cache, projects_cache, IdCache, invalidate_all, invalidate_from_payload, PREFERENCES_CACHE
+from bot.cron import next_occurrence, format_due
+from bot.storage import API, EXPORT_COLUMNS
+
+logger = logging.getLogger("CodeAssistantBot")
+
+__all__ = list(API)
+
+_pool = None
+_listener_conn = None
+_listener_reconnect = None
+
+# Channel used to tell other bot instances that a user's cached lists changed.
+CACHE_CHANNEL = "bot_cache_invalidate"
+_INSTANCE_ID = uuid.uuid4().hex[:12]
+# Backoff between attempts to re-establish a dropped LISTEN connection.
+LISTENER_RETRY_DELAYS = (1, 2, 5, 10, 30)
+
+def _dsn():
+    return f"postgres://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+
+async def init_db_pool():
+    """Initialize and return the global asyncpg connection pool."""
+    global _pool
+    # Open a single connection up front; more are created on demand.
+    _pool = await asyncpg.create_pool(
+        _dsn(),
+        min_size=int(os.getenv("DB_POOL_MIN_SIZE", "1")),
+        max_size=int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+    )
+    return _pool
+
+# ---------- CACHE INVALIDATION ----------
+def _on_cache_notification(connection, pid, channel, payload):
+    """Drop cached lists changed by another instance."""
+    origin, _, body = payload.partition("|")
+    if origin != _INSTANCE_ID:
+        invalidate_from_payload(body)
+
+async def _connect_listener():
+    global _listener_conn
+    conn = await asyncpg.connect(_dsn())
+    try:
+        await conn.add_listener(CACHE_CHANNEL, _on_cache_notification)
+    except Exception:
+        await conn.close()
+        raise
+    conn.add_termination_listener(_on_listener_terminated)
+    _listener_conn = conn
+
+def _on_listener_terminated(connection):
+    """The LISTEN connection dropped: invalidations may be missed, so forget everything and reconnect."""
+    global _listener_conn, _listener_reconnect
+    if connection is not _listener_conn:
+        return  # closed by stop_cache_listener
+    _listener_conn = None
+    logger.warning("Cache listener connection lost; clearing caches and reconnecting.")
+    invalidate_all()
+    _listener_reconnect = asyncio.get_running_loop().create_task(_reconnect_listener())
+
+async def _reconnect_listener():
+    global _listener_reconnect
+    attempt = 0
+    while True:
+        await asyncio.sleep(LISTENER_RETRY_DELAYS[min(attempt, len(LISTENER_RETRY_DELAYS) - 1)])
+        try:
+            await _connect_listener()
+            break
+        except Exception as e:
+            attempt += 1
+            logger.warning(f"Could not reconnect cache listener (attempt {attempt}): {e}")
+    _listener_reconnect = None
+    # Anything written while the listener was down was never announced here.
+    invalidate_all()
+    logger.info("Cache listener reconnected.")
+
+async def start_cache_listener():
+    """LISTEN for invalidations on a dedicated connection so replicas stay consistent."""
+    if _listener_conn is not None:
+        return
+    try:
+        await _connect_listener()
+        logger.info("Listening for cache invalidations.")
+    except Exception as e:
+        logger.error(f"Could not start cache listener, falling back to TTL expiry: {e}")
+
+async def stop_cache_listener():
+    """Close the LISTEN connection and stop any reconnect in progress."""
+    global _listener_conn, _listener_reconnect
+    if _listener_reconnect is not None:
+        _listener_reconnect.cancel()
+        _listener_reconnect = None
+    conn, _listener_conn = _listener_conn, None
+    if conn is not None:
+        await conn.close()
+
+async def _notify_change(conn, cache_name: str, user_id):
+    """Broadcast that `cache_name` changed for `user_id` ('*' for everyone) to every instance."""
+    try:
+        await conn.execute("SELECT pg_notify($1, $2)", CACHE_CHANNEL, f"{_INSTANCE_ID}|{cache_name}:{user_id}")
+    except Exception as e:
+        logger.error(f"Error sending cache invalidation: {e}")
+
+async def get_db_pool():
+    """Return the global asyncpg connection pool, initializing it if necessary."""
+    global _pool
+    if _pool is None:
+        await init_db_pool()
+    return _pool
+
+# The whole schema is applied as one multi-statement script, i.e. a single round-trip.
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        telegram_id BIGINT UNIQUE NOT NULL,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        preferences TEXT
+    );
+    CREATE TABLE IF NOT EXISTS projects (
+        id SERIAL PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT,
+        user_id INTEGER NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    CREATE TABLE IF NOT EXISTS tasks (
+        id SERIAL PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        description TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        due_date TEXT,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    CREATE TABLE IF NOT EXISTS weather_preferences (
+        user_id INTEGER PRIMARY KEY,
+        location TEXT NOT NULL,
+        time TEXT DEFAULT '08:00',
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    CREATE TABLE IF NOT EXISTS digest_subscriptions (
+        user_id INTEGER PRIMARY KEY,
+        chat_id BIGINT NOT NULL,
+        time TEXT NOT NULL,
+        FOREIGN KEY (user_id) REFERENCES users (id)
+    );
+    CREATE INDEX IF NOT EXISTS digest_subscriptions_time_idx ON digest_subscriptions (time);
+    CREATE INDEX IF NOT EXISTS weather_preferences_time_idx ON weather_preferences (time);
+    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+        name TEXT NOT NULL,
+        callback TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        run_at TIMESTAMPTZ NOT NULL,
+        days INTEGER[],
+        chat_id BIGINT,
+        user_id BIGINT,
+        data TEXT
+    );
+    -- Instance whose snapshot a row belongs to; NULL for snapshots from before instances were told apart.
+    ALTER TABLE scheduled_jobs ADD COLUMN IF NOT EXISTS owner TEXT;
+    ALTER TABLE tasks ADD COLUMN IF NOT EXISTS recurrence TEXT;
+    ALTER TABLE tasks ADD COLUMN IF NOT EXISTS next_due TIMESTAMPTZ;
+    -- Partial index: the materializer only ever scans recurring tasks by next occurrence.
+    CREATE INDEX IF NOT EXISTS tasks_next_due_idx ON tasks (next_due) WHERE recurrence IS NOT NULL;
+    CREATE TABLE IF NOT EXISTS task_history (
+        id SERIAL PRIMARY KEY,
+        task_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        due_date TEXT,
+        outcome TEXT NOT NULL,
+        recorded_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    CREATE INDEX IF NOT EXISTS task_history_task_idx ON task_history (task_id, id);
+    ALTER TABLE weather_preferences ADD COLUMN IF NOT EXISTS location_id TEXT;
+    CREATE TABLE IF NOT EXISTS geocoded_locations (
+        query TEXT PRIMARY KEY,
+        location_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        lat DOUBLE PRECISION NOT NULL,
+        lon DOUBLE PRECISION NOT NULL
+    );
+    ALTER TABLE tasks ADD COLUMN IF NOT EXISTS project_id INTEGER REFERENCES projects (id) ON DELETE SET NULL;
+    CREATE INDEX IF NOT EXISTS tasks_user_project_idx ON tasks (user_id, project_id);
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id SERIAL PRIMARY KEY,
+        text TEXT NOT NULL,
+        created_by BIGINT NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        status TEXT NOT NULL DEFAULT 'running',
+        last_user_id INTEGER NOT NULL DEFAULT 0,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0
+    );
+    ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS owner TEXT;
+    ALTER TABLE broadcasts ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ;
+    CREATE TABLE IF NOT EXISTS broadcast_failures (
+        broadcast_id INTEGER NOT NULL REFERENCES broadcasts (id) ON DELETE CASCADE,
+        user_id INTEGER NOT NULL,
+        error TEXT NOT NULL,
+        PRIMARY KEY (broadcast_id, user_id)
+    );
+    CREATE TABLE IF NOT EXISTS reminders (
+        id SERIAL PRIMARY KEY,
+        chat_id BIGINT NOT NULL,
+        user_id INTEGER NOT NULL REFERENCES users (id),
+        name TEXT NOT NULL,
+        time TEXT NOT NULL,
+        text TEXT,
+        UNIQUE (chat_id, name)
+    );
+    CREATE INDEX IF NOT EXISTS reminders_time_idx ON reminders (time);
+    -- users.preferences was created as TEXT and never written; it holds a JSON object.
+    DO $$
+    BEGIN
+        IF (SELECT data_type FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'preferences') = 'text' THEN
+            ALTER TABLE users ALTER COLUMN preferences TYPE JSONB USING NULLIF(preferences, '')::jsonb;
+        END IF;
+    END $$;
+"""
+
+async def init_db():
+    """Initialize the database and create necessary tables."""
+    logger.info("Initializing the database.")
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        # DDL statements are auto-committed if not in an explicit transaction.
+        # The cache listener connects in parallel with the schema check.
+        await asyncio.gather(conn.execute(SCHEMA), start_cache_listener())
+    logger.info("Database initialized successfully.")
+
+async def close_db():
+    """Stop the cache listener and close the pool, if they were opened."""
+    global _pool
+    await stop_cache_listener()
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        logger.info("Database connection pool closed.")
+
+async def get_or_create_user(telegram_id, username, first_name, last_name):
+    """Check if a user exists; otherwise, create a new one."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        user = await conn.fetchrow("SELECT * FROM users WHERE telegram_id = $1", telegram_id)
+        if not user:
+            await conn.execute("""
+                INSERT INTO users (telegram_id, username, first_name, last_name)
+                VALUES ($1, $2, $3, $4)
+            """, telegram_id, username, first_name, last_name)
+            logger.info(f"New user created: {first_name} {last_name} ({username})")
+        else:
+            logger.info(f"User exists: {first_name} {last_name} ({username})")
+
+_user_ids = IdCache()
+
+async def get_user_id(telegram_id):
+    """Fetch the user ID from the database based on the Telegram ID."""
+    # The mapping never changes once a user exists, so recently used ids are kept in memory.
+    user_id = _user_ids.get(telegram_id)
+    if user_id is not None:
+        return user_id
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow("SELECT id FROM users WHERE telegram_id = $1", telegram_id)
+        if row:
+            _user_ids.put(telegram_id, row["id"])
+            return row["id"]
+    return None
+
+async def load_preferences(telegram_id):
+    """Return the stored preferences of a user as a dict (empty when none are set)."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        raw = await conn.fetchval("SELECT preferences::text FROM users WHERE telegram_id = $1", telegram_id)
+    return json.loads(raw) if raw else {}
+
+async def save_preferences(changes):
+    """
+    Merge `changes` ({telegram_id: {key: value}}) into users.preferences in one
+    statement; a None value removes the key. Other instances drop their cached
+    copies of these users' preferences.
+    """
+    if not changes:
+        return
+    telegram_ids = list(changes)
+    patches = [json.dumps(changes[telegram_id]) for telegram_id in telegram_ids]
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("""
+            UPDATE users u
+            SET preferences = jsonb_strip_nulls(COALESCE(u.preferences, '{}'::jsonb) || c.patch::jsonb)
+            FROM unnest($1::bigint[], $2::text[]) AS c(telegram_id, patch)
+            WHERE u.telegram_id = c.telegram_id
+        """, telegram_ids, patches)
+        for telegram_id in telegram_ids:
+            await _notify_change(conn, PREFERENCES_CACHE, telegram_id)
+
+async def add_project_to_db(user_id: int, project_name: str, description: str = None) -> bool:
+    """Add a new project for a user."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        try:
+            row = await conn.fetchrow("""
+                INSERT INTO projects (name, description, user_id)
+                VALUES ($1, $2, $3)
+                RETURNING name, description
+            """, project_name, description, user_id)
+            projects_cache.patch(user_id, lambda rows: rows + [row])
+            await _notify_change(conn, projects_cache.name, user_id)
+            return True
+        except Exception as e:
+            logger.error(f"Error adding project: {e}")
+            return False
+
+async def get_projects_from_db(user_id: int):
+    """Fetch all projects for a specific user."""
+    rows = projects_cache.get(user_id)
+    if rows is not None:
+        return rows
+    generation = projects_cache.generation(user_id)
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("SELECT name, description FROM projects WHERE user_id = $1", user_id)
+    projects_cache.put(user_id, rows, generation)
+    return rows
+
+async def delete_project_from_db(user_id: int, project_name: str) -> bool:
+    """Delete a specific project for a user."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        deleted = await conn.fetch("DELETE FROM projects WHERE name = $1 AND user_id = $2 RETURNING id", project_name, user_id)
+        if not deleted:
+            return False
+        projects_cache.patch(user_id, lambda rows: [r for r in rows if r["name"] != project_name])
+        await _notify_change(conn, projects_cache.name, user_id)
+        return True
+
+_TASK_LIST_QUERY = "SELECT id, description, status, due_date FROM tasks WHERE user_id = $1 ORDER BY id ASC"
+
+async def get_tasks_from_db(user_id: int):
+    """Retrieve all tasks for a specific user."""
+    rows = tasks_cache.get(user_id)
+    if rows is not None:
+        return rows
+    generation = tasks_cache.generation(user_id)
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(_TASK_LIST_QUERY, user_id)
+    tasks_cache.put(user_id, rows, generation)
+    return rows
+
+async def add_task_to_db(user_id: int, description: str, due_date: str = None) -> bool:
+    """Add a new task for a user."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        try:
+            row = await conn.fetchrow("""
+                INSERT INTO tasks (user_id, description, due_date, status)
+                VALUES ($1, $2, $3, $4)
+                RETURNING id, description, status, due_date
+            """, user_id, description, due_date, "Pending")
+            tasks_cache.patch(user_id, lambda rows: rows + [row])
+            await _notify_change(conn, tasks_cache.name, user_id)
+            return True
+        except Exception as e:
+            logger.error(f"Error adding task: {e}")
+            return False
+
+def _split_changed(rows):
+    """Return (the row flagged as changed or None, all rows) from a write-and-refresh query."""
+    changed = next((r for r in rows if r["changed"]), None)
+    return changed, rows
+
+async def _complete_occurrence(conn, user_id: int, task_id: int):
+    """
+    Complete the current occurrence of a recurring task: record it in task_history
+    and move the task on to its next occurrence. Returns the task row, or None if
+    the user has no such recurring task.
+    """
+    async with conn.transaction():
+        current = await conn.fetchrow("""
+            SELECT recurrence, due_date, next_due FROM tasks
+            WHERE id = $1 AND user_id = $2 AND recurrence IS NOT NULL
+            FOR UPDATE
+        """, task_id, user_id)
+        if current is None:
+            return None
+        await conn.execute("""
+            INSERT INTO task_history (task_id, user_id, due_date, outcome)
+            VALUES ($1, $2, $3, 'Completed')
+        """, task_id, user_id, current["due_date"])
+        # Imported tasks may lack next_due; their next occurrence then counts from now.
+        due = current["next_due"] or next_occurrence(current["recurrence"], datetime.now(timezone.utc))
+        return await conn.fetchrow("""
+            UPDATE tasks SET status = 'Pending', due_date = $2, next_due = $3
+            WHERE id = $1
+            RETURNING id, description, status, due_date
+        """, task_id, format_due(due), next_occurrence(current["recurrence"], due))
+
+async def update_task(user_id: int, task_id: int, status: str, refresh: bool = True):
+    """
+    Update the status of one of the user's tasks in a single round-trip.
+    Completing a recurring task instead records the occurrence in its history
+    and moves the task on to the next one.
+    Returns (task, tasks): the updated row (None if the user has no such task)
+    and, when `refresh` is set, the user's refreshed task list.
+    """
+    generation = tasks_cache.generation(user_id)
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        try:
+            if status == "Completed":
+                task = await _complete_occurrence(conn, user_id, task_id)
+                if task is not None:
+                    tasks = await conn.fetch(_TASK_LIST_QUERY, user_id) if refresh else None
+                    if tasks is not None:
+                        tasks_cache.put(user_id, tasks, generation)
+                    else:
+                        tasks_cache.patch(user_id, lambda rows: [task if r["id"] == task_id else r for r in rows])
+                    await _notify_change(conn, tasks_cache.name, user_id)
+                    return task, tasks
+            if not refresh:
+                task = await conn.fetchrow("""
+                    UPDATE tasks SET status = $1
+                    WHERE id = $2 AND user_id = $3
+                    RETURNING id, description, status, due_date
+                """, status, task_id, user_id)
+                if task is not None:
+                    tasks_cache.patch(user_id, lambda rows: [task if r["id"] == task_id else r for r in rows])
+                    await _notify_change(conn, tasks_cache.name, user_id)
+                return task, None
+            # The outer SELECT sees the pre-update snapshot, so the new status is taken from the CTE.
+            rows = await conn.fetch("""
+                WITH updated AS (
+                    UPDATE tasks SET status = $1
+                    WHERE id = $2 AND user_id = $3
+                    RETURNING id, status
+                )
+                SELECT t.id, t.description, COALESCE(u.status, t.status) AS status, t.due_date,
+                       u.id IS NOT NULL AS changed
+                FROM tasks t LEFT JOIN updated u ON u.id = t.id
+                WHERE t.user_id = $3
+                ORDER BY t.id ASC
+            """, status, task_id, user_id)
+            task, tasks = _split_changed(rows)
+            tasks_cache.put(user_id, tasks, generation)
+            if task is not None:
+                await _notify_change(conn, tasks_cache.name, user_id)
+            return task, tasks
+        except Exception as e:
+            logger.error(f"Error updating task: {e}")
+            return None, None
+
+async def delete_task(user_id: int, task_id: int, refresh: bool = True):
+    """
+    Delete one of the user's tasks in a single round-trip.
+    Returns (task, tasks): the deleted row (None if the user has no such task)
+    and, when `refresh` is set, the user's remaining tasks.
+    """
+    generation = tasks_cache.generation(user_id)
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        try:
+            if not refresh:
+                task = await conn.fetchrow("""
+                    DELETE FROM tasks WHERE id = $1 AND user_id = $2
+                    RETURNING id, description, status, due_date
+                """, task_id, user_id)
+                if task is not None:
+                    tasks_cache.patch(user_id, lambda rows: [r for r in rows if r["id"] != task_id])
+                    await _notify_change(conn, tasks_cache.name, user_id)
+                return task, None
+            rows = await conn.fetch("""
+                WITH deleted AS (
+                    DELETE FROM tasks WHERE id = $1 AND user_id = $2
+                    RETURNING id
+                )
+                SELECT t.id, t.description, t.status, t.due_date,
+                       d.id IS NOT NULL AS changed
+                FROM tasks t LEFT JOIN deleted d ON d.id = t.id
+                WHERE t.user_id = $2
+                ORDER BY t.id ASC
+            """, task_id, user_id)
+            task, rows = _split_changed(rows)
+            tasks = [r for r in rows if not r["changed"]]
+            tasks_cache.put(user_id, tasks, generation)
+            if task is not None:
+                await _notify_change(conn, tasks_cache.name, user_id)
+            return task, tasks
+        except Exception as e:
+            logger.error(f"Error deleting task: {e}")
+            return None, None
+
+# ---------- PROJECT PROGRESS ----------
+# Project names are not unique per user; the oldest project with a name is the one addressed by it.
+_PROJECT_BY_NAME = "(SELECT min(id) FROM projects WHERE user_id = $1 AND name = $2)"
+
+async def get_project_status_counts(user_id: int, project_name: str):
+    """
+    One row per task status of a project (status is NULL for a project without
+    tasks), counted by the database in a single GROUP BY. Empty if there is
+    no such project.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch(f"""
+            SELECT p.name, p.description, t.status, count(t.id) AS count
+            FROM projects p LEFT JOIN tasks t ON t.project_id = p.id
+            WHERE p.id = {_PROJECT_BY_NAME}
+            GROUP BY p.name, p.description, t.status
+            ORDER BY t.status
+        """, user_id, project_name)
+
+async def get_projects_progress(user_id: int):
+    """Every project of a user with its total and completed task counts."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("""
+            SELECT p.name, p.description, count(t.id) AS total,
+                   count(t.id) FILTER (WHERE t.status = 'Completed') AS completed
+            FROM projects p LEFT JOIN tasks t ON t.project_id = p.id
+            WHERE p.user_id = $1
+            GROUP BY p.id, p.name, p.description
+            ORDER BY p.id
+        """, user_id)
+
+async def get_project_tasks(user_id: int, project_name: str):
+    """The user's tasks in one project, read through tasks_user_project_idx."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch(f"""
+            SELECT id, description, status, due_date FROM tasks
+            WHERE user_id = $1 AND project_id = {_PROJECT_BY_NAME}
+            ORDER BY id ASC
+        """, user_id, project_name)
+
+async def assign_task_to_project(user_id: int, task_id: int, project_name: str = None):
+    """
+    Attach one of the user's tasks to a project, or detach it when `project_name` is None.
+    Returns True on success, False if there is no such task and None if there is no such project.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            project_id = None
+            if project_name is not None:
+                project_id = await conn.fetchval(f"SELECT {_PROJECT_BY_NAME}", user_id, project_name)
+                if project_id is None:
+                    return None
+            updated = await conn.fetchval(
+                "UPDATE tasks SET project_id = $3 WHERE id = $2 AND user_id = $1 RETURNING id",
+                user_id, task_id, project_id)
+    return updated is not None
+
+# ---------- RECURRING TASKS ----------
+async def add_recurring_task(user_id: int, description: str, rule: str, first_due):
+    """
+    Add a task that recurs by the cron expression `rule`, first due at `first_due`.
+    Returns the new task row, or None on error.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        try:
+            row = await conn.fetchrow("""
+                INSERT INTO tasks (user_id, description, status, due_date, recurrence, next_due)
+                VALUES ($1, $2, 'Pending', $3, $4, $5)
+                RETURNING id, description, status, due_date
+            """, user_id, description, format_due(first_due), rule, next_occurrence(rule, first_due))
+            tasks_cache.patch(user_id, lambda rows: rows + [row])
+            await _notify_change(conn, tasks_cache.name, user_id)
+            return row
+        except Exception as e:
+            logger.error(f"Error adding recurring task: {e}")
+            return None
+
+async def get_due_recurring_tasks(now, limit: int = 500):
+    """Recurring tasks whose next occurrence has started by `now`, oldest first (via tasks_next_due_idx)."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("""
+            SELECT id, user_id, recurrence, due_date, next_due FROM tasks
+            WHERE recurrence IS NOT NULL AND next_due <= $1
+            ORDER BY next_due
+            LIMIT $2
+        """, now, limit)
+
+async def roll_recurring_tasks(rolls):
+    """
+    Move overdue recurring tasks on to a later occurrence in one transaction.
+    `rolls` holds (task_id, user_id, missed due_date, scanned next_due, new due
+    datetime, new next_due). A task whose next_due changed since the scan (it
+    was completed meanwhile) is left alone; for the others the occurrence that
+    was left open is recorded in task_history as 'Missed'. Returns how many
+    tasks were rolled.
+    """
+    if not rolls:
+        return 0
+    ids, user_ids, missed, scanned, dues, next_dues = (list(column) for column in zip(*rolls))
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        rolled = await conn.fetch("""
+            WITH rolled AS (
+                UPDATE tasks t SET status = 'Pending', due_date = r.due_date, next_due = r.next_due
+                FROM unnest($1::int[], $2::timestamptz[], $3::text[], $4::timestamptz[])
+                     AS r(id, scanned_next_due, due_date, next_due)
+                WHERE t.id = r.id AND t.next_due = r.scanned_next_due
+                RETURNING t.id, t.user_id
+            ), history AS (
+                INSERT INTO task_history (task_id, user_id, due_date, outcome)
+                SELECT rolled.id, rolled.user_id, m.due_date, 'Missed'
+                FROM rolled JOIN unnest($1::int[], $5::text[]) AS m(id, due_date) ON m.id = rolled.id
+            )
+            SELECT id, user_id FROM rolled
+        """, ids, scanned, [format_due(due) for due in dues], next_dues, missed)
+        for user_id in {row["user_id"] for row in rolled}:
+            tasks_cache.invalidate(user_id)
+            await _notify_change(conn, tasks_cache.name, user_id)
+    return len(rolled)
+
+async def get_task_history(user_id: int, task_id: int, limit: int = 10):
+    """The most recent recorded occurrences of one of the user's recurring tasks."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("""
+            SELECT due_date, outcome, recorded_at FROM task_history
+            WHERE task_id = $1 AND user_id = $2
+            ORDER BY id DESC
+            LIMIT $3
+        """, task_id, user_id, limit)
+
+async def save_weather_preference(user_id, location, time='08:00', location_id=None):
+    """
+    Save or update user weather preferences; `location_id` is the canonical id
+    from bot.geocoding. Returns the time previously saved, or None.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        # Every part of the statement sees the table as it was before the upsert.
+        return await conn.fetchval("""
+            WITH previous AS (
+                SELECT time FROM weather_preferences WHERE user_id = $1
+            ), saved AS (
+                INSERT INTO weather_preferences (user_id, location, time, location_id)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (user_id) DO UPDATE SET location = $2, time = $3, location_id = $4
+            )
+            SELECT time FROM previous
+        """, user_id, location, time, location_id)
+
+async def get_weather_preference(user_id):
+    """Retrieve the user's weather preferences."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow("SELECT location, time, location_id FROM weather_preferences WHERE user_id = $1", user_id)
+    return row
+
+async def get_weather_slots():
+    """Distinct HH:MM times at which weather is delivered, by daily updates or digests."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT time FROM weather_preferences
+            UNION
+            SELECT time FROM digest_subscriptions
+        """)
+    return [row["time"] for row in rows]
+
+async def get_weather_locations(time: str):
+    """Distinct (location_id, location) pairs whose weather is delivered at `time` (HH:MM UTC)."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("""
+            SELECT location_id, location FROM weather_preferences WHERE time = $1
+            UNION
+            SELECT w.location_id, w.location FROM digest_subscriptions d
+            JOIN weather_preferences w ON w.user_id = d.user_id
+            WHERE d.time = $1
+        """, time)
+
+async def get_location(query: str):
+    """The canonical location a normalized query was resolved to before, or None."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchrow(
+            "SELECT location_id, name, lat, lon FROM geocoded_locations WHERE query = $1", query)
+
+async def save_location(query: str, location_id: str, name: str, lat: float, lon: float):
+    """Remember what a normalized query resolves to."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("""
+            INSERT INTO geocoded_locations (query, location_id, name, lat, lon)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (query) DO NOTHING
+        """, query, location_id, name, lat, lon)
+
+async def save_job_snapshot(owner: str, rows):
+    """Replace the job snapshot of instance `owner` with `rows`; other instances' snapshots are kept."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("DELETE FROM scheduled_jobs WHERE owner = $1", owner)
+            await conn.executemany("""
+                INSERT INTO scheduled_jobs (owner, name, callback, kind, run_at, days, chat_id, user_id, data)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+            """, [(owner, *row) for row in rows])
+
+async def load_job_snapshot(owner: str):
+    """
+    Take the jobs instance `owner` persisted at its last shutdown, deleting
+    them in the same statement so a later boot never restores them twice.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("""
+            DELETE FROM scheduled_jobs WHERE owner = $1 OR owner IS NULL
+            RETURNING name, callback, kind, run_at, days, chat_id, user_id, data
+        """, owner)
+
+async def save_digest_subscription(user_id: int, chat_id: int, time: str):
+    """Opt a user in to the daily digest at `time` (HH:MM UTC); returns their previous time, or None."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval("""
+            WITH previous AS (
+                SELECT time FROM digest_subscriptions WHERE user_id = $1
+            ), saved AS (
+                INSERT INTO digest_subscriptions (user_id, chat_id, time)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (user_id) DO UPDATE SET chat_id = $2, time = $3
+            )
+            SELECT time FROM previous
+        """, user_id, chat_id, time)
+
+async def delete_digest_subscription(user_id: int):
+    """Opt a user out of the daily digest; returns the time they were subscribed at, or None."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval("DELETE FROM digest_subscriptions WHERE user_id = $1 RETURNING time", user_id)
+
+async def get_digest_slots():
+    """Distinct HH:MM times that have at least one digest subscriber."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("SELECT DISTINCT time FROM digest_subscriptions")
+    return [row["time"] for row in rows]
+
+async def get_digest_batch(time: str):
+    """
+    Everything needed to build the digests of one time slot in a single query:
+    one row per subscriber with their weather location and open tasks as JSON.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("""
+            SELECT d.user_id, d.chat_id, w.location, w.location_id, u.preferences ->> 'units' AS units,
+                   COALESCE(
+                       json_agg(json_build_object('id', t.id, 'description', t.description,
+                                                  'status', t.status, 'due_date', t.due_date)
+                                ORDER BY t.due_date NULLS LAST, t.id)
+                       FILTER (WHERE t.id IS NOT NULL),
+                       '[]'
+                   )::text AS tasks
+            FROM digest_subscriptions d
+            JOIN users u ON u.id = d.user_id
+            LEFT JOIN weather_preferences w ON w.user_id = d.user_id
+            LEFT JOIN tasks t ON t.user_id = d.user_id AND t.status <> 'Completed'
+            WHERE d.time = $1
+            GROUP BY d.user_id, d.chat_id, w.location, w.location_id, u.preferences
+        """, time)
+
+# ---------- REMINDERS ----------
+async def save_reminder(chat_id: int, user_id: int, name: str, time: str, text: str = None) -> int:
+    """Create or replace the reminder called `name` in a chat and return its id."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval("""
+            INSERT INTO reminders (chat_id, user_id, name, time, text)
+            VALUES ($1, $2, $3, $4, $5)
+            ON CONFLICT (chat_id, name) DO UPDATE
+            SET user_id = EXCLUDED.user_id, time = EXCLUDED.time, text = EXCLUDED.text
+            RETURNING id
+        """, chat_id, user_id, name, time, text)
+
+async def get_reminders(chat_id: int):
+    """The reminders of a chat, in order of time."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch(
+            "SELECT id, name, time, text FROM reminders WHERE chat_id = $1 ORDER BY time, name", chat_id)
+
+async def delete_reminders(chat_id: int, name: str = None, reminder_id: int = None) -> int:
+    """Delete one reminder of a chat by name or id, or all of them; returns how many were deleted."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+            DELETE FROM reminders
+            WHERE chat_id = $1 AND ($2::text IS NULL OR name = $2) AND ($3::int IS NULL OR id = $3)
+            RETURNING id
+        """, chat_id, name, reminder_id)
+    return len(rows)
+
+async def get_reminder_slots():
+    """Distinct HH:MM times at which at least one reminder fires."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("SELECT DISTINCT time FROM reminders")
+    return [row["time"] for row in rows]
+
+async def get_reminder_batch(time: str):
+    """Every reminder of a slot with its text; NULL text falls back to the user's reminder_text preference."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("""
+            SELECT r.chat_id, r.name, COALESCE(r.text, u.preferences ->> 'reminder_text') AS text
+            FROM reminders r
+            JOIN users u ON u.id = r.user_id
+            WHERE r.time = $1
+        """, time)
+
+# ---------- BROADCASTS ----------
+async def create_broadcast(text: str, created_by: int, owner: str) -> int:
+    """Record a new broadcast, claimed by `owner`, and return its id."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchval("""
+            INSERT INTO broadcasts (text, created_by, owner, claimed_at) VALUES ($1, $2, $3, now()) RETURNING id
+        """, text, created_by, owner)
+
+async def claim_broadcasts(owner: str, stale_after: int, limit: int = 100):
+    """
+    Claim running broadcasts nobody owns, or whose owner has not checkpointed
+    for `stale_after` seconds, and return them. Each is claimed by one caller only.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("""
+            UPDATE broadcasts SET owner = $1, claimed_at = now()
+            WHERE id IN (
+                SELECT id FROM broadcasts
+                WHERE status = 'running' AND (owner IS NULL OR claimed_at < now() - $2::int * interval '1 second')
+                ORDER BY id
+                LIMIT $3
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, text, created_by, last_user_id
+        """, owner, stale_after, limit)
+
+async def release_broadcasts(owner: str):
+    """Give up `owner`'s claim on its unfinished broadcasts so the next instance to start resumes them."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("UPDATE broadcasts SET owner = NULL WHERE owner = $1 AND status = 'running'", owner)
+
+async def get_broadcasts(status: str = None, limit: int = 5):
+    """The most recent broadcasts, optionally only those with `status`."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("""
+            SELECT id, text, created_by, created_at, status, last_user_id, sent, failed
+            FROM broadcasts
+            WHERE $1::text IS NULL OR status = $1::text
+            ORDER BY id DESC
+            LIMIT $2
+        """, status, limit)
+
+async def iter_broadcast_recipients(after_user_id: int = 0, page_size: int = 500):
+    """
+    Yield (id, telegram_id) of every user after `after_user_id` in id order.
+    Each page is a short keyset query on its own connection, so a long
+    broadcast holds neither a connection nor a transaction between pages.
+    """
+    pool = await get_db_pool()
+    while True:
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(
+                "SELECT id, telegram_id FROM users WHERE id > $1 ORDER BY id LIMIT $2", after_user_id, page_size)
+        for row in rows:
+            yield row
+        if len(rows) < page_size:
+            return
+        after_user_id = rows[-1]["id"]
+
+async def checkpoint_broadcast(broadcast_id: int, owner: str, last_user_id: int, sent: int, failures,
+                               finished: bool = False) -> bool:
+    """
+    Record that every recipient up to `last_user_id` has been handled: `sent`
+    more deliveries succeeded and `failures` lists (user_id, error) for the rest.
+    Also refreshes `owner`'s claim; returns False, recording nothing, if
+    another instance has taken the broadcast over.
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            claimed = await conn.fetchval("""
+                UPDATE broadcasts
+                SET last_user_id = $3, sent = sent + $4, failed = failed + $5, status = $6, claimed_at = now()
+                WHERE id = $1 AND owner = $2
+                RETURNING id
+            """, broadcast_id, owner, last_user_id, sent, len(failures), "done" if finished else "running")
+            if claimed is None:
+                return False
+            await conn.executemany("""
+                INSERT INTO broadcast_failures (broadcast_id, user_id, error)
+                VALUES ($1, $2, $3)
+                ON CONFLICT (broadcast_id, user_id) DO UPDATE SET error = $3
+            """, [(broadcast_id, user_id, error) for user_id, error in failures])
+            return True
+
+# ---------- EXPORT / IMPORT ----------
+
+# $1 is a users.id to export one user, or NULL for the whole instance.
+_EXPORT_QUERY = """
+    SELECT 'project' AS kind, u.telegram_id, p.name, p.description,
+           NULL::text AS status, NULL::text AS due_date,
+           NULL::text AS project, NULL::text AS recurrence, NULL::text AS next_due
+    FROM projects p JOIN users u ON u.id = p.user_id
+    WHERE $1::int IS NULL OR p.user_id = $1::int
+    UNION ALL
+    SELECT 'task', u.telegram_id, NULL, t.description, t.status, t.due_date,
+           p.name, t.recurrence,
+           to_char(t.next_due AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS"+00:00"')
+    FROM tasks t JOIN users u ON u.id = t.user_id
+    LEFT JOIN projects p ON p.id = t.project_id
+    WHERE $1::int IS NULL OR t.user_id = $1::int
+"""
+
+async def copy_export_csv(output, user_id: int = None):
+    """Stream projects and tasks as CSV into `output` (path or binary file) with COPY."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        await conn.copy_from_query(_EXPORT_QUERY, user_id, output=output, format="csv", header=True)
+
+async def iter_export_rows(user_id: int = None, prefetch: int = 500):
+    """Yield export rows through a server-side cursor, `prefetch` rows at a time."""
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            async for row in conn.cursor(_EXPORT_QUERY, user_id, prefetch=prefetch):
+                yield row
+
+async def import_rows(rows, user_id: int = None, batch_size: int = 1000):
+    """
+    Import export-format rows (dicts keyed by EXPORT_COLUMNS) in one transaction.
+    Rows are copied into a temporary staging table in batches of `batch_size`,
+    then inserted server-side, so memory use does not depend on the row count.
+    With `user_id` everything goes to that user; otherwise rows are matched to
+    users by telegram_id, creating bare user records where needed.
+    Returns (projects imported, tasks imported).
+    """
+    pool = await get_db_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TEMP TABLE import_staging (
+                    kind TEXT, telegram_id BIGINT, name TEXT,
+                    description TEXT, status TEXT, due_date TEXT,
+                    project TEXT, recurrence TEXT, next_due TEXT
+                ) ON COMMIT DROP
+            """)
+            batch = []
+            for row in rows:
+                batch.append(tuple(row.get(column) for column in EXPORT_COLUMNS))
+                if len(batch) >= batch_size:
+                    await conn.copy_records_to_table("import_staging", records=batch, columns=EXPORT_COLUMNS)
+                    batch = []
+            if batch:
+                await conn.copy_records_to_table("import_staging", records=batch, columns=EXPORT_COLUMNS)
+
+            if user_id is None:
+                await conn.execute("""
+                    INSERT INTO users (telegram_id)
+                    SELECT DISTINCT telegram_id FROM import_staging WHERE telegram_id IS NOT NULL
+                    ON CONFLICT (telegram_id) DO NOTHING
+                """)
+                owner = "(SELECT u.id FROM users u WHERE u.telegram_id = s.telegram_id)"
+            else:
+                owner = "$1::int"
+            args = () if user_id is None else (user_id,)
+            projects = await conn.fetchval(f"""
+                WITH inserted AS (
+                    INSERT INTO projects (name, description, user_id)
+                    SELECT s.name, s.description, {owner} FROM import_staging s
+                    WHERE s.kind = 'project' AND s.name IS NOT NULL AND {owner} IS NOT NULL
+                    RETURNING 1
+                ) SELECT count(*) FROM inserted
+            """, *args)
+            tasks = await conn.fetchval(f"""
+                WITH inserted AS (
+                    INSERT INTO tasks (user_id, description, status, due_date, project_id, recurrence, next_due)
+                    SELECT {owner}, s.description, COALESCE(s.status, 'Pending'), s.due_date,
+                           (SELECT min(p.id) FROM projects p WHERE p.user_id = {owner} AND p.name = s.project),
+                           s.recurrence, s.next_due::timestamptz
+                    FROM import_staging s
+                    WHERE s.kind = 'task' AND s.description IS NOT NULL AND {owner} IS NOT NULL
+                    RETURNING 1
+                ) SELECT count(*) FROM inserted
+            """, *args)
+        target = "*" if user_id is None else user_id
+        tasks_cache.invalidate(user_id)
+        projects_cache.invalidate(user_id)
+        await _notify_change(conn, tasks_cache.name, target)
+        await _notify_change(conn, projects_cache.name, target)
+    return projects, tasks
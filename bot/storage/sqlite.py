@@ -0,0 +1,919 @@
+import os
+import io
+import csv
+import json
+import queue
+import sqlite3
+import asyncio
+import itertools
+import threading
+from datetime import datetime, timezone
+from bot.utils import logger
+from bot.cache import tasks_cache, projects_cache, IdCache
+from bot.cron import next_occurrence, format_due
+from bot.storage import API, EXPORT_COLUMNS
+
+__all__ = list(API)
+
+# ":memory:" keeps everything in the writer's connection, e.g. for tests.
+SQLITE_PATH = os.getenv("SQLITE_PATH", "projects.db")
+# Maximum number of queued writes committed together in one transaction.
+WRITE_BATCH_SIZE = 64
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        telegram_id INTEGER UNIQUE NOT NULL,
+        username TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        preferences TEXT
+    );
+    CREATE TABLE IF NOT EXISTS projects (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        description TEXT,
+        user_id INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        description TEXT NOT NULL,
+        status TEXT DEFAULT 'pending',
+        due_date TEXT
+    );
+    CREATE TABLE IF NOT EXISTS weather_preferences (
+        user_id INTEGER PRIMARY KEY,
+        location TEXT NOT NULL,
+        time TEXT DEFAULT '08:00'
+    );
+    CREATE TABLE IF NOT EXISTS digest_subscriptions (
+        user_id INTEGER PRIMARY KEY,
+        chat_id INTEGER NOT NULL,
+        time TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS digest_subscriptions_time_idx ON digest_subscriptions (time);
+    CREATE INDEX IF NOT EXISTS weather_preferences_time_idx ON weather_preferences (time);
+    CREATE TABLE IF NOT EXISTS scheduled_jobs (
+        name TEXT NOT NULL,
+        callback TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        run_at TEXT NOT NULL,
+        days TEXT,
+        chat_id INTEGER,
+        user_id INTEGER,
+        data TEXT
+    );
+    CREATE TABLE IF NOT EXISTS task_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        task_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        due_date TEXT,
+        outcome TEXT NOT NULL,
+        recorded_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS task_history_task_idx ON task_history (task_id, id);
+    CREATE TABLE IF NOT EXISTS geocoded_locations (
+        query TEXT PRIMARY KEY,
+        location_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS reminders (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        time TEXT NOT NULL,
+        text TEXT,
+        UNIQUE (chat_id, name)
+    );
+    CREATE INDEX IF NOT EXISTS reminders_time_idx ON reminders (time);
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        text TEXT NOT NULL,
+        created_by INTEGER NOT NULL,
+        created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        status TEXT NOT NULL DEFAULT 'running',
+        last_user_id INTEGER NOT NULL DEFAULT 0,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS broadcast_failures (
+        broadcast_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        error TEXT NOT NULL,
+        PRIMARY KEY (broadcast_id, user_id)
+    );
+"""
+
+# Columns added after the first release; SQLite has no ADD COLUMN IF NOT EXISTS.
+COLUMNS = (
+    ("tasks", "recurrence", "TEXT"),
+    ("tasks", "next_due", "TEXT"),
+    ("weather_preferences", "location_id", "TEXT"),
+    ("tasks", "project_id", "INTEGER REFERENCES projects (id) ON DELETE SET NULL"),
+    ("scheduled_jobs", "owner", "TEXT"),
+    ("broadcasts", "owner", "TEXT"),
+    ("broadcasts", "claimed_at", "TEXT"),
+)
+
+# Indexes on the columns above, created once they exist.
+INDEXES = """
+    CREATE INDEX IF NOT EXISTS tasks_next_due_idx ON tasks (next_due) WHERE recurrence IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS tasks_user_project_idx ON tasks (user_id, project_id);
+"""
+
+def _migrate(conn):
+    for table, column, decl in COLUMNS:
+        existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+    conn.executescript(INDEXES)
+
+def _connect(path, check_same_thread=True):
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+# ---------- WRITER THREAD ----------
+class _Writer(threading.Thread):
+    """
+    Owns the only writing connection. Queued operations are drained in
+    batches of up to WRITE_BATCH_SIZE and committed together; each runs in
+    its own savepoint so one failing operation does not roll back the rest.
+    """
+
+    def __init__(self, path):
+        super().__init__(name="sqlite-writer", daemon=True)
+        self.path = path
+        self.ops = queue.Queue()
+        self.ready = threading.Event()
+        self.error = None
+        self.conn = None
+
+    def run(self):
+        try:
+            self.conn = _connect(self.path)
+            if self.path != ":memory:":
+                self.conn.execute("PRAGMA journal_mode = WAL")
+                self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.conn.executescript(SCHEMA)
+            _migrate(self.conn)
+        except Exception as e:
+            self.error = e
+            return
+        finally:
+            self.ready.set()
+
+        stopping = False
+        while not stopping:
+            batch = [self.ops.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self.ops.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                stopping = True
+                batch = [op for op in batch if op is not None]
+            if batch:
+                self._run_batch(batch)
+        self.conn.close()
+
+    def _run_batch(self, batch):
+        results = []
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            for fn, future, loop in batch:
+                self.conn.execute("SAVEPOINT op")
+                try:
+                    result = fn(self.conn)
+                except Exception as e:
+                    self.conn.execute("ROLLBACK TO op")
+                    results.append((future, loop, None, e))
+                else:
+                    results.append((future, loop, result, None))
+                self.conn.execute("RELEASE op")
+            self.conn.execute("COMMIT")
+        except Exception as e:
+            # BEGIN, a savepoint or COMMIT failed (locked, disk full, ...):
+            # nothing in the batch was written, and the writer keeps serving.
+            logger.error(f"SQLite write batch of {len(batch)} operations failed: {e}")
+            if self.conn.in_transaction:
+                try:
+                    self.conn.execute("ROLLBACK")
+                except Exception as rollback_error:
+                    logger.error(f"Error rolling back a failed write batch: {rollback_error}")
+            results = [(future, loop, None, e) for _, future, loop in batch]
+        for future, loop, result, error in results:
+            try:
+                loop.call_soon_threadsafe(_resolve, future, result, error)
+            except RuntimeError:
+                # The caller's event loop is already closed.
+                pass
+
+def _resolve(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+_writer = None
+_local = threading.local()
+_reader_conns = []
+_reader_lock = threading.Lock()
+
+async def _write(fn):
+    """Run `fn(conn)` on the writer thread and return its result once committed."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _writer.ops.put((fn, future, loop))
+    return await future
+
+def _reader():
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _connect(SQLITE_PATH, check_same_thread=False)
+        _local.conn = conn
+        with _reader_lock:
+            _reader_conns.append(conn)
+    return conn
+
+async def _read(fn):
+    """Run `fn(conn)` on a worker thread; WAL lets reads proceed alongside the writer."""
+    if SQLITE_PATH == ":memory:":
+        # An in-memory database lives in the writer's connection only.
+        return await _write(fn)
+    return await asyncio.to_thread(lambda: fn(_reader()))
+
+# ---------- LIFECYCLE ----------
+async def init_db():
+    """Open the database, switch it to WAL mode and create the tables."""
+    global _writer
+    if _writer is not None:
+        return
+    logger.info(f"Initializing the SQLite database at {SQLITE_PATH}.")
+    writer = _Writer(SQLITE_PATH)
+    writer.start()
+    await asyncio.to_thread(writer.ready.wait)
+    if writer.error:
+        raise writer.error
+    _writer = writer
+    logger.info("Database initialized successfully.")
+
+async def close_db():
+    """Flush queued writes, stop the writer thread and close reader connections."""
+    global _writer
+    if _writer is not None:
+        _writer.ops.put(None)
+        await asyncio.to_thread(_writer.join)
+        _writer = None
+    with _reader_lock:
+        for conn in _reader_conns:
+            conn.close()
+        _reader_conns.clear()
+    logger.info("SQLite database closed.")
+
+# ---------- USERS ----------
+async def get_or_create_user(telegram_id, username, first_name, last_name):
+    """Check if a user exists; otherwise, create a new one."""
+    def op(conn):
+        return conn.execute("""
+            INSERT OR IGNORE INTO users (telegram_id, username, first_name, last_name)
+            VALUES (?, ?, ?, ?)
+        """, (telegram_id, username, first_name, last_name)).rowcount
+    if await _write(op):
+        logger.info(f"New user created: {first_name} {last_name} ({username})")
+    else:
+        logger.info(f"User exists: {first_name} {last_name} ({username})")
+
+_user_ids = IdCache()
+
+async def get_user_id(telegram_id):
+    """Fetch the user ID from the database based on the Telegram ID."""
+    user_id = _user_ids.get(telegram_id)
+    if user_id is not None:
+        return user_id
+    row = await _read(lambda conn: conn.execute(
+        "SELECT id FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone())
+    if row:
+        _user_ids.put(telegram_id, row["id"])
+        return row["id"]
+    return None
+
+async def load_preferences(telegram_id):
+    """Return the stored preferences of a user as a dict (empty when none are set)."""
+    row = await _read(lambda conn: conn.execute(
+        "SELECT preferences FROM users WHERE telegram_id = ?", (telegram_id,)).fetchone())
+    return json.loads(row["preferences"]) if row and row["preferences"] else {}
+
+async def save_preferences(changes):
+    """
+    Merge `changes` ({telegram_id: {key: value}}) into users.preferences in one
+    write; a None value removes the key (JSON merge patch).
+    """
+    if not changes:
+        return
+    params = [(json.dumps(patch), telegram_id) for telegram_id, patch in changes.items()]
+    await _write(lambda conn: conn.executemany(
+        "UPDATE users SET preferences = json_patch(COALESCE(preferences, '{}'), ?) WHERE telegram_id = ?",
+        params))
+
+# ---------- PROJECTS ----------
+async def add_project_to_db(user_id: int, project_name: str, description: str = None) -> bool:
+    """Add a new project for a user."""
+    try:
+        row = await _write(lambda conn: conn.execute("""
+            INSERT INTO projects (name, description, user_id)
+            VALUES (?, ?, ?)
+            RETURNING name, description
+        """, (project_name, description, user_id)).fetchone())
+        projects_cache.patch(user_id, lambda rows: rows + [row])
+        return True
+    except Exception as e:
+        logger.error(f"Error adding project: {e}")
+        return False
+
+async def get_projects_from_db(user_id: int):
+    """Fetch all projects for a specific user."""
+    rows = projects_cache.get(user_id)
+    if rows is not None:
+        return rows
+    generation = projects_cache.generation(user_id)
+    rows = await _read(lambda conn: conn.execute(
+        "SELECT name, description FROM projects WHERE user_id = ?", (user_id,)).fetchall())
+    projects_cache.put(user_id, rows, generation)
+    return rows
+
+async def delete_project_from_db(user_id: int, project_name: str) -> bool:
+    """Delete a specific project for a user; its tasks are kept without a project."""
+    def op(conn):
+        deleted = conn.execute(
+            "DELETE FROM projects WHERE name = ? AND user_id = ? RETURNING id", (project_name, user_id)).fetchall()
+        # Foreign keys are not enforced by default, so ON DELETE SET NULL is applied here.
+        conn.executemany("UPDATE tasks SET project_id = NULL WHERE project_id = ?", [(row["id"],) for row in deleted])
+        return deleted
+    deleted = await _write(op)
+    if not deleted:
+        return False
+    projects_cache.patch(user_id, lambda rows: [r for r in rows if r["name"] != project_name])
+    return True
+
+# ---------- TASKS ----------
+_TASK_LIST_QUERY = "SELECT id, description, status, due_date FROM tasks WHERE user_id = ? ORDER BY id ASC"
+
+async def get_tasks_from_db(user_id: int):
+    """Retrieve all tasks for a specific user."""
+    rows = tasks_cache.get(user_id)
+    if rows is not None:
+        return rows
+    generation = tasks_cache.generation(user_id)
+    rows = await _read(lambda conn: conn.execute(_TASK_LIST_QUERY, (user_id,)).fetchall())
+    tasks_cache.put(user_id, rows, generation)
+    return rows
+
+async def add_task_to_db(user_id: int, description: str, due_date: str = None) -> bool:
+    """Add a new task for a user."""
+    try:
+        row = await _write(lambda conn: conn.execute("""
+            INSERT INTO tasks (user_id, description, due_date, status)
+            VALUES (?, ?, ?, ?)
+            RETURNING id, description, status, due_date
+        """, (user_id, description, due_date, "Pending")).fetchone())
+        tasks_cache.patch(user_id, lambda rows: rows + [row])
+        return True
+    except Exception as e:
+        logger.error(f"Error adding task: {e}")
+        return False
+
+def _complete_occurrence(conn, user_id, task_id):
+    """Record the current occurrence of a recurring task as completed and move on to the next."""
+    current = conn.execute("""
+        SELECT recurrence, due_date, next_due FROM tasks
+        WHERE id = ? AND user_id = ? AND recurrence IS NOT NULL
+    """, (task_id, user_id)).fetchone()
+    if current is None:
+        return None
+    conn.execute("""
+        INSERT INTO task_history (task_id, user_id, due_date, outcome)
+        VALUES (?, ?, ?, 'Completed')
+    """, (task_id, user_id, current["due_date"]))
+    # Imported tasks may lack next_due; their next occurrence then counts from now.
+    if current["next_due"]:
+        due = datetime.fromisoformat(current["next_due"])
+    else:
+        due = next_occurrence(current["recurrence"], datetime.now(timezone.utc))
+    return conn.execute("""
+        UPDATE tasks SET status = 'Pending', due_date = ?, next_due = ?
+        WHERE id = ?
+        RETURNING id, description, status, due_date
+    """, (format_due(due), next_occurrence(current["recurrence"], due).isoformat(), task_id)).fetchone()
+
+async def update_task(user_id: int, task_id: int, status: str, refresh: bool = True):
+    """
+    Update the status of one of the user's tasks; completing a recurring task
+    moves it on to its next occurrence. Returns (task, tasks) like the PostgreSQL backend.
+    """
+    generation = tasks_cache.generation(user_id)
+    def op(conn):
+        if status == "Completed":
+            task = _complete_occurrence(conn, user_id, task_id)
+            if task is not None:
+                return task, conn.execute(_TASK_LIST_QUERY, (user_id,)).fetchall() if refresh else None
+        task = conn.execute("""
+            UPDATE tasks SET status = ?
+            WHERE id = ? AND user_id = ?
+            RETURNING id, description, status, due_date
+        """, (status, task_id, user_id)).fetchone()
+        tasks = conn.execute(_TASK_LIST_QUERY, (user_id,)).fetchall() if refresh else None
+        return task, tasks
+    try:
+        task, tasks = await _write(op)
+    except Exception as e:
+        logger.error(f"Error updating task: {e}")
+        return None, None
+    if tasks is not None:
+        tasks_cache.put(user_id, tasks, generation)
+    elif task is not None:
+        tasks_cache.patch(user_id, lambda rows: [task if r["id"] == task_id else r for r in rows])
+    return task, tasks
+
+async def delete_task(user_id: int, task_id: int, refresh: bool = True):
+    """
+    Delete one of the user's tasks.
+    Returns (task, tasks) like the PostgreSQL backend.
+    """
+    generation = tasks_cache.generation(user_id)
+    def op(conn):
+        task = conn.execute("""
+            DELETE FROM tasks WHERE id = ? AND user_id = ?
+            RETURNING id, description, status, due_date
+        """, (task_id, user_id)).fetchone()
+        tasks = conn.execute(_TASK_LIST_QUERY, (user_id,)).fetchall() if refresh else None
+        return task, tasks
+    try:
+        task, tasks = await _write(op)
+    except Exception as e:
+        logger.error(f"Error deleting task: {e}")
+        return None, None
+    if tasks is not None:
+        tasks_cache.put(user_id, tasks, generation)
+    elif task is not None:
+        tasks_cache.patch(user_id, lambda rows: [r for r in rows if r["id"] != task_id])
+    return task, tasks
+
+# ---------- PROJECT PROGRESS ----------
+# Project names are not unique per user; the oldest project with a name is the one addressed by it.
+_PROJECT_BY_NAME = "(SELECT min(id) FROM projects WHERE user_id = :user_id AND name = :name)"
+
+async def get_project_status_counts(user_id: int, project_name: str):
+    """One row per task status of a project, counted in a single GROUP BY; empty if there is no such project."""
+    return await _read(lambda conn: conn.execute(f"""
+        SELECT p.name, p.description, t.status, count(t.id) AS count
+        FROM projects p LEFT JOIN tasks t ON t.project_id = p.id
+        WHERE p.id = {_PROJECT_BY_NAME}
+        GROUP BY p.name, p.description, t.status
+        ORDER BY t.status
+    """, {"user_id": user_id, "name": project_name}).fetchall())
+
+async def get_projects_progress(user_id: int):
+    """Every project of a user with its total and completed task counts."""
+    return await _read(lambda conn: conn.execute("""
+        SELECT p.name, p.description, count(t.id) AS total,
+               count(t.id) FILTER (WHERE t.status = 'Completed') AS completed
+        FROM projects p LEFT JOIN tasks t ON t.project_id = p.id
+        WHERE p.user_id = ?
+        GROUP BY p.id, p.name, p.description
+        ORDER BY p.id
+    """, (user_id,)).fetchall())
+
+async def get_project_tasks(user_id: int, project_name: str):
+    """The user's tasks in one project, read through tasks_user_project_idx."""
+    return await _read(lambda conn: conn.execute(f"""
+        SELECT id, description, status, due_date FROM tasks
+        WHERE user_id = :user_id AND project_id = {_PROJECT_BY_NAME}
+        ORDER BY id ASC
+    """, {"user_id": user_id, "name": project_name}).fetchall())
+
+async def assign_task_to_project(user_id: int, task_id: int, project_name: str = None):
+    """Attach a task to a project (None detaches it). Same contract as the PostgreSQL backend."""
+    def op(conn):
+        project_id = None
+        if project_name is not None:
+            project_id = conn.execute(f"SELECT {_PROJECT_BY_NAME}",
+                                      {"user_id": user_id, "name": project_name}).fetchone()[0]
+            if project_id is None:
+                return None
+        return conn.execute("UPDATE tasks SET project_id = ? WHERE id = ? AND user_id = ?",
+                            (project_id, task_id, user_id)).rowcount > 0
+    return await _write(op)
+
+# ---------- RECURRING TASKS ----------
+# next_due is stored as an ISO-8601 UTC string, so text comparison orders it correctly.
+async def add_recurring_task(user_id: int, description: str, rule: str, first_due):
+    """Add a task that recurs by the cron expression `rule`; returns the row or None on error."""
+    try:
+        row = await _write(lambda conn: conn.execute("""
+            INSERT INTO tasks (user_id, description, status, due_date, recurrence, next_due)
+            VALUES (?, ?, 'Pending', ?, ?, ?)
+            RETURNING id, description, status, due_date
+        """, (user_id, description, format_due(first_due), rule,
+              next_occurrence(rule, first_due).isoformat())).fetchone())
+    except Exception as e:
+        logger.error(f"Error adding recurring task: {e}")
+        return None
+    tasks_cache.patch(user_id, lambda rows: rows + [row])
+    return row
+
+async def get_due_recurring_tasks(now, limit: int = 500):
+    """Recurring tasks whose next occurrence has started by `now`, oldest first."""
+    rows = await _read(lambda conn: conn.execute("""
+        SELECT id, user_id, recurrence, due_date, next_due FROM tasks
+        WHERE recurrence IS NOT NULL AND next_due <= ?
+        ORDER BY next_due
+        LIMIT ?
+    """, (now.isoformat(), limit)).fetchall())
+    return [dict(row, next_due=datetime.fromisoformat(row["next_due"])) for row in rows]
+
+async def roll_recurring_tasks(rolls):
+    """
+    Move overdue recurring tasks on to a later occurrence in one transaction,
+    skipping tasks completed since the scan. Same contract as the PostgreSQL backend.
+    """
+    if not rolls:
+        return 0
+    def op(conn):
+        rolled, users = 0, set()
+        for task_id, user_id, missed, scanned, due, next_due in rolls:
+            changed = conn.execute("""
+                UPDATE tasks SET status = 'Pending', due_date = ?, next_due = ?
+                WHERE id = ? AND next_due = ?
+            """, (format_due(due), next_due.isoformat(), task_id, scanned.isoformat())).rowcount
+            if changed:
+                conn.execute("""
+                    INSERT INTO task_history (task_id, user_id, due_date, outcome)
+                    VALUES (?, ?, ?, 'Missed')
+                """, (task_id, user_id, missed))
+                rolled += 1
+                users.add(user_id)
+        return rolled, users
+    rolled, users = await _write(op)
+    for user_id in users:
+        tasks_cache.invalidate(user_id)
+    return rolled
+
+async def get_task_history(user_id: int, task_id: int, limit: int = 10):
+    """The most recent recorded occurrences of one of the user's recurring tasks."""
+    return await _read(lambda conn: conn.execute("""
+        SELECT due_date, outcome, recorded_at FROM task_history
+        WHERE task_id = ? AND user_id = ?
+        ORDER BY id DESC
+        LIMIT ?
+    """, (task_id, user_id, limit)).fetchall())
+
+# ---------- WEATHER ----------
+async def save_weather_preference(user_id, location, time='08:00', location_id=None):
+    """Save or update user weather preferences. Same contract as the PostgreSQL backend."""
+    def op(conn):
+        previous = conn.execute("SELECT time FROM weather_preferences WHERE user_id = ?", (user_id,)).fetchone()
+        conn.execute("""
+            INSERT INTO weather_preferences (user_id, location, time, location_id)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET location = excluded.location, time = excluded.time,
+                                                location_id = excluded.location_id
+        """, (user_id, location, time, location_id))
+        return previous["time"] if previous else None
+    return await _write(op)
+
+async def get_weather_preference(user_id):
+    """Retrieve the user's weather preferences."""
+    return await _read(lambda conn: conn.execute(
+        "SELECT location, time, location_id FROM weather_preferences WHERE user_id = ?", (user_id,)).fetchone())
+
+async def get_weather_slots():
+    """Distinct HH:MM times at which weather is delivered, by daily updates or digests."""
+    rows = await _read(lambda conn: conn.execute("""
+        SELECT time FROM weather_preferences
+        UNION
+        SELECT time FROM digest_subscriptions
+    """).fetchall())
+    return [row["time"] for row in rows]
+
+async def get_weather_locations(time: str):
+    """Distinct (location_id, location) pairs whose weather is delivered at `time` (HH:MM UTC)."""
+    return await _read(lambda conn: conn.execute("""
+        SELECT location_id, location FROM weather_preferences WHERE time = :time
+        UNION
+        SELECT w.location_id, w.location FROM digest_subscriptions d
+        JOIN weather_preferences w ON w.user_id = d.user_id
+        WHERE d.time = :time
+    """, {"time": time}).fetchall())
+
+async def get_location(query: str):
+    """The canonical location a normalized query was resolved to before, or None."""
+    return await _read(lambda conn: conn.execute(
+        "SELECT location_id, name, lat, lon FROM geocoded_locations WHERE query = ?", (query,)).fetchone())
+
+async def save_location(query: str, location_id: str, name: str, lat: float, lon: float):
+    """Remember what a normalized query resolves to."""
+    await _write(lambda conn: conn.execute("""
+        INSERT OR IGNORE INTO geocoded_locations (query, location_id, name, lat, lon)
+        VALUES (?, ?, ?, ?, ?)
+    """, (query, location_id, name, lat, lon)))
+
+# ---------- SCHEDULED JOBS ----------
+async def save_job_snapshot(owner: str, rows):
+    """Replace the job snapshot of instance `owner` with `rows`. Same contract as the PostgreSQL backend."""
+    encoded = [
+        (owner, name, callback, kind, run_at.isoformat(), json.dumps(days) if days is not None else None,
+         chat_id, user_id, data)
+        for name, callback, kind, run_at, days, chat_id, user_id, data in rows
+    ]
+    def op(conn):
+        conn.execute("DELETE FROM scheduled_jobs WHERE owner = ?", (owner,))
+        conn.executemany("""
+            INSERT INTO scheduled_jobs (owner, name, callback, kind, run_at, days, chat_id, user_id, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, encoded)
+    await _write(op)
+
+async def load_job_snapshot(owner: str):
+    """Take (and delete) the jobs instance `owner` persisted. Same contract as the PostgreSQL backend."""
+    rows = await _write(lambda conn: conn.execute("""
+        DELETE FROM scheduled_jobs WHERE owner = ? OR owner IS NULL
+        RETURNING name, callback, kind, run_at, days, chat_id, user_id, data
+    """, (owner,)).fetchall())
+    return [
+        dict(row, run_at=datetime.fromisoformat(row["run_at"]),
+             days=json.loads(row["days"]) if row["days"] else None)
+        for row in rows
+    ]
+
+# ---------- DIGEST ----------
+async def save_digest_subscription(user_id: int, chat_id: int, time: str):
+    """Opt a user in to the daily digest at `time` (HH:MM UTC); returns their previous time, or None."""
+    def op(conn):
+        previous = conn.execute("SELECT time FROM digest_subscriptions WHERE user_id = ?", (user_id,)).fetchone()
+        conn.execute("""
+            INSERT INTO digest_subscriptions (user_id, chat_id, time)
+            VALUES (?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET chat_id = excluded.chat_id, time = excluded.time
+        """, (user_id, chat_id, time))
+        return previous["time"] if previous else None
+    return await _write(op)
+
+async def delete_digest_subscription(user_id: int):
+    """Opt a user out of the daily digest; returns the time they were subscribed at, or None."""
+    deleted = await _write(lambda conn: conn.execute(
+        "DELETE FROM digest_subscriptions WHERE user_id = ? RETURNING time", (user_id,)).fetchone())
+    return deleted["time"] if deleted else None
+
+async def get_digest_slots():
+    """Distinct HH:MM times that have at least one digest subscriber."""
+    rows = await _read(lambda conn: conn.execute("SELECT DISTINCT time FROM digest_subscriptions").fetchall())
+    return [row["time"] for row in rows]
+
+async def get_digest_batch(time: str):
+    """One row per subscriber of a slot with their weather location and open tasks as JSON."""
+    return await _read(lambda conn: conn.execute("""
+        SELECT d.user_id, d.chat_id, w.location, w.location_id, json_extract(u.preferences, '$.units') AS units,
+               (SELECT json_group_array(json_object('id', t.id, 'description', t.description,
+                                                    'status', t.status, 'due_date', t.due_date))
+                FROM (SELECT * FROM tasks t
+                      WHERE t.user_id = d.user_id AND t.status <> 'Completed'
+                      ORDER BY t.due_date IS NULL, t.due_date, t.id) t) AS tasks
+        FROM digest_subscriptions d
+        JOIN users u ON u.id = d.user_id
+        LEFT JOIN weather_preferences w ON w.user_id = d.user_id
+        WHERE d.time = ?
+    """, (time,)).fetchall())
+
+# ---------- REMINDERS ----------
+async def save_reminder(chat_id: int, user_id: int, name: str, time: str, text: str = None) -> int:
+    """Create or replace the reminder called `name` in a chat and return its id."""
+    row = await _write(lambda conn: conn.execute("""
+        INSERT INTO reminders (chat_id, user_id, name, time, text)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (chat_id, name) DO UPDATE
+        SET user_id = excluded.user_id, time = excluded.time, text = excluded.text
+        RETURNING id
+    """, (chat_id, user_id, name, time, text)).fetchone())
+    return row["id"]
+
+async def get_reminders(chat_id: int):
+    """The reminders of a chat, in order of time."""
+    return await _read(lambda conn: conn.execute(
+        "SELECT id, name, time, text FROM reminders WHERE chat_id = ? ORDER BY time, name", (chat_id,)).fetchall())
+
+async def delete_reminders(chat_id: int, name: str = None, reminder_id: int = None) -> int:
+    """Delete one reminder of a chat by name or id, or all of them; returns how many were deleted."""
+    rows = await _write(lambda conn: conn.execute("""
+        DELETE FROM reminders
+        WHERE chat_id = :chat_id AND (:name IS NULL OR name = :name) AND (:id IS NULL OR id = :id)
+        RETURNING id
+    """, {"chat_id": chat_id, "name": name, "id": reminder_id}).fetchall())
+    return len(rows)
+
+async def get_reminder_slots():
+    """Distinct HH:MM times at which at least one reminder fires."""
+    rows = await _read(lambda conn: conn.execute("SELECT DISTINCT time FROM reminders").fetchall())
+    return [row["time"] for row in rows]
+
+async def get_reminder_batch(time: str):
+    """Every reminder of a slot with its text; NULL text falls back to the user's reminder_text preference."""
+    return await _read(lambda conn: conn.execute("""
+        SELECT r.chat_id, r.name, COALESCE(r.text, json_extract(u.preferences, '$.reminder_text')) AS text
+        FROM reminders r
+        JOIN users u ON u.id = r.user_id
+        WHERE r.time = ?
+    """, (time,)).fetchall())
+
+# ---------- BROADCASTS ----------
+async def create_broadcast(text: str, created_by: int, owner: str) -> int:
+    """Record a new broadcast, claimed by `owner`, and return its id."""
+    return await _write(lambda conn: conn.execute(
+        "INSERT INTO broadcasts (text, created_by, owner, claimed_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+        (text, created_by, owner)).lastrowid)
+
+async def claim_broadcasts(owner: str, stale_after: int, limit: int = 100):
+    """Claim unowned or stale running broadcasts. Same contract as the PostgreSQL backend."""
+    return await _write(lambda conn: conn.execute("""
+        UPDATE broadcasts SET owner = :owner, claimed_at = CURRENT_TIMESTAMP
+        WHERE id IN (
+            SELECT id FROM broadcasts
+            WHERE status = 'running' AND (owner IS NULL OR claimed_at < datetime('now', :stale))
+            ORDER BY id
+            LIMIT :limit
+        )
+        RETURNING id, text, created_by, last_user_id
+    """, {"owner": owner, "stale": f"-{stale_after} seconds", "limit": limit}).fetchall())
+
+async def release_broadcasts(owner: str):
+    """Give up `owner`'s claim on its unfinished broadcasts."""
+    await _write(lambda conn: conn.execute(
+        "UPDATE broadcasts SET owner = NULL WHERE owner = ? AND status = 'running'", (owner,)))
+
+async def get_broadcasts(status: str = None, limit: int = 5):
+    """The most recent broadcasts, optionally only those with `status`."""
+    return await _read(lambda conn: conn.execute("""
+        SELECT id, text, created_by, created_at, status, last_user_id, sent, failed
+        FROM broadcasts
+        WHERE :status IS NULL OR status = :status
+        ORDER BY id DESC
+        LIMIT :limit
+    """, {"status": status, "limit": limit}).fetchall())
+
+async def iter_broadcast_recipients(after_user_id: int = 0, page_size: int = 500):
+    """
+    Yield (id, telegram_id) of every user after `after_user_id` in id order,
+    one short keyset query per page. Same contract as the PostgreSQL backend.
+    """
+    while True:
+        rows = await _read(lambda conn: conn.execute(
+            "SELECT id, telegram_id FROM users WHERE id > ? ORDER BY id LIMIT ?", (after_user_id, page_size)).fetchall())
+        for row in rows:
+            yield row
+        if len(rows) < page_size:
+            return
+        after_user_id = rows[-1]["id"]
+
+async def checkpoint_broadcast(broadcast_id: int, owner: str, last_user_id: int, sent: int, failures,
+                               finished: bool = False) -> bool:
+    """Record progress up to `last_user_id` and refresh the claim. Same contract as the PostgreSQL backend."""
+    def op(conn):
+        claimed = conn.execute("""
+            UPDATE broadcasts
+            SET last_user_id = ?, sent = sent + ?, failed = failed + ?, status = ?, claimed_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND owner = ?
+            RETURNING id
+        """, (last_user_id, sent, len(failures), "done" if finished else "running", broadcast_id, owner)).fetchone()
+        if claimed is None:
+            return False
+        conn.executemany("""
+            INSERT INTO broadcast_failures (broadcast_id, user_id, error)
+            VALUES (?, ?, ?)
+            ON CONFLICT (broadcast_id, user_id) DO UPDATE SET error = excluded.error
+        """, [(broadcast_id, user_id, error) for user_id, error in failures])
+        return True
+    return await _write(op)
+
+# ---------- EXPORT / IMPORT ----------
+# :user_id is a users.id to export one user, or NULL for the whole instance.
+_EXPORT_QUERY = """
+    SELECT 'project' AS kind, u.telegram_id, p.name, p.description,
+           NULL AS status, NULL AS due_date, NULL AS project, NULL AS recurrence, NULL AS next_due
+    FROM projects p JOIN users u ON u.id = p.user_id
+    WHERE :user_id IS NULL OR p.user_id = :user_id
+    UNION ALL
+    SELECT 'task', u.telegram_id, NULL, t.description, t.status, t.due_date,
+           p.name, t.recurrence, t.next_due
+    FROM tasks t JOIN users u ON u.id = t.user_id
+    LEFT JOIN projects p ON p.id = t.project_id
+    WHERE :user_id IS NULL OR t.user_id = :user_id
+"""
+
+async def copy_export_csv(output, user_id: int = None):
+    """Stream projects and tasks as CSV into `output` (path or binary file)."""
+    def copy(conn):
+        target = open(output, "wb") if isinstance(output, (str, os.PathLike)) else output
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        try:
+            for row in conn.execute(_EXPORT_QUERY, {"user_id": user_id}):
+                writer.writerow(["" if value is None else value for value in row])
+                if buffer.tell() > 64 * 1024:
+                    target.write(buffer.getvalue().encode("utf-8"))
+                    buffer.seek(0)
+                    buffer.truncate()
+            target.write(buffer.getvalue().encode("utf-8"))
+        finally:
+            if target is not output:
+                target.close()
+    await _read(copy)
+
+async def iter_export_rows(user_id: int = None, prefetch: int = 500):
+    """Yield export rows, fetching `prefetch` rows at a time on a worker thread."""
+    if SQLITE_PATH == ":memory:":
+        for row in await _write(lambda conn: conn.execute(_EXPORT_QUERY, {"user_id": user_id}).fetchall()):
+            yield row
+        return
+    conn = await asyncio.to_thread(_connect, SQLITE_PATH, False)
+    try:
+        cursor = await asyncio.to_thread(conn.execute, _EXPORT_QUERY, {"user_id": user_id})
+        while True:
+            rows = await asyncio.to_thread(cursor.fetchmany, prefetch)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        conn.close()
+
+async def import_rows(rows, user_id: int = None, batch_size: int = 1000):
+    """
+    Import export-format rows in chunks of `batch_size`. Rows are parsed off
+    the writer thread and each chunk is one write of its own, so a large
+    import never holds the writer for long; a failing chunk stops the import
+    with the earlier chunks kept. Same matching rules as the PostgreSQL
+    backend; returns (projects imported, tasks imported).
+    """
+    insert = (f"INSERT INTO import_staging ({', '.join(EXPORT_COLUMNS)}) "
+              f"VALUES ({', '.join('?' for _ in EXPORT_COLUMNS)})")
+    owner = "(SELECT u.id FROM users u WHERE u.telegram_id = s.telegram_id)" if user_id is None else ":user_id"
+
+    def import_chunk(chunk):
+        def op(conn):
+            conn.execute("""
+                CREATE TEMP TABLE import_staging (
+                    kind TEXT, telegram_id INTEGER, name TEXT,
+                    description TEXT, status TEXT, due_date TEXT,
+                    project TEXT, recurrence TEXT, next_due TEXT
+                )
+            """)
+            try:
+                conn.executemany(insert, chunk)
+                if user_id is None:
+                    conn.execute("""
+                        INSERT OR IGNORE INTO users (telegram_id)
+                        SELECT DISTINCT telegram_id FROM import_staging WHERE telegram_id IS NOT NULL
+                    """)
+                projects = conn.execute(f"""
+                    INSERT INTO projects (name, description, user_id)
+                    SELECT s.name, s.description, {owner} FROM import_staging s
+                    WHERE s.kind = 'project' AND s.name IS NOT NULL AND {owner} IS NOT NULL
+                """, {"user_id": user_id}).rowcount
+                tasks = conn.execute(f"""
+                    INSERT INTO tasks (user_id, description, status, due_date, project_id, recurrence, next_due)
+                    SELECT {owner}, s.description, COALESCE(s.status, 'Pending'), s.due_date,
+                           (SELECT min(p.id) FROM projects p WHERE p.user_id = {owner} AND p.name = s.project),
+                           s.recurrence, s.next_due
+                    FROM import_staging s
+                    WHERE s.kind = 'task' AND s.description IS NOT NULL AND {owner} IS NOT NULL
+                """, {"user_id": user_id}).rowcount
+                return projects, tasks
+            finally:
+                conn.execute("DROP TABLE temp.import_staging")
+        return op
+
+    def next_chunk():
+        return [tuple(row.get(column) for column in EXPORT_COLUMNS) for row in itertools.islice(rows, batch_size)]
+
+    rows = iter(rows)
+    projects = tasks = 0
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next_chunk)
+            if not chunk:
+                break
+            imported_projects, imported_tasks = await _write(import_chunk(chunk))
+            projects, tasks = projects + imported_projects, tasks + imported_tasks
+    finally:
+        tasks_cache.invalidate(user_id)
+        projects_cache.invalidate(user_id)
+    return projects, tasks
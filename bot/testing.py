@@ -0,0 +1,324 @@
+"""
+Kit for exercising handlers without Telegram or PostgreSQL.
+
+    import bot.testing as kit
+
+    kit.use_in_memory_database()         # before anything imports bot.database
+    from bot.handlers import add_task_command
+
+    async def check():
+        harness = kit.BotHarness()
+        await harness.start()
+        result = await harness.send(add_task_command, "/add_task Write docs")
+        assert harness.bot.texts()[-1] == "✅ Task added: Write docs"
+        kit.assert_budget(result, queries=2, api_calls=1)
+        await harness.close()
+
+use_in_memory_database() selects the SQLite backend on an in-memory
+database and wraps every storage function to count calls; importing this
+module on its own changes nothing. The test suite calls it from a session
+fixture (tests/conftest.py). Every SQL statement is counted and the fake Bot
+records each Bot API call, so a check can fail when a handler starts making
+more queries or API calls than it used to. Set HANDLER_PROFILE=<dir> to dump
+a profile of every handler run (see bot.profiling.handler_profile).
+"""
+import os
+import sys
+import inspect
+import functools
+from collections import Counter
+from datetime import datetime, timedelta, time, timezone
+from telegram import Update, Message, CallbackQuery, User, Chat
+from bot.profiling import handler_profile
+
+# ---------- CALL COUNTING ----------
+db_calls = Counter()
+_queries = [0]
+_QUERY_VERBS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+# bot.database once use_in_memory_database() has set it up
+_database = None
+
+def _count_calls(name, fn):
+    if inspect.isasyncgenfunction(fn):
+        @functools.wraps(fn)
+        async def counted_gen(*args, **kwargs):
+            db_calls[name] += 1
+            async for item in fn(*args, **kwargs):
+                yield item
+        return counted_gen
+
+    @functools.wraps(fn)
+    async def counted(*args, **kwargs):
+        db_calls[name] += 1
+        return await fn(*args, **kwargs)
+    return counted
+
+def use_in_memory_database():
+    """
+    Select the SQLite backend on an in-memory database and count storage
+    calls. Must run before bot.database is first imported; calling it again
+    is a no-op.
+    """
+    global _database
+    if _database is not None:
+        return
+    if "bot.database" in sys.modules:
+        raise RuntimeError("bot.database was imported before use_in_memory_database(); "
+                           "import handler modules after calling it.")
+    os.environ["DB_BACKEND"] = "sqlite"
+    os.environ["SQLITE_PATH"] = ":memory:"
+    import bot.database as database
+    from bot.storage import API
+    # Handler modules import these names from bot.database, so they pick up the wrappers.
+    for name in API:
+        fn = getattr(database, name)
+        if inspect.iscoroutinefunction(fn) or inspect.isasyncgenfunction(fn):
+            setattr(database, name, _count_calls(name, fn))
+    _database = database
+
+def _trace(statement):
+    if statement.lstrip().upper().startswith(_QUERY_VERBS):
+        _queries[0] += 1
+
+# ---------- FAKE BOT ----------
+class FakeBot:
+    """Records every Bot API call as (method, kwargs); messages it 'sends' get increasing ids."""
+
+    # Read by telegram.Message shortcuts such as reply_text.
+    defaults = None
+
+    def __init__(self):
+        self.calls = []
+        self._message_ids = 1000
+        self.username = "test_bot"
+
+    def _message(self, chat_id, text):
+        self._message_ids += 1
+        message = Message(self._message_ids, datetime.now(timezone.utc), Chat(chat_id, Chat.PRIVATE), text=text)
+        message.set_bot(self)
+        return message
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append(("send_message", dict(kwargs, chat_id=chat_id, text=text)))
+        return self._message(chat_id, text)
+
+    async def edit_message_text(self, text, chat_id=None, message_id=None, **kwargs):
+        self.calls.append(("edit_message_text", dict(kwargs, chat_id=chat_id, message_id=message_id, text=text)))
+        return self._message(chat_id, text)
+
+    def __getattr__(self, method):
+        # Any other Bot API method is recorded and succeeds.
+        if method.startswith("_"):
+            raise AttributeError(method)
+        async def call(*args, **kwargs):
+            self.calls.append((method, kwargs))
+            return True
+        return call
+
+    def texts(self):
+        """Text of every sent or edited message, oldest first."""
+        return [kwargs["text"] for method, kwargs in self.calls if "text" in kwargs]
+
+# ---------- FAKE JOB QUEUE ----------
+class FakeClock:
+    """UTC time that only moves when told to; starts at the real current minute by default."""
+
+    def __init__(self, now: datetime = None):
+        self.now = now or datetime.now(timezone.utc).replace(second=0, microsecond=0)
+
+class FakeJob:
+    def __init__(self, queue, callback, next_t, data, name, chat_id, user_id, interval=None, daily=None):
+        self._queue = queue
+        self.callback = callback
+        self.next_t = next_t
+        self.data = data
+        self.name = name or callback.__name__
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.interval = interval
+        self.daily = daily
+        self.removed = False
+        self.enabled = True
+
+    def schedule_removal(self):
+        self.removed = True
+
+    async def run(self):
+        await self.callback(FakeContext(self._queue.bot, job_queue=self._queue, job=self))
+
+class FakeJobQueue:
+    """The parts of telegram.ext.JobQueue the bot uses, driven by a FakeClock."""
+
+    def __init__(self, bot, clock: FakeClock):
+        self.bot = bot
+        self.clock = clock
+        self._jobs = []
+
+    def _when(self, when):
+        now = self.clock.now
+        if when is None:
+            return now
+        if isinstance(when, (int, float)):
+            return now + timedelta(seconds=when)
+        if isinstance(when, timedelta):
+            return now + when
+        if isinstance(when, datetime):
+            return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+        # A time of day: its next occurrence.
+        at = datetime.combine(now.date(), when.replace(tzinfo=None), tzinfo=when.tzinfo or timezone.utc)
+        return at if at > now else at + timedelta(days=1)
+
+    @staticmethod
+    def _next_daily(after, at, days):
+        candidate = datetime.combine(after.date(), at.replace(tzinfo=None), tzinfo=at.tzinfo or timezone.utc)
+        while candidate <= after or (candidate.weekday() + 1) % 7 not in days:
+            candidate += timedelta(days=1)
+        return candidate
+
+    def _add(self, job):
+        self._jobs.append(job)
+        return job
+
+    def run_once(self, callback, when, data=None, name=None, chat_id=None, user_id=None, job_kwargs=None):
+        return self._add(FakeJob(self, callback, self._when(when), data, name, chat_id, user_id))
+
+    def run_repeating(self, callback, interval, first=None, last=None, data=None, name=None,
+                      chat_id=None, user_id=None, job_kwargs=None):
+        interval = interval if isinstance(interval, timedelta) else timedelta(seconds=interval)
+        first = self._when(first) if first is not None else self.clock.now + interval
+        return self._add(FakeJob(self, callback, first, data, name, chat_id, user_id, interval=interval))
+
+    def run_daily(self, callback, time: time, days=tuple(range(7)), data=None, name=None,
+                  chat_id=None, user_id=None, job_kwargs=None):
+        # `days` is numbered like the real JobQueue: 0 = Sunday.
+        next_t = self._next_daily(self.clock.now, time, days)
+        return self._add(FakeJob(self, callback, next_t, data, name, chat_id, user_id, daily=(time, days)))
+
+    def jobs(self):
+        return tuple(job for job in self._jobs if not job.removed)
+
+    def get_jobs_by_name(self, name):
+        return tuple(job for job in self.jobs() if job.name == name)
+
+    async def advance(self, seconds: float = 0, **delta):
+        """Move the clock forward, running every job that falls due, in order."""
+        target = self.clock.now + timedelta(seconds=seconds, **delta)
+        while True:
+            due = [job for job in self.jobs() if job.enabled and job.next_t <= target]
+            if not due:
+                break
+            job = min(due, key=lambda j: j.next_t)
+            self.clock.now = job.next_t
+            if job.interval is not None:
+                job.next_t += job.interval
+            elif job.daily is not None:
+                job.next_t = self._next_daily(job.next_t, *job.daily)
+            else:
+                job.removed = True
+            await job.run()
+        self.clock.now = target
+
+# ---------- CONTEXT AND UPDATES ----------
+class FakeContext:
+    """Stands in for CallbackContext with the attributes handlers read."""
+
+    def __init__(self, bot, job_queue=None, args=None, user_data=None, chat_data=None, job=None):
+        self.bot = bot
+        self.job_queue = job_queue
+        self.args = args or []
+        self.user_data = user_data if user_data is not None else {}
+        self.chat_data = chat_data if chat_data is not None else {}
+        self.bot_data = {}
+        self.job = job
+
+class Result:
+    """What one handler run cost."""
+
+    def __init__(self, db_calls: Counter, queries: int, api_calls: list):
+        self.db_calls = db_calls
+        self.queries = queries
+        self.api_calls = api_calls
+
+    def __repr__(self):
+        return f"Result(queries={self.queries}, db_calls={dict(self.db_calls)}, api_calls={self.api_calls})"
+
+def assert_budget(result: Result, queries: int = None, api_calls: int = None):
+    """Fail when a handler makes more SQL queries or Bot API calls than allowed."""
+    if queries is not None and result.queries > queries:
+        raise AssertionError(f"{result.queries} queries exceed the budget of {queries}: {result!r}")
+    if api_calls is not None and len(result.api_calls) > api_calls:
+        raise AssertionError(f"{len(result.api_calls)} API calls exceed the budget of {api_calls}: {result!r}")
+
+class BotHarness:
+    """A fake bot, job queue and in-memory database for running handlers."""
+
+    def __init__(self, now: datetime = None):
+        self.bot = FakeBot()
+        self.clock = FakeClock(now)
+        self.job_queue = FakeJobQueue(self.bot, self.clock)
+        self._user_data = {}
+        self._chat_data = {}
+        self._update_ids = 0
+
+    async def start(self):
+        if _database is None:
+            raise RuntimeError("Call use_in_memory_database() before starting a BotHarness.")
+        await _database.init_db()
+        from bot.storage import sqlite
+        # The in-memory database lives in the writer thread's connection, which sees every statement.
+        await sqlite._write(lambda conn: conn.set_trace_callback(_trace))
+
+    async def close(self):
+        """Close the database; the next start() begins with an empty one and cold caches."""
+        await _database.close_db()
+        from bot.cache import invalidate_all
+        from bot.storage import sqlite
+        invalidate_all()
+        sqlite._user_ids.clear()
+
+    def _user(self, user_id):
+        return User(user_id, f"User{user_id}", False, username=f"user{user_id}")
+
+    def message(self, text: str, user_id: int = 1, chat_id: int = None) -> Update:
+        """An Update carrying a private text message."""
+        self._update_ids += 1
+        chat = Chat(chat_id or user_id, Chat.PRIVATE)
+        message = Message(self._update_ids, self.clock.now, chat, from_user=self._user(user_id), text=text)
+        message.set_bot(self.bot)
+        return Update(self._update_ids, message=message)
+
+    def callback(self, data: str, user_id: int = 1, chat_id: int = None) -> Update:
+        """An Update for a click on an inline button under a bot message."""
+        self._update_ids += 1
+        chat = Chat(chat_id or user_id, Chat.PRIVATE)
+        message = Message(self._update_ids, self.clock.now, chat, text="menu")
+        message.set_bot(self.bot)
+        query = CallbackQuery(str(self._update_ids), self._user(user_id), "chat", message=message, data=data)
+        query.set_bot(self.bot)
+        return Update(self._update_ids, callback_query=query)
+
+    def context(self, update: Update) -> FakeContext:
+        args = []
+        if update.message and update.message.text and update.message.text.startswith("/"):
+            args = update.message.text.split()[1:]
+        return FakeContext(
+            self.bot,
+            job_queue=self.job_queue,
+            args=args,
+            user_data=self._user_data.setdefault(update.effective_user.id, {}),
+            chat_data=self._chat_data.setdefault(update.effective_chat.id, {}),
+        )
+
+    async def run(self, handler, update: Update) -> Result:
+        """Run one handler on one update and return what it cost."""
+        calls_before, queries_before, api_before = db_calls.copy(), _queries[0], len(self.bot.calls)
+        with handler_profile(handler.__name__):
+            await handler(update, self.context(update))
+        return Result(db_calls - calls_before, _queries[0] - queries_before,
+                      [method for method, _ in self.bot.calls[api_before:]])
+
+    async def send(self, handler, text: str, user_id: int = 1) -> Result:
+        return await self.run(handler, self.message(text, user_id))
+
+    async def click(self, handler, data: str, user_id: int = 1) -> Result:
+        return await self.run(handler, self.callback(data, user_id))
@@ -0,0 +1,137 @@
+import time
+from telegram import Update
+from telegram.ext import ContextTypes, ApplicationHandlerStop
+from bot.utils import logger
+from bot.callbacks import decode as decode_callback
+
+# command class -> (burst capacity, tokens refilled per second), per user
+USER_LIMITS = {
+    "weather": (3, 1 / 20),
+    "quote": (3, 1 / 10),
+    "task_list": (5, 1 / 3),
+    "default": (20, 1.0),
+}
+# command class -> (burst capacity, tokens refilled per second), shared by all users
+GLOBAL_LIMITS = {
+    "weather": (30, 1.0),
+    "quote": (20, 0.5),
+}
+
+_COMMANDS = {
+    "/weather": "weather",
+    "/set_weather_updates": "weather",
+    "/motivation": "quote",
+    "/view_tasks": "task_list",
+    "/show_projects": "task_list",
+}
+# Keyed on the action name of compact callbacks (bot.callbacks) or on plain callback data.
+_CALLBACKS = {
+    "motivation": "quote",
+    "view_tasks": "task_list",
+    "update_task": "task_list",
+    "set_status": "task_list",
+    "delete_task": "task_list",
+    "show_projects": "task_list",
+}
+_TEXT_ACTIONS = {
+    "weather_one_time": "weather",
+    "set_weather_updates": "weather",
+}
+
+EVICT_EVERY = 1000
+
+# (user_id or None, command class) -> [tokens, last refill timestamp]
+_buckets = {}
+# user_id -> monotonic time until which the cooldown notice is not repeated
+_notified_until = {}
+rejected = {}
+_calls = 0
+
+def classify(update: Update, context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Map an update to the command class whose limits apply to it."""
+    if update.callback_query:
+        data = update.callback_query.data
+        decoded = decode_callback(data)
+        return _CALLBACKS.get(decoded[0] if decoded else data, "default")
+    message = update.effective_message
+    if message and message.text:
+        if message.text.startswith("/"):
+            command = message.text.split()[0].split("@")[0]
+            return _COMMANDS.get(command, "default")
+        if context.user_data is not None:
+            return _TEXT_ACTIONS.get(context.user_data.get("next_action"), "default")
+    return "default"
+
+def _take(key, capacity, rate, now) -> float:
+    """Take one token from a bucket; return 0 on success or seconds until a token is available."""
+    bucket = _buckets.get(key)
+    if bucket is None:
+        _buckets[key] = [capacity - 1, now]
+        return 0
+    tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+    bucket[1] = now
+    if tokens >= 1:
+        bucket[0] = tokens - 1
+        return 0
+    bucket[0] = tokens
+    return (1 - tokens) / rate
+
+def _refund(key):
+    _buckets[key][0] += 1
+
+def _limits_for(key):
+    user_id, command_class = key
+    return (USER_LIMITS if user_id is not None else GLOBAL_LIMITS)[command_class]
+
+def _evict_idle(now):
+    """Drop buckets that have refilled completely; they behave the same as absent ones."""
+    idle = []
+    for key, (tokens, last) in _buckets.items():
+        capacity, rate = _limits_for(key)
+        if tokens + (now - last) * rate >= capacity:
+            idle.append(key)
+    for key in idle:
+        del _buckets[key]
+    for user_id in [u for u, until in _notified_until.items() if until < now]:
+        del _notified_until[user_id]
+
+async def throttle(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reject updates that exceed the per-user or global budget before any handler runs."""
+    global _calls
+    user = update.effective_user
+    if user is None:
+        return
+    now = time.monotonic()
+    _calls += 1
+    if _calls % EVICT_EVERY == 0:
+        _evict_idle(now)
+
+    command_class = classify(update, context)
+    user_key = (user.id, command_class)
+    wait = _take(user_key, *USER_LIMITS[command_class], now)
+    if not wait and command_class in GLOBAL_LIMITS:
+        wait = _take((None, command_class), *GLOBAL_LIMITS[command_class], now)
+        if wait:
+            _refund(user_key)
+    if not wait:
+        return
+
+    rejected[command_class] = rejected.get(command_class, 0) + 1
+    logger.info(f"Throttled {command_class} update from user {user.id} (retry in {wait:.0f}s).")
+    text = f"⏳ Slow down a little — try again in {max(1, round(wait))}s."
+    if update.callback_query:
+        # Always answer the query so the client stops its loading spinner.
+        await update.callback_query.answer(text)
+    elif _notified_until.get(user.id, 0) < now and update.effective_message:
+        await update.effective_message.reply_text(text)
+        _notified_until[user.id] = now + wait
+    raise ApplicationHandlerStop
+
+def throttle_stats():
+    """Counters of rejected updates per command class, plus the number of live buckets."""
+    return {"rejected": dict(rejected), "buckets": len(_buckets)}
+
+def setup_throttling(application):
+    """Register the throttle ahead of every handler group used by the bot."""
+    from telegram.ext import TypeHandler
+    application.add_handler(TypeHandler(Update, throttle), group=-1)
@@ -0,0 +1,159 @@
+"""
+Export and import of projects and tasks.
+
+Both directions stream: exports are written by COPY (CSV) or a server-side
+cursor (JSON Lines) into a spooled temporary file, and imports are parsed
+row by row and copied to the database in bounded batches.
+
+Operator CLI:
+    python -m bot.transfer export --format csv --out backup.csv [--telegram-id ID]
+    python -m bot.transfer import --file backup.csv [--telegram-id ID]
+"""
+import os
+import csv
+import json
+import tempfile
+from telegram import Update
+from telegram.ext import ContextTypes
+from bot.utils import logger
+from bot.database import get_user_id, copy_export_csv, iter_export_rows, import_rows, EXPORT_COLUMNS
+
+# Exports stay in memory up to this size and spill to a temporary file beyond it.
+SPOOL_BYTES = 1024 * 1024
+FORMATS = ("csv", "json")
+
+def _jsonable(row):
+    return {column: row[column] for column in EXPORT_COLUMNS}
+
+async def write_export(output, fmt: str, user_id: int = None):
+    """Write an export of one user (or the whole instance) to a binary file object."""
+    if fmt == "csv":
+        await copy_export_csv(output, user_id)
+        return
+    async for row in iter_export_rows(user_id):
+        output.write(json.dumps(_jsonable(row), ensure_ascii=False).encode("utf-8") + b"\n")
+
+def _clean(value):
+    return value if value not in ("", None) else None
+
+def read_rows(text_file, fmt: str):
+    """Lazily parse an export file into row dicts."""
+    if fmt == "csv":
+        rows = csv.DictReader(text_file)
+    else:
+        rows = (json.loads(line) for line in text_file if line.strip())
+    for row in rows:
+        record = {column: _clean(row.get(column)) for column in EXPORT_COLUMNS}
+        if record["telegram_id"] is not None:
+            record["telegram_id"] = int(record["telegram_id"])
+        yield record
+
+def _format_of(filename: str) -> str:
+    return "json" if filename.lower().endswith((".json", ".jsonl")) else "csv"
+
+# ---------- TELEGRAM HANDLERS ----------
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /export [csv|json]: send the user's projects and tasks as a file."""
+    fmt = context.args[0].lower() if context.args else "csv"
+    if fmt not in FORMATS:
+        await update.message.reply_text("Usage: /export [csv|json]")
+        return
+    user_id = await get_user_id(update.effective_user.id)
+    if not user_id:
+        await update.message.reply_text("Please use /start first.")
+        return
+    try:
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as output:
+            await write_export(output, fmt, user_id)
+            output.seek(0)
+            filename = "tasks_export.csv" if fmt == "csv" else "tasks_export.jsonl"
+            await update.message.reply_document(document=output, filename=filename,
+                                                caption="Your projects and tasks.")
+    except Exception as e:
+        logger.error(f"Error in export_command: {e}")
+        await update.message.reply_text("An error occurred while exporting your data.")
+
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /import: ask for a file in the /export format."""
+    context.user_data['next_action'] = 'import'
+    await update.message.reply_text("Send a CSV or JSON Lines file produced by /export to import it.")
+
+async def handle_import_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Import an uploaded export file after /import."""
+    if context.user_data.get('next_action') != 'import':
+        return
+    context.user_data['next_action'] = None
+    user_id = await get_user_id(update.effective_user.id)
+    if not user_id:
+        await update.message.reply_text("Please use /start first.")
+        return
+    document = update.message.document
+    fmt = _format_of(document.file_name or "")
+    path = None
+    try:
+        telegram_file = await document.get_file()
+        with tempfile.NamedTemporaryFile(suffix=f".{fmt}", delete=False) as tmp:
+            path = tmp.name
+        await telegram_file.download_to_drive(path)
+        with open(path, encoding="utf-8", newline="") as text_file:
+            projects, tasks = await import_rows(read_rows(text_file, fmt), user_id=user_id)
+        await update.message.reply_text(f"📥 Imported {projects} projects and {tasks} tasks.")
+    except Exception as e:
+        logger.error(f"Error in handle_import_document: {e}")
+        await update.message.reply_text("⚠️ Could not import that file. Use a file produced by /export.")
+    finally:
+        if path:
+            os.unlink(path)
+
+def setup_transfer_handlers(application):
+    """Add /export, /import and the document handler used by /import."""
+    from telegram.ext import CommandHandler, MessageHandler, filters
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("import", import_command))
+    application.add_handler(MessageHandler(filters.Document.ALL, handle_import_document))
+
+# ---------- OPERATOR CLI ----------
+async def _cli(args):
+    from bot.database import init_db, close_db
+    await init_db()
+    try:
+        user_id = None
+        if args.telegram_id is not None:
+            user_id = await get_user_id(args.telegram_id)
+            if user_id is None:
+                raise SystemExit(f"No user with telegram id {args.telegram_id}")
+        if args.command == "export":
+            fmt = args.format
+            with open(args.out, "wb") as output:
+                await write_export(output, fmt, user_id)
+            logger.info(f"Exported to {args.out}")
+        else:
+            fmt = args.format or _format_of(args.file)
+            with open(args.file, encoding="utf-8", newline="") as text_file:
+                projects, tasks = await import_rows(read_rows(text_file, fmt), user_id=user_id)
+            logger.info(f"Imported {projects} projects and {tasks} tasks from {args.file}")
+    finally:
+        await close_db()
+
+def main(argv=None):
+    import argparse
+    import asyncio
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(prog="python -m bot.transfer", description="Export or import projects and tasks.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Write projects and tasks to a file")
+    export.add_argument("--out", required=True)
+    export.add_argument("--format", choices=FORMATS, default="csv")
+    export.add_argument("--telegram-id", type=int, help="Only export this user (default: everyone)")
+    imp = sub.add_parser("import", help="Load projects and tasks from a file")
+    imp.add_argument("--file", required=True)
+    imp.add_argument("--format", choices=FORMATS, help="Default: guessed from the file extension")
+    imp.add_argument("--telegram-id", type=int, help="Import everything for this user (default: match rows by telegram_id)")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    asyncio.run(_cli(args))
+
+if __name__ == "__main__":
+    main()
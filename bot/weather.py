@@ -1,35 +1,113 @@
 import os
-import pytz
-from datetime import datetime, time
-from dotenv import load_dotenv
-import requests
+import time
+import asyncio
+from datetime import datetime, timedelta, timezone
 from telegram import Update
 from telegram.ext import ContextTypes
 from bot.utils import logger
+from bot.database import get_user_id, save_weather_preference, get_weather_slots, get_weather_locations
+from bot.resilience import get_breaker, get_http_session, resilient_call, StaleCache, UpstreamError
+from bot.geocoding import Location, resolve_location, location_from_id, normalize_query
+from bot.preferences import get_preferences
 
-load_dotenv()
+# bot.main loads the .env file before this module is imported.
 API_KEY = os.getenv('WEATHER_API_KEY')
 WEATHER_URL = os.getenv('WEATHER_URL')
 
-async def get_weather(location):
-    """Fetch weather data from the API."""
+# Responses younger than this are served without calling the API again.
+WEATHER_FRESH_SECONDS = int(os.getenv("WEATHER_FRESH_SECONDS", "600"))
+# Minutes before a delivery slot at which its locations are fetched into the cache.
+PREWARM_LEAD_MINUTES = int(os.getenv("WEATHER_PREWARM_LEAD", "5"))
+PREWARM_CONCURRENCY = 5
+
+_weather_breaker = get_breaker("weather_api")
+_last_good_weather = StaleCache()
+# location id -> task fetching it, so concurrent requests share one API call
+_in_flight = {}
+
+class WeatherServiceError(UpstreamError):
+    """The weather API failed in a way worth retrying (5xx, rate limit)."""
+
+class WeatherAuthError(UpstreamError):
+    """The weather API rejected the API key."""
+
+# Statuses that mean the service, not the query, failed; they count against the circuit breaker.
+_AUTH_STATUSES = (401, 403)
+_RATE_LIMITED = 429
+
+async def _fetch_weather(location: Location):
+    session = await get_http_session()
+    if location.lat is not None:
+        params = {"lat": location.lat, "lon": location.lon, "appid": API_KEY, "units": "metric"}
+    else:
+        params = {"q": location.name, "appid": API_KEY, "units": "metric"}
+    async with session.get(WEATHER_URL, params=params) as response:
+        if response.status >= 500 or response.status == _RATE_LIMITED:
+            raise WeatherServiceError(response.status)
+        if response.status in _AUTH_STATUSES:
+            raise WeatherAuthError(response.status)
+        # Other 4xx answers (e.g. 404 for an unknown city) are shown to the user but never cached.
+        return await response.json(content_type=None)
+
+async def _load_weather(location: Location):
+    """Return (data, stored_at) like resilient_call, from the cache while it is fresh."""
+    key = location.id
+    cached = _last_good_weather.get(key)
+    if cached is not None and time.time() - cached[1] < WEATHER_FRESH_SECONDS:
+        return cached[0], None
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(resilient_call(_weather_breaker, _last_good_weather, key,
+                                                    lambda: _fetch_weather(location),
+                                                    cacheable=_is_weather))
+        _in_flight[key] = task
+        task.add_done_callback(lambda _: _in_flight.pop(key, None))
+    return await asyncio.shield(task)
+
+def _is_weather(data) -> bool:
+    return str(data.get("cod")) == "200"
+
+async def _canonical(text: str):
+    """Resolve a place name; when the geocoder is down, fall back to querying by name."""
     try:
-        params = {"q": location, "appid": API_KEY, "units": "metric"}
-        response = requests.get(WEATHER_URL, params=params)
-        data = response.json()
-
-        if data["cod"] != 200:
-            return f"Error: {data['message']}"
-        
-        weather = data["weather"][0]["description"].capitalize()
-        temp = data["main"]["temp"]
-        feels_like = data["main"]["feels_like"]
-
-        return f"Weather in {location}:\n🌡 Temperature: {temp}°C (Feels like {feels_like}°C)\n🌤 Condition: {weather}"
+        return await resolve_location(text)
+    except Exception as e:
+        logger.warning(f"Geocoding unavailable, querying weather by name: {e}")
+        return Location(normalize_query(text), text.strip(), None, None)
+
+def _temperature(celsius, units):
+    # Responses are always fetched in metric and cached once per location; other units are converted here.
+    if units == "imperial":
+        return f"{round(celsius * 9 / 5 + 32, 1)}°F"
+    return f"{celsius}°C"
+
+async def get_weather(location, units: str = "metric"):
+    """Current weather for a place name or a resolved Location, in "metric" or "imperial" units."""
+    if isinstance(location, str):
+        resolved = await _canonical(location)
+        if resolved is None:
+            return f"Error: could not find a place called '{location.strip()}'."
+        location = resolved
+    try:
+        data, stored_at = await _load_weather(location)
     except Exception as e:
         logger.error(f"Error fetching weather data: {e}")
         return "Unable to fetch weather data. Please try again."
 
+    if not _is_weather(data):
+        return f"Error: {data.get('message')}"
+
+    weather = data["weather"][0]["description"].capitalize()
+    temp = data["main"]["temp"]
+    feels_like = data["main"]["feels_like"]
+
+    text = (f"Weather in {location.name}:\n🌡 Temperature: {_temperature(temp, units)} "
+            f"(Feels like {_temperature(feels_like, units)})\n🌤 Condition: {weather}")
+    if stored_at is not None:
+        as_of = datetime.fromtimestamp(stored_at, timezone.utc).strftime("%H:%M")
+        text += f"\n⚠️ Weather service unavailable; showing data from {as_of} UTC."
+    return text
+
 async def weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /weather command."""
     if not context.args:
@@ -37,52 +115,140 @@ async def weather_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     location = " ".join(context.args)
-    weather_info = await get_weather(location)
+    preferences = await get_preferences(update.effective_user.id)
+    weather_info = await get_weather(location, preferences["units"])
     await update.message.reply_text(weather_info)
 
-async def set_weather_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Set daily weather updates for a user."""
-    user_id = update.effective_user.id
+async def subscribe_weather_updates(update: Update, context: ContextTypes.DEFAULT_TYPE, words):
+    """
+    Schedule daily weather for "<location> HH:MM" (the location may be several
+    words) and return the reply text. Used by the command and the menu flow.
+    """
+    if len(words) < 2:
+        raise ValueError("expected a location and a time")
+    # The time is given in UTC, as the reply and usage say, whatever the server's time zone.
+    utc_time = datetime.strptime(words[-1], "%H:%M").time().replace(tzinfo=timezone.utc)
+    slot = utc_time.strftime("%H:%M")
+    text = " ".join(words[:-1])
+    try:
+        location = await resolve_location(text)
+    except Exception as e:
+        logger.error(f"Error resolving location {text!r}: {e}")
+        return "⚠️ Could not look up that location right now. Please try again later."
+    if location is None:
+        return f"Could not find a place called '{text}'."
+
     chat_id = update.effective_chat.id
+    job_name = f"weather_update_{update.effective_user.id}"
+    for job in context.job_queue.get_jobs_by_name(job_name):
+        job.schedule_removal()
+    context.job_queue.run_daily(
+        callback=send_daily_weather,
+        time=utc_time,
+        chat_id=chat_id,
+        name=job_name,
+        data={"location": location.name, "location_id": location.id, "chat_id": chat_id,
+              "user_id": update.effective_user.id},
+    )
+    db_user_id = await get_user_id(update.effective_user.id)
+    if db_user_id:
+        previous_slot = await save_weather_preference(db_user_id, location.name, slot, location.id)
+        schedule_prewarm(context.job_queue, slot)
+        if previous_slot not in (None, slot):
+            await release_prewarm(context.job_queue, previous_slot)
 
+    logger.info(f"Weather update scheduled: location={location.id}, time={utc_time}, chat_id={chat_id}")
+    return f"Daily weather updates set for {location.name} at {slot} UTC."
+
+async def set_weather_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Set daily weather updates for a user."""
     try:
-        user_input = context.args
-        location = user_input[0]
-        time_str = user_input[1]  # Expected in HH:MM format
-
-        # Convert user-specified time to UTC
-        user_time = datetime.strptime(time_str, "%H:%M").time()
-        utc_time = datetime.combine(datetime.now(), user_time).astimezone(pytz.UTC).time()
-
-        context.job_queue.run_daily(
-            callback=send_daily_weather,
-            time=utc_time,
-            chat_id=chat_id,
-            name=f"weather_update_{user_id}",
-            data={"location": location, "chat_id": chat_id},
-        )
-
-        logger.info(f"Weather update scheduled: location={location}, time={utc_time}, chat_id={chat_id}")
-        await update.message.reply_text(f"Weather updates set for {location} daily at {time_str} (UTC).")
-    except (IndexError, ValueError):
-        await update.message.reply_text("Usage: /set_weather_updates [location] [HH:MM] UTC")
+        reply = await subscribe_weather_updates(update, context, context.args)
+    except ValueError:
+        reply = "Usage: /set_weather_updates [location] [HH:MM] UTC"
+    await update.message.reply_text(reply)
 
 async def send_daily_weather(context: ContextTypes.DEFAULT_TYPE):
     try:
         job_data = context.job.data
-        location = job_data["location"]
         chat_id = job_data["chat_id"]
+        # Jobs scheduled before locations were canonicalized only carry the typed name.
+        if job_data.get("location_id"):
+            location = location_from_id(job_data["location_id"], job_data["location"])
+        else:
+            location = job_data["location"]
 
-        logger.info(f"Executing weather update for chat_id={chat_id} and location={location}.")
-        weather_info = await get_weather(location)
+        logger.info(f"Executing weather update for chat_id={chat_id} and location={job_data['location']}.")
+        # Jobs scheduled before preferences existed carry no user id; their chats are private.
+        preferences = await get_preferences(job_data.get("user_id", chat_id))
+        weather_info = await get_weather(location, preferences["units"])
 
         logger.info(f"Weather info retrieved: {weather_info}")
         await context.bot.send_message(chat_id=chat_id, text=weather_info)
     except Exception as e:
         logger.error(f"Error in send_daily_weather: {e}")
 
+# ---------- PRE-WARMING ----------
+def _prewarm_job_name(slot: str) -> str:
+    return f"weather_prewarm_{slot}"
+
+def schedule_prewarm(job_queue, slot: str):
+    """Make sure the locations delivered at `slot` (HH:MM UTC) are fetched PREWARM_LEAD_MINUTES earlier."""
+    if job_queue.get_jobs_by_name(_prewarm_job_name(slot)):
+        return
+    slot_at = datetime.combine(datetime.now(timezone.utc).date(), datetime.strptime(slot, "%H:%M").time())
+    run_at = (slot_at - timedelta(minutes=PREWARM_LEAD_MINUTES)).time().replace(tzinfo=timezone.utc)
+    job_queue.run_daily(prewarm_weather, time=run_at, name=_prewarm_job_name(slot), data={"slot": slot})
+
+def _remove_prewarm(job_queue, slot: str):
+    for job in job_queue.get_jobs_by_name(_prewarm_job_name(slot)):
+        job.schedule_removal()
+
+async def release_prewarm(job_queue, slot: str):
+    """Drop the pre-warm job of `slot` once no weather is delivered there any more."""
+    if not await get_weather_locations(slot):
+        _remove_prewarm(job_queue, slot)
+        logger.info(f"Stopped weather pre-warming for slot {slot}: nothing is delivered there.")
+
+async def schedule_all_prewarms(application):
+    """Startup hook: one pre-warm job per distinct delivery time."""
+    slots = await get_weather_slots()
+    for slot in slots:
+        schedule_prewarm(application.job_queue, slot)
+    logger.info(f"Scheduled weather pre-warming for {len(slots)} delivery slots.")
+
+async def prewarm_weather(context: ContextTypes.DEFAULT_TYPE):
+    """Fetch every distinct location delivered at the upcoming slot into the cache."""
+    slot = context.job.data["slot"]
+    try:
+        locations = await get_weather_locations(slot)
+        if not locations:
+            # The last subscriber left, possibly through another instance.
+            _remove_prewarm(context.job_queue, slot)
+            logger.info(f"Stopped weather pre-warming for slot {slot}: nothing is delivered there.")
+            return
+        semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+
+        async def warm(row):
+            async with semaphore:
+                if row["location_id"]:
+                    location = location_from_id(row["location_id"], row["location"])
+                else:
+                    location = await _canonical(row["location"])
+                if location is not None:
+                    await _load_weather(location)
+
+        results = await asyncio.gather(*(warm(location) for location in locations), return_exceptions=True)
+        failed = sum(isinstance(result, Exception) for result in results)
+        logger.info(f"Pre-warmed weather for slot {slot}: {len(locations) - failed}/{len(locations)} locations.")
+    except Exception as e:
+        logger.error(f"Error pre-warming weather for slot {slot}: {e}")
+
 def setup_weather_handlers(application):
     from telegram.ext import CommandHandler
+    from bot.lifecycle import register_job_callback, register_startup_hook
+    register_job_callback(send_daily_weather)
+    register_startup_hook(schedule_all_prewarms)
 
     application.add_handler(CommandHandler("weather", weather_command))
     application.add_handler(CommandHandler("set_weather_updates", set_weather_updates))
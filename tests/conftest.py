@@ -0,0 +1,37 @@
+"""
+Shared fixtures. Handler modules read bot.database at import, so tests import
+them inside the test body, after the session fixture below has pointed
+bot.database at an in-memory SQLite database.
+"""
+import asyncio
+import inspect
+import pytest
+import bot.testing as kit
+
+@pytest.fixture(scope="session", autouse=True)
+def in_memory_database():
+    kit.use_in_memory_database()
+
+@pytest.fixture
+def harness():
+    """A BotHarness; async tests get it started on an empty database and closed afterwards."""
+    return kit.BotHarness()
+
+async def _run(test, kwargs):
+    harness = kwargs.get("harness")
+    if harness is not None:
+        await harness.start()
+    try:
+        await test(**kwargs)
+    finally:
+        if harness is not None:
+            await harness.close()
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    """Run `async def` tests in a fresh event loop, so pytest-asyncio is not needed."""
+    if not inspect.iscoroutinefunction(pyfuncitem.obj):
+        return None
+    kwargs = {name: pyfuncitem.funcargs[name] for name in pyfuncitem._fixtureinfo.argnames}
+    asyncio.run(_run(pyfuncitem.obj, kwargs))
+    return True
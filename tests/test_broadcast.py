@@ -0,0 +1,15 @@
+"""Broadcast claims: an unfinished broadcast is resumed by one instance at a time."""
+
+async def test_unfinished_broadcast_is_claimed_once(harness):
+    from bot.database import create_broadcast, claim_broadcasts, release_broadcasts, checkpoint_broadcast, get_broadcasts
+    broadcast_id = await create_broadcast("Hello", 1, "a")
+    # Instance "a" still holds it, so a second instance starting up leaves it alone.
+    assert await claim_broadcasts("b", 600) == []
+    await release_broadcasts("a")
+    assert [row["id"] for row in await claim_broadcasts("b", 600)] == [broadcast_id]
+    assert await claim_broadcasts("c", 600) == []
+    # The previous holder learns at its next checkpoint that it lost the broadcast and records nothing.
+    assert not await checkpoint_broadcast(broadcast_id, "a", 10, 5, [(3, "forbidden")])
+    assert await checkpoint_broadcast(broadcast_id, "b", 10, 5, [])
+    [row] = await get_broadcasts()
+    assert (row["last_user_id"], row["sent"], row["failed"]) == (10, 5, 0)
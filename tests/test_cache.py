@@ -0,0 +1,37 @@
+"""Per-user list caches: generations guard against filling the cache with rows a write has outdated."""
+from bot.cache import ListCache, tasks_cache
+
+def test_put_is_dropped_after_a_concurrent_write():
+    cache = ListCache("things")
+    generation = cache.generation(1)
+    cache.patch(1, lambda rows: rows + ["new"])
+    cache.put(1, ["old"], generation)
+    assert cache.get(1) is None
+    generation = cache.generation(1)
+    cache.put(1, ["old", "new"], generation)
+    assert cache.get(1) == ["old", "new"]
+    # Clearing everything outdates reads of every user, including ones never written.
+    generation = cache.generation(2)
+    cache.invalidate()
+    cache.put(2, ["stale"], generation)
+    assert cache.get(2) is None
+
+async def test_read_racing_a_write_does_not_cache_stale_rows(harness, monkeypatch):
+    from bot.handlers import start, add_task_command
+    from bot.database import get_user_id, get_tasks_from_db, update_task
+    from bot.storage import sqlite
+    await harness.send(start, "/start")
+    await harness.send(add_task_command, "/add_task Write docs")
+    user_id = await get_user_id(1)
+    tasks_cache.invalidate(user_id)
+
+    read = sqlite._read
+    async def read_then_write(fn):
+        # The task is completed after the rows were read but before they are cached.
+        rows = await read(fn)
+        await update_task(user_id, 1, "Completed", refresh=False)
+        return rows
+    monkeypatch.setattr(sqlite, "_read", read_then_write)
+    assert [row["status"] for row in await get_tasks_from_db(user_id)] == ["Pending"]
+    monkeypatch.setattr(sqlite, "_read", read)
+    assert [row["status"] for row in await get_tasks_from_db(user_id)] == ["Completed"]
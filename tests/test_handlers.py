@@ -0,0 +1,70 @@
+"""Core handler flows run through BotHarness, each held to its query and Bot API call budget."""
+from bot.testing import assert_budget
+
+async def _start(harness, user_id=1):
+    from bot.handlers import start
+    return await harness.send(start, "/start", user_id)
+
+async def _add_task(harness, description, user_id=1):
+    from bot.handlers import add_task_command
+    return await harness.send(add_task_command, f"/add_task {description}", user_id)
+
+async def test_start_registers_user_and_sends_menu(harness):
+    from bot.database import get_user_id
+    result = await _start(harness)
+    assert harness.bot.texts() == ["*Main Menu:*"]
+    assert await get_user_id(1) is not None
+    assert_budget(result, queries=1, api_calls=1)
+
+async def test_add_task(harness):
+    await _start(harness)
+    result = await _add_task(harness, "Write docs")
+    assert harness.bot.texts()[-1] == "✅ Task added: Write docs"
+    assert_budget(result, queries=2, api_calls=1)
+
+async def test_view_tasks(harness):
+    from bot.handlers import view_tasks_command
+    await _start(harness)
+    await _add_task(harness, "Write docs")
+    await _add_task(harness, "Fix tests")
+    result = await harness.send(view_tasks_command, "/view_tasks")
+    assert harness.bot.texts()[-1] == ("Your tasks:\n"
+                                       "1. Write docs (Status: Pending, Due: No due date)\n"
+                                       "2. Fix tests (Status: Pending, Due: No due date)")
+    assert_budget(result, queries=1, api_calls=1)
+
+async def test_set_status_button(harness):
+    from bot.handlers import button_callback
+    from bot.callbacks import encode, TASK_STATUSES
+    await _start(harness)
+    await _add_task(harness, "Write docs")
+    result = await harness.click(button_callback, encode("set_status", 1, TASK_STATUSES.index("Completed")))
+    text = harness.bot.texts()[-1]
+    assert text.startswith("✅ Task 1 updated to *Completed*.")
+    assert "1. Write docs (Status: Completed)" in text
+    assert_budget(result, queries=3, api_calls=2)
+
+async def test_delete_button(harness):
+    from bot.handlers import button_callback
+    from bot.callbacks import encode
+    await _start(harness)
+    await _add_task(harness, "Write docs")
+    await _add_task(harness, "Fix tests")
+    result = await harness.click(button_callback, encode("delete_task", 1))
+    text = harness.bot.texts()[-1]
+    assert text.startswith("🗑 Task 1 deleted successfully.")
+    assert "Write docs" not in text and "2. Fix tests (Status: Pending)" in text
+    assert_budget(result, queries=2, api_calls=2)
+
+async def test_reminder_slot_job_delivers(harness):
+    from bot.reminders import set_reminder
+    await _start(harness)
+    slot = harness.clock.now.strftime("%H:%M")
+    result = await harness.send(set_reminder, f"/set_reminder {slot} standup Stand-up time")
+    assert harness.bot.texts()[-1] == f"⏰ Reminder 'standup' set for {slot} UTC daily."
+    assert_budget(result, queries=3, api_calls=1)
+    assert len(harness.job_queue.get_jobs_by_name(f"reminders_{slot}")) == 1
+
+    sent_before = len(harness.bot.calls)
+    await harness.job_queue.advance(days=1)
+    assert harness.bot.calls[sent_before:] == [("send_message", {"chat_id": 1, "text": "Stand-up time"})]
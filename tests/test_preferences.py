@@ -0,0 +1,96 @@
+"""Preference parsing, the batched write-back and /settings."""
+import pytest
+from bot.testing import assert_budget, db_calls
+
+@pytest.fixture(autouse=True)
+def no_pending_changes():
+    yield
+    from bot import preferences
+    preferences._dirty.clear()
+
+async def _start(harness, user_id=1):
+    from bot.handlers import start
+    await harness.send(start, "/start", user_id)
+
+def test_parse_value_coerces_and_validates():
+    from bot.preferences import parse_value, MAX_TEXT_LENGTH
+    assert parse_value("pomodoro_work", "45") == 45
+    assert parse_value("pomodoro_work", 30) == 30
+    assert parse_value("units", " Imperial ") == "imperial"
+    assert parse_value("reminder_text", "  ship   it ") == "ship it"
+    for key, raw in [("pomodoro_work", "0"), ("pomodoro_work", "soon"), ("pomodoro_work", True),
+                     ("pomodoro_break", 2.5), ("units", "kelvin"), ("reminder_text", " "),
+                     ("reminder_text", "x" * (MAX_TEXT_LENGTH + 1)), ("colour", "red")]:
+        with pytest.raises(ValueError):
+            parse_value(key, raw)
+
+async def test_write_back_merges_changes_into_one_patch(harness):
+    from bot import preferences
+    from bot.database import load_preferences
+    await _start(harness)
+    await _start(harness, user_id=2)
+    await preferences.set_preference(1, "units", "imperial")
+    await preferences.set_preference(1, "pomodoro_work", "50")
+    await preferences.set_preference(1, "pomodoro_work", "25")
+    await preferences.set_preference(2, "pomodoro_break", "10")
+    # Served from memory before the write-back; setting a default value resets the key.
+    assert (await preferences.get_preferences(1))["pomodoro_work"] == 25
+    assert preferences._dirty == {1: {"units": "imperial", "pomodoro_work": None}, 2: {"pomodoro_break": 10}}
+
+    saves = db_calls["save_preferences"]
+    harness.job_queue.run_repeating(preferences.write_back_preferences, interval=preferences.FLUSH_INTERVAL)
+    await harness.job_queue.advance(preferences.FLUSH_INTERVAL)
+    assert db_calls["save_preferences"] == saves + 1
+    assert preferences._dirty == {}
+    assert await load_preferences(1) == {"units": "imperial"}
+    assert await load_preferences(2) == {"pomodoro_break": 10}
+
+async def test_settings_command_sets_a_value(harness):
+    from bot.preferences import settings_command, get_preferences
+    await _start(harness)
+    result = await harness.send(settings_command, "/settings pomodoro_work 45")
+    assert harness.bot.texts()[-1] == "✅ pomodoro_work set to: 45"
+    assert (await get_preferences(1))["pomodoro_work"] == 45
+    # The change waits for the write-back; only the first read queries the database.
+    assert_budget(result, queries=1, api_calls=1)
+
+    await harness.send(settings_command, "/settings pomodoro_work 500")
+    assert harness.bot.texts()[-1] == "⚠️ pomodoro_work must be between 1 and 180"
+
+async def test_settings_menu_button_changes_a_choice(harness):
+    from bot.handlers import button_callback
+    from bot.preferences import settings_command, get_preferences, PREFERENCES
+    from bot.callbacks import encode
+    await _start(harness)
+    result = await harness.send(settings_command, "/settings")
+    assert harness.bot.texts()[-1].startswith("⚙️ Settings")
+    assert_budget(result, queries=1, api_calls=1)
+
+    units = next(index for index, pref in enumerate(PREFERENCES) if pref.key == "units")
+    result = await harness.click(button_callback, encode("set_pref", units, PREFERENCES[units].choices.index("imperial")))
+    assert "🌡 Weather units: imperial" in harness.bot.texts()[-1]
+    assert (await get_preferences(1))["units"] == "imperial"
+    assert_budget(result, queries=0, api_calls=2)
+
+async def test_reminder_job_sends_the_pending_reminder_text(harness):
+    from bot.reminders import set_reminder
+    from bot.preferences import set_preference
+    await _start(harness)
+    slot = harness.clock.now.strftime("%H:%M")
+    await harness.send(set_reminder, f"/set_reminder {slot}")
+    # Not written back yet: the slot job reads reminder_text in SQL, so it flushes first.
+    await set_preference(1, "reminder_text", "Commit your work")
+    sent_before = len(harness.bot.calls)
+    await harness.job_queue.advance(days=1)
+    assert harness.bot.calls[sent_before:] == [("send_message", {"chat_id": 1, "text": "Commit your work"})]
+
+async def test_invalidation_from_another_instance_reloads(harness):
+    from bot import preferences
+    from bot.cache import invalidate_from_payload
+    from bot.database import save_preferences
+    await _start(harness)
+    assert (await preferences.get_preferences(1))["units"] == "metric"
+    # Another instance writes a change and announces it on the cache channel.
+    await save_preferences({1: {"units": "imperial"}})
+    invalidate_from_payload("preferences:1")
+    assert (await preferences.get_preferences(1))["units"] == "imperial"
@@ -0,0 +1,55 @@
+"""Recurring tasks: completing occurrences and the materializer's roll."""
+from datetime import timedelta
+
+async def _start(harness, user_id=1):
+    from bot.handlers import start
+    await harness.send(start, "/start", user_id)
+
+async def _history(task_id, user_id=1):
+    from bot.database import get_user_id, get_task_history
+    return [(row["due_date"], row["outcome"]) for row in await get_task_history(await get_user_id(user_id), task_id)]
+
+async def test_materializer_records_missed_occurrences(harness):
+    from bot.database import get_user_id, add_recurring_task
+    from bot.recurring import materialize_recurring_tasks
+    from bot.cron import format_due
+    await _start(harness)
+    user_id = await get_user_id(1)
+    first_due = (harness.clock.now - timedelta(days=3)).replace(hour=9, minute=0)
+    task = await add_recurring_task(user_id, "Journal", "0 9 * * *", first_due)
+    await materialize_recurring_tasks(None)
+    history = await _history(task["id"])
+    assert history and all(outcome == "Missed" for _, outcome in history)
+    assert history[-1] == (format_due(first_due), "Missed")
+
+async def test_roll_skips_tasks_completed_since_the_scan(harness):
+    from datetime import datetime, timezone
+    from bot.database import (get_user_id, add_recurring_task, get_due_recurring_tasks, roll_recurring_tasks,
+                              update_task, get_tasks_from_db)
+    from bot.cron import next_occurrence
+    await _start(harness)
+    user_id = await get_user_id(1)
+    task = await add_recurring_task(user_id, "Journal", "0 9 * * *", harness.clock.now - timedelta(days=3))
+    now = datetime.now(timezone.utc)
+    [row] = await get_due_recurring_tasks(now)
+    # The user completes the occurrence between the materializer's scan and its roll.
+    completed, _ = await update_task(user_id, task["id"], "Completed", refresh=False)
+    due = next_occurrence(row["recurrence"], now)
+    assert await roll_recurring_tasks([(row["id"], row["user_id"], row["due_date"], row["next_due"],
+                                        due, next_occurrence(row["recurrence"], due))]) == 0
+    assert [outcome for _, outcome in await _history(task["id"])] == ["Completed"]
+    [current] = await get_tasks_from_db(user_id)
+    assert current["due_date"] == completed["due_date"]
+
+async def test_completing_a_task_imported_without_next_due(harness):
+    from io import StringIO
+    from bot.database import get_user_id, import_rows, get_tasks_from_db, update_task
+    from bot.transfer import read_rows
+    await _start(harness)
+    user_id = await get_user_id(1)
+    export = "kind,telegram_id,name,description,status,due_date,project,recurrence,next_due\ntask,1,,Journal,Pending,,,0 9 * * *,\n"
+    await import_rows(read_rows(StringIO(export), "csv"), user_id=user_id)
+    [task] = await get_tasks_from_db(user_id)
+    completed, _ = await update_task(user_id, task["id"], "Completed", refresh=False)
+    assert completed["status"] == "Pending" and completed["due_date"]
+    assert await _history(task["id"]) == [(None, "Completed")]
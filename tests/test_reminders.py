@@ -0,0 +1,92 @@
+"""Reminder parsing, limits, slot jobs and the adoption of pre-table reminder jobs."""
+from datetime import time, timezone
+from types import SimpleNamespace
+import pytest
+from bot.testing import assert_budget
+
+async def _start(harness, user_id=1):
+    from bot.handlers import start
+    await harness.send(start, "/start", user_id)
+
+def test_parse_reminder():
+    from bot.reminders import parse_reminder, DEFAULT_NAME
+    assert parse_reminder(["9:05"]) == ("09:05", DEFAULT_NAME, None)
+    assert parse_reminder(["18:30", "Standup"]) == ("18:30", "standup", None)
+    assert parse_reminder(["18:30", "standup", "Stand-up", "soon"]) == ("18:30", "standup", "Stand-up soon")
+    for words in ([], ["25:00"], ["noon"], ["09:00", "no spaces!"], ["09:00", "x" * 33]):
+        with pytest.raises(ValueError):
+            parse_reminder(words)
+
+async def test_same_name_replaces_and_chat_limit_applies(harness):
+    from bot.reminders import set_reminder, MAX_REMINDERS_PER_CHAT
+    from bot.database import get_reminders
+    await _start(harness)
+    await harness.send(set_reminder, "/set_reminder 09:00 standup Stand-up")
+    result = await harness.send(set_reminder, "/set_reminder 09:30 standup Stand-up moved")
+    assert harness.bot.texts()[-1] == "⏰ Reminder 'standup' updated for 09:30 UTC daily."
+    assert_budget(result, queries=3, api_calls=1)
+    assert [(row["name"], row["time"]) for row in await get_reminders(1)] == [("standup", "09:30")]
+
+    for index in range(1, MAX_REMINDERS_PER_CHAT):
+        await harness.send(set_reminder, f"/set_reminder 10:00 r{index}")
+    assert len(await get_reminders(1)) == MAX_REMINDERS_PER_CHAT
+    await harness.send(set_reminder, "/set_reminder 10:00 one-too-many")
+    assert harness.bot.texts()[-1].startswith(f"⚠️ This chat already has {MAX_REMINDERS_PER_CHAT} reminders.")
+    # Replacing an existing reminder is still allowed at the limit.
+    await harness.send(set_reminder, "/set_reminder 11:00 r1")
+    assert harness.bot.texts()[-1] == "⏰ Reminder 'r1' updated for 11:00 UTC daily."
+    assert len(await get_reminders(1)) == MAX_REMINDERS_PER_CHAT
+
+async def test_slot_job_removes_itself_once_empty(harness):
+    from bot.reminders import set_reminder, stop_reminder
+    await _start(harness)
+    slot = harness.clock.now.strftime("%H:%M")
+    await harness.send(set_reminder, f"/set_reminder {slot} standup")
+    result = await harness.send(stop_reminder, "/stop_reminder standup")
+    assert harness.bot.texts()[-1] == "⏹ Reminder 'standup' stopped."
+    assert_budget(result, queries=1, api_calls=1)
+
+    sent_before = len(harness.bot.calls)
+    await harness.job_queue.advance(days=1)
+    assert harness.bot.calls[sent_before:] == []
+    assert harness.job_queue.get_jobs_by_name(f"reminders_{slot}") == ()
+
+@pytest.mark.filterwarnings("ignore:Prior to v20.0 the `days` parameter")
+async def test_legacy_jobs_become_stored_reminders(harness):
+    from telegram.ext import ApplicationBuilder
+    from bot.reminders import _track_legacy_job, daily_reminder, schedule_all_reminder_slots
+    from bot.database import get_reminders
+    await _start(harness, user_id=5)
+    # Restored jobs are real PTB jobs: their time is read from the scheduler trigger.
+    application = ApplicationBuilder().token("1:test").build()
+    legacy_queue = application.job_queue
+    jobs = [legacy_queue.run_daily(daily_reminder, time=time(hour, minute, tzinfo=timezone.utc), chat_id=chat_id, name=str(chat_id))
+            for chat_id, hour, minute in [(5, 9, 0), (5, 9, 0), (5, 18, 30), (77, 7, 0)]]
+    for job in jobs:
+        _track_legacy_job(job)
+
+    await schedule_all_reminder_slots(SimpleNamespace(job_queue=harness.job_queue))
+    assert [(row["name"], row["time"]) for row in await get_reminders(5)] == [("daily-0900", "09:00"), ("daily-1830", "18:30")]
+    assert sorted(job.name for job in harness.job_queue.jobs()) == ["reminders_09:00", "reminders_18:30"]
+    # Duplicates of registered users are dropped; chat 77 never used /start, so its job keeps running.
+    assert [job.chat_id for job in legacy_queue.jobs()] == [77]
+
+async def test_slot_job_retries_after_a_flood_wait(harness):
+    from telegram.error import RetryAfter
+    from bot.reminders import set_reminder
+    await _start(harness)
+    slot = harness.clock.now.strftime("%H:%M")
+    await harness.send(set_reminder, f"/set_reminder {slot} standup Stand-up time")
+
+    send_message, flooded = harness.bot.send_message, []
+    async def flood_once(chat_id, text, **kwargs):
+        if not flooded:
+            flooded.append(chat_id)
+            raise RetryAfter(0)
+        return await send_message(chat_id, text, **kwargs)
+    harness.bot.send_message = flood_once
+
+    sent_before = len(harness.bot.calls)
+    await harness.job_queue.advance(days=1)
+    assert flooded == [1]
+    assert harness.bot.calls[sent_before:] == [("send_message", {"chat_id": 1, "text": "Stand-up time"})]
@@ -0,0 +1,22 @@
+"""Retry policy for external API calls."""
+import asyncio
+import pytest
+from bot.resilience import retry_with_jitter, UpstreamError
+
+async def _attempts(error):
+    calls = []
+    async def fetch():
+        calls.append(1)
+        raise error
+    with pytest.raises(type(error)):
+        await retry_with_jitter(fetch, attempts=3, base_delay=0)
+    return len(calls)
+
+async def test_retries_only_timeouts_server_errors_and_rate_limits():
+    assert await _attempts(asyncio.TimeoutError()) == 3
+    assert await _attempts(UpstreamError(503)) == 3
+    assert await _attempts(UpstreamError(429)) == 3
+    # A bad key or an unknown place fails the same way every time.
+    assert await _attempts(UpstreamError(401)) == 1
+    assert await _attempts(UpstreamError(404)) == 1
+    assert await _attempts(ValueError("bad json")) == 1
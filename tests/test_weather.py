@@ -0,0 +1,23 @@
+"""Weather pre-warm jobs follow the delivery slots that still have subscribers."""
+
+async def test_prewarm_job_follows_the_last_subscriber(harness):
+    from bot.handlers import start
+    from bot.digest import digest_command
+    from bot.database import get_user_id, save_weather_preference
+    await harness.send(start, "/start")
+    await save_weather_preference(await get_user_id(1), "Paris", "08:00", "48.8567,2.351")
+    await harness.send(digest_command, "/digest 09:00")
+    assert len(harness.job_queue.get_jobs_by_name("weather_prewarm_09:00")) == 1
+    # Moving the digest leaves nothing to deliver at 09:00.
+    await harness.send(digest_command, "/digest 10:00")
+    assert harness.job_queue.get_jobs_by_name("weather_prewarm_09:00") == ()
+    assert len(harness.job_queue.get_jobs_by_name("weather_prewarm_10:00")) == 1
+    await harness.send(digest_command, "/digest off")
+    assert harness.job_queue.get_jobs_by_name("weather_prewarm_10:00") == ()
+
+async def test_prewarm_job_removes_itself_once_its_slot_is_empty(harness):
+    from bot.weather import schedule_prewarm
+    # E.g. the last subscriber left through another instance.
+    schedule_prewarm(harness.job_queue, "11:00")
+    await harness.job_queue.advance(days=1)
+    assert harness.job_queue.get_jobs_by_name("weather_prewarm_11:00") == ()